@@ -0,0 +1,13 @@
+"""MongoDB infrastructure shared by project_1 and project_2.
+
+- ``resilience``: typed errors, timeouts, retries and circuit breaking
+- ``routing``: read preferences and causal sessions
+- ``profiles``: connection profiles (compression, batch size, write concern)
+- ``memory``: in-process MongoDB engine (``memory://`` URIs)
+- ``parallel``: parallel scans over key ranges
+- ``sketches``: approximate counts
+- ``columnar``: NumPy / Arrow / Parquet / Feather export
+
+Nothing is imported here, so each project only loads (and pays for) the
+modules it uses.
+"""
@@ -0,0 +1,269 @@
+"""Columnar export of query results to NumPy arrays, Arrow tables and Parquet/Feather files.
+
+Documents are read from the cursor in batches of ``batch_size`` and each
+batch is converted column by column using an explicit schema, so no list of
+dicts (and no per-row dataframe construction) is ever materialised.
+"""
+from datetime import datetime
+
+import numpy as np
+
+DEFAULT_BATCH_SIZE = 10000
+
+_NUMPY_TYPES = {
+    "int32": np.int32,
+    "int64": np.int64,
+    "float64": np.float64,
+    "bool": np.bool_,
+    "datetime": "datetime64[ms]",
+}
+
+
+class Column:
+    """A named output column read from a (dotted) document path"""
+
+    def __init__(self, name, path=None, dtype="str"):
+        self.name = name
+        self.path = path or name
+        self.dtype = dtype
+
+    @property
+    def is_list(self):
+        return self.dtype.startswith("list<")
+
+    @property
+    def item_dtype(self):
+        return self.dtype[5:-1] if self.is_list else self.dtype
+
+    def __repr__(self):
+        return f"Column({self.name!r}, {self.path!r}, {self.dtype!r})"
+
+
+MOVIE_SCHEMA = [
+    Column("title"),
+    Column("year", dtype="int32"),
+    Column("runtime", dtype="int32"),
+    Column("rating", "imdb.rating", "float64"),
+    Column("votes", "imdb.votes", "int64"),
+    Column("genres", dtype="list<str>"),
+    Column("cast", dtype="list<str>"),
+]
+
+USER_SCHEMA = [
+    Column("pid"),
+    Column("name"),
+    Column("email"),
+    Column("role"),
+    Column("created_at", dtype="datetime"),
+    Column("updated_at", dtype="datetime"),
+]
+
+TEAM_SCHEMA = [
+    Column("pid"),
+    Column("name"),
+    Column("members", dtype="list<str>"),
+    Column("created_at", dtype="datetime"),
+    Column("updated_at", dtype="datetime"),
+]
+
+PROJECT_SCHEMA = [
+    Column("pid"),
+    Column("name"),
+    Column("budget", dtype="float64"),
+    Column("deadline", dtype="datetime"),
+    Column("tags", dtype="list<str>"),
+    Column("teams", dtype="list<str>"),
+    Column("created_at", dtype="datetime"),
+    Column("updated_at", dtype="datetime"),
+]
+
+SCHEMAS = {
+    "movies": MOVIE_SCHEMA,
+    "users": USER_SCHEMA,
+    "teams": TEAM_SCHEMA,
+    "projects": PROJECT_SCHEMA,
+}
+
+
+def projection(schema):
+    """MongoDB projection fetching only the schema paths"""
+    fields = {column.path: 1 for column in schema}
+    fields.setdefault("_id", 0)
+    return fields
+
+
+def _lookup(doc, path):
+    for part in path.split("."):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(part)
+    return doc
+
+
+def _coerce(value, dtype):
+    """Convert a raw BSON value to the column type, or None when it does not fit"""
+    if value is None:
+        return None
+    try:
+        if dtype in ("int32", "int64"):
+            return int(value) if not isinstance(value, bool) else None
+        if dtype == "float64":
+            return float(value)
+        if dtype == "bool":
+            return bool(value)
+        if dtype == "datetime":
+            return value.replace(tzinfo=None) if isinstance(value, datetime) else None
+    except (TypeError, ValueError):
+        return None
+    return str(value)
+
+
+def iter_batches(documents, schema, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield ``{column: [values]}`` batches of at most ``batch_size`` rows"""
+    batch = {column.name: [] for column in schema}
+    rows = 0
+    for doc in documents:
+        for column in schema:
+            value = _lookup(doc, column.path)
+            if column.is_list:
+                value = [_coerce(v, column.item_dtype) for v in value] if isinstance(value, list) else None
+            else:
+                value = _coerce(value, column.dtype)
+            batch[column.name].append(value)
+        rows += 1
+        if rows == batch_size:
+            yield batch
+            batch = {column.name: [] for column in schema}
+            rows = 0
+    if rows:
+        yield batch
+
+
+# ===== NUMPY =====
+
+def _numpy_column(values, dtype):
+    if dtype == "str":
+        return np.array(values, dtype=object)
+    mask = np.fromiter((v is None for v in values), dtype=bool, count=len(values))
+    if dtype == "float64":
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    fill = np.datetime64("NaT") if dtype == "datetime" else 0
+    data = np.array([fill if v is None else v for v in values], dtype=_NUMPY_TYPES[dtype])
+    return np.ma.MaskedArray(data, mask=mask) if mask.any() else data
+
+
+def to_numpy(documents, schema, batch_size=DEFAULT_BATCH_SIZE):
+    """Build NumPy columns from a cursor.
+
+    Scalar columns become 1-D arrays (float NaN or a masked array for missing
+    values). A list column ``name`` becomes a flat ``name`` values array plus
+    a ``name_offsets`` int64 array (CSR layout, row i is values[o[i]:o[i+1]]).
+    """
+    parts = {column.name: [] for column in schema}
+    lengths = {column.name: [] for column in schema if column.is_list}
+    for batch in iter_batches(documents, schema, batch_size):
+        for column in schema:
+            values = batch[column.name]
+            if column.is_list:
+                lengths[column.name].append(np.array([len(v) if v else 0 for v in values], dtype=np.int64))
+                values = [item for v in values if v for item in v]
+                parts[column.name].append(_numpy_column(values, column.item_dtype))
+            else:
+                parts[column.name].append(_numpy_column(values, column.dtype))
+
+    result = {}
+    for column in schema:
+        chunks = parts[column.name]
+        dtype = column.item_dtype
+        if not chunks:
+            empty = np.empty(0, dtype=object if dtype == "str" else _NUMPY_TYPES[dtype])
+            result[column.name] = empty
+        elif any(isinstance(chunk, np.ma.MaskedArray) for chunk in chunks):
+            result[column.name] = np.ma.concatenate(chunks)
+        else:
+            result[column.name] = np.concatenate(chunks)
+        if column.is_list:
+            counts = np.concatenate(lengths[column.name]) if lengths[column.name] else np.empty(0, np.int64)
+            offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+            np.cumsum(counts, out=offsets[1:])
+            result[f"{column.name}_offsets"] = offsets
+    return result
+
+
+# ===== ARROW =====
+
+def _arrow():
+    import pyarrow
+    return pyarrow
+
+
+def arrow_schema(schema):
+    """Arrow schema matching a list of columns"""
+    pa = _arrow()
+    types = {
+        "str": pa.string(),
+        "int32": pa.int32(),
+        "int64": pa.int64(),
+        "float64": pa.float64(),
+        "bool": pa.bool_(),
+        "datetime": pa.timestamp("ms"),
+    }
+    return pa.schema([
+        pa.field(column.name, pa.list_(types[column.item_dtype]) if column.is_list else types[column.dtype])
+        for column in schema
+    ])
+
+
+def iter_record_batches(documents, schema, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield Arrow record batches built directly from cursor batches"""
+    pa = _arrow()
+    target = arrow_schema(schema)
+    for batch in iter_batches(documents, schema, batch_size):
+        arrays = [pa.array(batch[field.name], type=field.type) for field in target]
+        yield pa.RecordBatch.from_arrays(arrays, schema=target)
+
+
+def to_arrow(documents, schema, batch_size=DEFAULT_BATCH_SIZE):
+    """Build an Arrow table from a cursor"""
+    pa = _arrow()
+    return pa.Table.from_batches(list(iter_record_batches(documents, schema, batch_size)),
+                                 schema=arrow_schema(schema))
+
+
+def write_parquet(documents, schema, path, batch_size=DEFAULT_BATCH_SIZE, compression="zstd"):
+    """Stream a cursor into a Parquet file one row group per batch; return rows written"""
+    import pyarrow.parquet as pq
+    rows = 0
+    with pq.ParquetWriter(path, arrow_schema(schema), compression=compression) as writer:
+        for record_batch in iter_record_batches(documents, schema, batch_size):
+            writer.write_batch(record_batch)
+            rows += record_batch.num_rows
+    return rows
+
+
+def write_feather(documents, schema, path, batch_size=DEFAULT_BATCH_SIZE, compression="zstd"):
+    """Stream a cursor into a Feather (Arrow IPC) file; return rows written"""
+    pa = _arrow()
+    options = pa.ipc.IpcWriteOptions(compression=compression)
+    rows = 0
+    with pa.OSFile(str(path), "wb") as sink:
+        with pa.ipc.new_file(sink, arrow_schema(schema), options=options) as writer:
+            for record_batch in iter_record_batches(documents, schema, batch_size):
+                writer.write_batch(record_batch)
+                rows += record_batch.num_rows
+    return rows
+
+
+def export(documents, schema, format="arrow", path=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Dispatch to the numpy/arrow builders or the parquet/feather writers"""
+    if format == "numpy":
+        return to_numpy(documents, schema, batch_size)
+    if format == "arrow":
+        return to_arrow(documents, schema, batch_size)
+    if path is None:
+        raise ValueError(f"A path is required to export to {format}")
+    if format == "parquet":
+        return write_parquet(documents, schema, path, batch_size)
+    if format == "feather":
+        return write_feather(documents, schema, path, batch_size)
+    raise ValueError(f"Unknown export format: {format}")
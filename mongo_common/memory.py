@@ -0,0 +1,1312 @@
+"""In-process MongoDB engine used as a pluggable storage backend.
+
+The backend interface is the subset of the PyMongo client API that the
+``Database`` and ``MovieController`` classes rely on: a client exposing
+``get_database``, databases exposing ``get_collection``/``[]`` and
+collections exposing ``find``, ``aggregate``, ``insert_*``, ``update_*``,
+``delete_*`` and ``create_index``. Any object implementing it can be passed
+as ``client=`` to ``Database``; ``MemoryClient`` is the embedded engine.
+
+Documents are kept in a dict keyed by ``_id``. Every index keeps a hash map
+of value -> ids for equality/``$in`` lookups, and non-hashed indexes also
+keep a sorted key list for range scans. Only the aggregation stages emitted
+by the projects are implemented.
+"""
+import bisect
+import copy
+import random
+import re
+import threading
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+MEMORY_SCHEME = "memory://"
+
+_MISSING = object()
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+# ===== VALUE HELPERS =====
+
+def _normalize(value):
+    """Store datetimes the way BSON does: naive UTC with millisecond precision"""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.replace(microsecond=value.microsecond // 1000 * 1000)
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def _sort_key(value):
+    """Total order over values following the BSON comparison order"""
+    if value is _MISSING or value is None:
+        return (1, 0)
+    if isinstance(value, bool):
+        return (8, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, str):
+        return (3, value)
+    if isinstance(value, dict):
+        return (4, tuple((k, _sort_key(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return (5, tuple(_sort_key(v) for v in value))
+    if isinstance(value, ObjectId):
+        return (7, value.binary)
+    if isinstance(value, datetime):
+        return (9, _normalize(value))
+    return (10, repr(value))
+
+
+def _hashable(value):
+    """Hashable stand-in for a document value"""
+    if isinstance(value, dict):
+        return ("d", tuple((k, _hashable(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return ("l", tuple(_hashable(v) for v in value))
+    if isinstance(value, datetime):
+        return _normalize(value)
+    if isinstance(value, bool):
+        return ("b", value)
+    return value
+
+
+def _equals(a, b):
+    return _sort_key(a) == _sort_key(b)
+
+
+def _get_path(doc, path):
+    """Resolve a dotted path for expressions; arrays of sub-documents are mapped"""
+    value = doc
+    for part in path.split("."):
+        if isinstance(value, dict):
+            value = value.get(part, _MISSING)
+        elif isinstance(value, list):
+            if part.isdigit():
+                index = int(part)
+                value = value[index] if index < len(value) else _MISSING
+            else:
+                value = [v[part] for v in value if isinstance(v, dict) and part in v]
+        else:
+            return _MISSING
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+
+def _candidates(doc, path):
+    """All values a query on ``path`` can match, expanding arrays on the way"""
+    values = [doc]
+    for part in path.split("."):
+        next_values = []
+        for value in values:
+            if isinstance(value, dict):
+                if part in value:
+                    next_values.append(value[part])
+            elif isinstance(value, list):
+                if part.isdigit() and int(part) < len(value):
+                    next_values.append(value[int(part)])
+                for item in value:
+                    if isinstance(item, dict) and part in item:
+                        next_values.append(item[part])
+        values = next_values
+    expanded = []
+    for value in values:
+        expanded.append(value)
+        if isinstance(value, list):
+            expanded.extend(value)
+    return expanded
+
+
+def _set_path(doc, path, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        if not isinstance(doc.get(part), dict):
+            doc[part] = {}
+        doc = doc[part]
+    doc[parts[-1]] = value
+
+
+def _unset_path(doc, path):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(parts[-1], None)
+
+
+# ===== QUERY MATCHING =====
+
+def _compare(op, value, target):
+    left, right = _sort_key(value), _sort_key(target)
+    if left[0] != right[0]:
+        return False
+    if op == "$gt":
+        return left > right
+    if op == "$gte":
+        return left >= right
+    if op == "$lt":
+        return left < right
+    return left <= right
+
+
+def _regex(pattern, options=""):
+    if isinstance(pattern, re.Pattern):
+        return pattern
+    flags = 0
+    for option, flag in (("i", re.I), ("m", re.M), ("s", re.S), ("x", re.X)):
+        if option in options:
+            flags |= flag
+    return re.compile(pattern, flags)
+
+
+def _is_operator_dict(cond):
+    return isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond)
+
+
+def _match_value(values, cond):
+    """Match the candidate values of one field against a condition"""
+    if isinstance(cond, re.Pattern):
+        return any(isinstance(v, str) and cond.search(v) for v in values)
+    if not _is_operator_dict(cond):
+        if cond is None and not values:
+            return True
+        return any(_equals(v, cond) for v in values)
+
+    for op, target in cond.items():
+        if op == "$eq":
+            ok = _match_value(values, target)
+        elif op == "$ne":
+            ok = not _match_value(values, target)
+        elif op in ("$gt", "$gte", "$lt", "$lte"):
+            ok = any(_compare(op, v, target) for v in values)
+        elif op == "$in":
+            ok = any(_match_value(values, t) for t in target)
+        elif op == "$nin":
+            ok = not any(_match_value(values, t) for t in target)
+        elif op == "$exists":
+            ok = bool(values) == bool(target)
+        elif op == "$all":
+            ok = all(_match_value(values, t) for t in target)
+        elif op == "$regex":
+            pattern = _regex(target, cond.get("$options", ""))
+            ok = any(isinstance(v, str) and pattern.search(v) for v in values)
+        elif op == "$options":
+            continue
+        elif op == "$size":
+            ok = any(isinstance(v, list) and len(v) == target for v in values)
+        elif op == "$elemMatch":
+            ok = any(isinstance(v, list) and any(_matches_element(item, target) for item in v) for v in values)
+        elif op == "$not":
+            ok = not _match_value(values, target)
+        else:
+            raise NotImplementedError(f"Query operator {op} is not supported by the memory backend")
+        if not ok:
+            return False
+    return True
+
+
+def _matches_element(item, cond):
+    if _is_operator_dict(cond) and not any(k in cond for k in ("$and", "$or", "$nor", "$expr")):
+        return _match_value([item], cond)
+    return isinstance(item, dict) and matches(item, cond)
+
+
+def matches(doc, query, variables=None):
+    """Return True when ``doc`` satisfies the MongoDB ``query``"""
+    for key, cond in query.items():
+        if key == "$and":
+            ok = all(matches(doc, sub, variables) for sub in cond)
+        elif key == "$or":
+            ok = any(matches(doc, sub, variables) for sub in cond)
+        elif key == "$nor":
+            ok = not any(matches(doc, sub, variables) for sub in cond)
+        elif key == "$expr":
+            ok = _truthy(evaluate(cond, doc, variables))
+        else:
+            ok = _match_value(_candidates(doc, key), cond)
+        if not ok:
+            return False
+    return True
+
+
+# ===== AGGREGATION EXPRESSIONS =====
+
+def _truthy(value):
+    return value not in (_MISSING, None, False, 0)
+
+
+def _numbers(values):
+    return [v for v in values if isinstance(v, (int, float)) and not isinstance(v, bool)]
+
+
+def evaluate(expr, doc, variables=None):
+    """Evaluate an aggregation expression against ``doc``"""
+    variables = variables or {}
+    if isinstance(expr, str):
+        if expr.startswith("$$"):
+            name, _, path = expr[2:].partition(".")
+            value = doc if name in ("ROOT", "CURRENT") else variables.get(name, _MISSING)
+            return _get_path(value, path) if path and value is not _MISSING else value
+        if expr.startswith("$"):
+            return _get_path(doc, expr[1:])
+        return expr
+    if isinstance(expr, list):
+        return [_value(evaluate(item, doc, variables)) for item in expr]
+    if not isinstance(expr, dict):
+        return expr
+    if len(expr) != 1 or not next(iter(expr)).startswith("$"):
+        result = {}
+        for key, sub in expr.items():
+            value = evaluate(sub, doc, variables)
+            if value is not _MISSING:
+                result[key] = value
+        return result
+
+    op, args = next(iter(expr.items()))
+    if op == "$literal":
+        return args
+    if op == "$filter":
+        name = args.get("as", "this")
+        items = evaluate(args["input"], doc, variables)
+        if not isinstance(items, list):
+            return None
+        return [i for i in items if _truthy(evaluate(args["cond"], doc, {**variables, name: i}))]
+    if op == "$map":
+        name = args.get("as", "this")
+        items = evaluate(args["input"], doc, variables)
+        if not isinstance(items, list):
+            return None
+        return [_value(evaluate(args["in"], doc, {**variables, name: i})) for i in items]
+    if op == "$cond":
+        if isinstance(args, dict):
+            args = [args["if"], args["then"], args["else"]]
+        branch = args[1] if _truthy(evaluate(args[0], doc, variables)) else args[2]
+        return evaluate(branch, doc, variables)
+
+    values = [evaluate(a, doc, variables) for a in (args if isinstance(args, list) else [args])]
+    if op == "$concatArrays":
+        if any(not isinstance(v, list) for v in values):
+            return None
+        return [item for v in values for item in v]
+    if op in ("$eq", "$ne", "$gt", "$gte", "$lt", "$lte"):
+        left, right = (_value(v) for v in values)
+        if op == "$eq":
+            return _equals(left, right)
+        if op == "$ne":
+            return not _equals(left, right)
+        left, right = _sort_key(left), _sort_key(right)
+        return {"$gt": left > right, "$gte": left >= right,
+                "$lt": left < right, "$lte": left <= right}[op]
+    if op == "$and":
+        return all(_truthy(v) for v in values)
+    if op == "$or":
+        return any(_truthy(v) for v in values)
+    if op == "$not":
+        return not _truthy(values[0])
+    if op == "$in":
+        return any(_equals(values[0], v) for v in (values[1] or []))
+    if op == "$size":
+        return len(values[0]) if isinstance(values[0], list) else None
+    if op == "$ifNull":
+        return next((v for v in values if v not in (_MISSING, None)), None)
+    if op == "$arrayElemAt":
+        items, index = values
+        return items[index] if isinstance(items, list) and -len(items) <= index < len(items) else _MISSING
+    if op in ("$sum", "$avg", "$max", "$min"):
+        flat = values[0] if len(values) == 1 and isinstance(values[0], list) else values
+        return _accumulate(op, [_value(v) for v in flat])
+    if op == "$add":
+        return sum(_numbers(values))
+    if op == "$subtract":
+        return values[0] - values[1]
+    if op == "$multiply":
+        result = 1
+        for v in _numbers(values):
+            result *= v
+        return result
+    if op == "$divide":
+        return values[0] / values[1]
+    if op == "$toString":
+        return None if values[0] in (_MISSING, None) else str(values[0])
+    raise NotImplementedError(f"Expression operator {op} is not supported by the memory backend")
+
+
+def _value(value):
+    return None if value is _MISSING else value
+
+
+def _accumulate(op, values):
+    values = [v for v in values if v is not _MISSING]
+    if op == "$sum":
+        return sum(_numbers(values))
+    if op == "$avg":
+        numbers = _numbers(values)
+        return sum(numbers) / len(numbers) if numbers else None
+    present = [v for v in values if v is not None]
+    if not present:
+        return None
+    pick = max if op == "$max" else min
+    return pick(present, key=_sort_key)
+
+
+# ===== INDEXES =====
+
+class _Index:
+    """Hash (and optionally sorted) index on the first field of an index key"""
+
+    def __init__(self, name, keys, unique=False, **options):
+        self.name = name
+        self.keys = keys
+        self.field = keys[0][0]
+        self.unique = unique
+        self.options = options
+        self.sorted = keys[0][1] not in ("hashed", "text")
+        self._hash = defaultdict(set)
+        self._sort_keys = []
+        self._sort_ids = []
+
+    def _values(self, doc):
+        values = _candidates(doc, self.field)
+        return values or [None]
+
+    def add(self, key, doc):
+        for value in self._values(doc):
+            if isinstance(value, list):
+                continue
+            bucket = self._hash[_hashable(value)]
+            if self.unique and bucket and key not in bucket:
+                raise ValueError(f"E11000 duplicate key error index: {self.name} dup key: {value!r}")
+            bucket.add(key)
+            if self.sorted:
+                sort_key = _sort_key(value)
+                position = bisect.bisect_right(self._sort_keys, sort_key)
+                self._sort_keys.insert(position, sort_key)
+                self._sort_ids.insert(position, key)
+
+    def remove(self, key, doc):
+        for value in self._values(doc):
+            if isinstance(value, list):
+                continue
+            hashed = _hashable(value)
+            self._hash[hashed].discard(key)
+            if not self._hash[hashed]:
+                del self._hash[hashed]
+            if self.sorted:
+                sort_key = _sort_key(value)
+                start = bisect.bisect_left(self._sort_keys, sort_key)
+                end = bisect.bisect_right(self._sort_keys, sort_key)
+                for position in range(start, end):
+                    if self._sort_ids[position] == key:
+                        del self._sort_keys[position]
+                        del self._sort_ids[position]
+                        break
+
+    def lookup(self, value):
+        return set(self._hash.get(_hashable(value), ()))
+
+    def range(self, cond):
+        """Ids whose indexed value satisfies the range operators in ``cond``"""
+        bounds = [v for op, v in cond.items() if op in ("$gt", "$gte", "$lt", "$lte")]
+        rank = _sort_key(bounds[0])[0]
+        start = bisect.bisect_left(self._sort_keys, (rank,))
+        end = bisect.bisect_left(self._sort_keys, (rank + 1,))
+        for op, value in cond.items():
+            key = _sort_key(value)
+            if op == "$gt":
+                start = max(start, bisect.bisect_right(self._sort_keys, key))
+            elif op == "$gte":
+                start = max(start, bisect.bisect_left(self._sort_keys, key))
+            elif op == "$lt":
+                end = min(end, bisect.bisect_left(self._sort_keys, key))
+            elif op == "$lte":
+                end = min(end, bisect.bisect_right(self._sort_keys, key))
+        return set(self._sort_ids[start:end])
+
+    def info(self):
+        return {"key": list(self.keys), "unique": self.unique, **self.options}
+
+
+# ===== CURSORS =====
+
+class MemoryCommandCursor:
+    """Iterator over a materialised result, mirroring PyMongo's cursor API"""
+
+    def __init__(self, documents):
+        self._documents = documents
+        self._iterator = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._iterator is None:
+            self._iterator = iter(self._documents())
+        return next(self._iterator)
+
+    def batch_size(self, batch_size):
+        return self
+
+    def max_time_ms(self, max_time_ms):
+        return self
+
+    def close(self):
+        self._iterator = iter(())
+
+    def to_list(self, length=None):
+        items = list(self)
+        return items if length is None else items[:length]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class MemoryCursor(MemoryCommandCursor):
+    """Lazy ``find`` cursor supporting sort, skip and limit"""
+
+    def __init__(self, collection, filter=None, projection=None, sort=None, skip=0, limit=0):
+        super().__init__(self._run)
+        self._collection = collection
+        self._filter = filter or {}
+        self._projection = projection
+        self._sort = list(sort or [])
+        self._skip = skip
+        self._limit = limit
+
+    def sort(self, key_or_list, direction=1):
+        if isinstance(key_or_list, str):
+            self._sort = [(key_or_list, direction)]
+        else:
+            self._sort = list(key_or_list.items() if isinstance(key_or_list, dict) else key_or_list)
+        return self
+
+    def skip(self, skip):
+        self._skip = skip
+        return self
+
+    def limit(self, limit):
+        self._limit = limit
+        return self
+
+    def hint(self, index):
+        return self
+
+    def _run(self):
+        documents = self._collection._select(self._filter)
+        if self._sort:
+            documents = _sort_documents(documents, self._sort)
+        documents = documents[self._skip:]
+        if self._limit:
+            documents = documents[:abs(self._limit)]
+        if self._projection is not None:
+            projection = self._projection
+            if isinstance(projection, (list, tuple)):
+                projection = {field: 1 for field in projection}
+            documents = [project(doc, projection) for doc in documents]
+        return documents
+
+
+def _sort_documents(documents, sort):
+    """Stable multi-key sort; arrays sort by their min (asc) or max (desc) element"""
+    documents = list(documents)
+    for field, direction in reversed(list(sort)):
+        descending = direction == -1
+
+        def key(doc, field=field, descending=descending):
+            values = _candidates(doc, field)
+            scalars = [v for v in values if not isinstance(v, list)] or [None]
+            keys = [_sort_key(v) for v in scalars]
+            return max(keys) if descending else min(keys)
+
+        documents.sort(key=key, reverse=descending)
+    return documents
+
+
+def project(doc, spec):
+    """Apply a ``find``/``$project`` projection to ``doc``"""
+    include_id = spec.get("_id", 1)
+    fields = {k: v for k, v in spec.items() if k != "_id"}
+    inclusive = any(v not in (0, False) for v in fields.values())
+    if not fields and isinstance(include_id, (int, bool)) and not include_id:
+        inclusive = False
+
+    if not inclusive:
+        result = copy.deepcopy(doc)
+        for field in spec:
+            if spec[field] in (0, False):
+                _unset_path(result, field)
+        return result
+
+    result = {}
+    if include_id in (1, True) and "_id" in doc:
+        result["_id"] = doc["_id"]
+    elif include_id not in (0, False, 1, True):
+        result["_id"] = _value(evaluate(include_id, doc))
+    for field, value in fields.items():
+        if value in (1, True):
+            found = _get_path(doc, field)
+            if found is not _MISSING:
+                _set_path(result, field, copy.deepcopy(found))
+        else:
+            found = evaluate(value, doc)
+            if found is not _MISSING:
+                _set_path(result, field, found)
+    return result
+
+
+# ===== UPDATE OPERATORS =====
+
+def _walk(container, parts, apply, array_filters, create=True):
+    """Call ``apply(parent, key)`` for every target of a (positional) path"""
+    head, rest = parts[0], parts[1:]
+    if isinstance(container, list) and head.startswith("$["):
+        identifier = head[2:-1]
+        conditions = {}
+        for array_filter in array_filters or []:
+            for path, cond in array_filter.items():
+                name, _, sub_path = path.partition(".")
+                if name == identifier:
+                    conditions[sub_path] = cond
+        for index, item in enumerate(container):
+            if identifier and not all(
+                    _match_value(_candidates(item, p), c) if p else _match_value([item], c)
+                    for p, c in conditions.items()):
+                continue
+            if rest:
+                _walk(item, rest, apply, array_filters, create)
+            else:
+                apply(container, index)
+        return
+    if isinstance(container, list) and head.isdigit():
+        index = int(head)
+        if index >= len(container):
+            return
+        if rest:
+            _walk(container[index], rest, apply, array_filters, create)
+        else:
+            apply(container, index)
+        return
+    if not isinstance(container, dict):
+        return
+    if not rest:
+        apply(container, head)
+        return
+    if head not in container and create:
+        container[head] = {}
+    if head in container:
+        _walk(container[head], rest, apply, array_filters, create)
+
+
+def apply_update(doc, update, array_filters=None, inserting=False):
+    """Apply update operators (or a replacement document) to ``doc`` in place"""
+    if not _is_operator_dict(update):
+        preserved = doc.get("_id")
+        doc.clear()
+        doc.update(_normalize(copy.deepcopy(update)))
+        if preserved is not None:
+            doc["_id"] = preserved
+        return
+
+    def each(value):
+        if isinstance(value, dict) and "$each" in value:
+            return list(value["$each"])
+        return [value]
+
+    for op, fields in update.items():
+        for path, raw in fields.items():
+            value = _normalize(copy.deepcopy(raw))
+            parts = path.split(".")
+
+            if op == "$set" or (op == "$setOnInsert" and inserting):
+                def apply(parent, key, value=value):
+                    parent[key] = copy.deepcopy(value)
+            elif op == "$setOnInsert":
+                continue
+            elif op == "$unset":
+                def apply(parent, key):
+                    if isinstance(parent, dict):
+                        parent.pop(key, None)
+                    else:
+                        parent[key] = None
+            elif op == "$inc":
+                def apply(parent, key, value=value):
+                    current = parent.get(key, 0) if isinstance(parent, dict) else parent[key]
+                    parent[key] = current + value
+            elif op == "$max" or op == "$min":
+                def apply(parent, key, value=value, op=op):
+                    current = parent.get(key, _MISSING) if isinstance(parent, dict) else parent[key]
+                    if current is _MISSING or (_sort_key(value) > _sort_key(current)) == (op == "$max"):
+                        parent[key] = value
+            elif op == "$push":
+                def apply(parent, key, value=raw):
+                    current = parent.get(key) if isinstance(parent, dict) else parent[key]
+                    parent[key] = (current if isinstance(current, list) else []) + \
+                        _normalize(copy.deepcopy(each(value)))
+            elif op == "$addToSet":
+                def apply(parent, key, value=raw):
+                    current = parent.get(key) if isinstance(parent, dict) else parent[key]
+                    current = current if isinstance(current, list) else []
+                    for item in _normalize(copy.deepcopy(each(value))):
+                        if not any(_equals(item, existing) for existing in current):
+                            current.append(item)
+                    parent[key] = current
+            elif op == "$pull":
+                def apply(parent, key, value=value):
+                    current = parent.get(key) if isinstance(parent, dict) else parent[key]
+                    if isinstance(current, list):
+                        parent[key] = [item for item in current if not (
+                            _matches_element(item, value) if isinstance(value, dict)
+                            else _equals(item, value))]
+            else:
+                raise NotImplementedError(f"Update operator {op} is not supported by the memory backend")
+
+            _walk(doc, parts, apply, array_filters, create=op not in ("$unset", "$pull"))
+
+
+# ===== COLLECTION =====
+
+class MemoryCollection:
+    """In-memory collection with hash/sorted secondary indexes"""
+
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+        self.full_name = f"{database.name}.{name}"
+        self._lock = database.client._lock
+        self._docs = {}
+        self._order = {}
+        self._counter = 0
+        self._indexes = {}
+
+    def with_options(self, **kwargs):
+        return self
+
+    # ----- internal storage -----
+
+    def _insert(self, doc):
+        doc = _normalize(copy.deepcopy(doc))
+        if "_id" not in doc:
+            doc["_id"] = ObjectId()
+        key = _hashable(doc["_id"])
+        if key in self._docs:
+            raise ValueError(f"E11000 duplicate key error collection: {self.full_name} dup key: {doc['_id']!r}")
+        added = []
+        try:
+            for index in self._indexes.values():
+                index.add(key, doc)
+                added.append(index)
+        except ValueError:
+            for index in added:
+                index.remove(key, doc)
+            raise
+        self._docs[key] = doc
+        self._counter += 1
+        self._order[key] = self._counter
+        return doc
+
+    def _remove(self, key):
+        doc = self._docs.pop(key)
+        del self._order[key]
+        for index in self._indexes.values():
+            index.remove(key, doc)
+
+    def _replace(self, key, new_doc):
+        old_doc = self._docs[key]
+        for index in self._indexes.values():
+            index.remove(key, old_doc)
+        self._docs[key] = new_doc
+        for index in self._indexes.values():
+            index.add(key, new_doc)
+
+    def _snapshot(self):
+        # Writes replace documents rather than mutate them, so shallow copies are enough
+        return dict(self._docs), dict(self._order), self._counter, dict(self._indexes)
+
+    def _restore(self, snapshot):
+        docs, order, self._counter, indexes = snapshot
+        self._docs, self._order = dict(docs), dict(order)
+        self._indexes = {}
+        for name, index in indexes.items():
+            rebuilt = _Index(index.name, index.keys, unique=index.unique, **index.options)
+            for key, doc in self._docs.items():
+                rebuilt.add(key, doc)
+            self._indexes[name] = rebuilt
+
+    def _plan(self, query):
+        """Candidate ids from the most selective usable index, or None for a scan"""
+        best = None
+        for field, cond in query.items():
+            if field.startswith("$") or isinstance(cond, (list, re.Pattern)):
+                continue
+            if field == "_id" and not _is_operator_dict(cond):
+                key = _hashable(cond)
+                return {key} if key in self._docs else set()
+            index = next((i for i in self._indexes.values() if i.field == field), None)
+            if index is None:
+                continue
+            if not _is_operator_dict(cond):
+                ids = index.lookup(cond)
+            elif "$eq" in cond and not isinstance(cond["$eq"], list):
+                ids = index.lookup(cond["$eq"])
+            elif "$in" in cond and not any(isinstance(v, (list, re.Pattern)) for v in cond["$in"]):
+                ids = set().union(*(index.lookup(v) for v in cond["$in"])) if cond["$in"] else set()
+            elif index.sorted and any(op in cond for op in ("$gt", "$gte", "$lt", "$lte")):
+                ids = index.range(cond)
+            else:
+                continue
+            if best is None or len(ids) < len(best):
+                best = ids
+        return best
+
+    def _select(self, query, variables=None):
+        """Matching documents (deep copies) in natural order"""
+        query = _normalize(query or {})
+        with self._lock:
+            docs = [self._docs[key] for key in self._keys(query)]
+            return [copy.deepcopy(doc) for doc in docs if matches(doc, query, variables)]
+
+    def _keys(self, query):
+        """Keys to examine for ``query`` in insertion order, narrowed by an index when possible"""
+        ids = self._plan(query)
+        if ids is None:
+            return list(self._docs)
+        return sorted((key for key in ids if key in self._docs), key=self._order.__getitem__)
+
+    def _matching_keys(self, query, limit=0):
+        query = _normalize(query or {})
+        keys = []
+        for key in self._keys(query):
+            if matches(self._docs[key], query):
+                keys.append(key)
+                if limit and len(keys) >= limit:
+                    break
+        return keys
+
+    # ----- reads -----
+
+    def find(self, filter=None, projection=None, sort=None, skip=0, limit=0, **kwargs):
+        return MemoryCursor(self, filter, projection, sort, skip, limit)
+
+    def find_one(self, filter=None, *args, **kwargs):
+        if filter is not None and not isinstance(filter, dict):
+            filter = {"_id": filter}
+        return next(iter(self.find(filter, *args, **kwargs).limit(1)), None)
+
+    def count_documents(self, filter, **kwargs):
+        with self._lock:
+            count = len(self._matching_keys(filter))
+        skip, limit = kwargs.get("skip", 0), kwargs.get("limit", 0)
+        count = max(count - skip, 0)
+        return min(count, limit) if limit else count
+
+    def estimated_document_count(self, **kwargs):
+        return len(self._docs)
+
+    def distinct(self, key, filter=None, **kwargs):
+        values = []
+        for doc in self._select(filter):
+            for value in _candidates(doc, key):
+                if not isinstance(value, list) and not any(_equals(value, v) for v in values):
+                    values.append(value)
+        return values
+
+    def aggregate(self, pipeline, session=None, **kwargs):
+        return MemoryCommandCursor(lambda: run_pipeline(self, pipeline))
+
+    # ----- writes -----
+
+    def insert_one(self, document, **kwargs):
+        with self._lock:
+            stored = self._insert(document)
+        document["_id"] = stored["_id"]
+        return InsertOneResult(stored["_id"], True)
+
+    def insert_many(self, documents, ordered=True, **kwargs):
+        ids = []
+        with self._lock:
+            for document in documents:
+                stored = self._insert(document)
+                document["_id"] = stored["_id"]
+                ids.append(stored["_id"])
+        return InsertManyResult(ids, True)
+
+    def delete_one(self, filter, **kwargs):
+        return self._delete(filter, limit=1)
+
+    def delete_many(self, filter, **kwargs):
+        return self._delete(filter)
+
+    def _delete(self, filter, limit=0):
+        with self._lock:
+            keys = self._matching_keys(filter, limit)
+            for key in keys:
+                self._remove(key)
+        return DeleteResult({"n": len(keys), "ok": 1}, True)
+
+    def update_one(self, filter, update, upsert=False, array_filters=None, **kwargs):
+        return self._update(filter, update, upsert, array_filters, limit=1)
+
+    def update_many(self, filter, update, upsert=False, array_filters=None, **kwargs):
+        return self._update(filter, update, upsert, array_filters)
+
+    def replace_one(self, filter, replacement, upsert=False, **kwargs):
+        return self._update(filter, replacement, upsert, None, limit=1)
+
+    def _update(self, filter, update, upsert, array_filters, limit=0):
+        with self._lock:
+            keys = self._matching_keys(filter, limit)
+            modified = 0
+            for key in keys:
+                new_doc = copy.deepcopy(self._docs[key])
+                apply_update(new_doc, update, array_filters)
+                if new_doc != self._docs[key]:
+                    self._replace(key, new_doc)
+                    modified += 1
+            raw = {"n": len(keys), "nModified": modified, "ok": 1}
+            if not keys and upsert:
+                new_doc = {k: v for k, v in (filter or {}).items()
+                           if not k.startswith("$") and not _is_operator_dict(v)}
+                apply_update(new_doc, update, array_filters, inserting=True)
+                stored = self._insert(new_doc)
+                raw.update({"n": 1, "upserted": stored["_id"]})
+        return UpdateResult(raw, True)
+
+    def bulk_write(self, requests, ordered=True, **kwargs):
+        """Apply PyMongo ``InsertOne``/``UpdateOne``/``UpdateMany``/``ReplaceOne``/``Delete*`` requests"""
+        raw = {"nInserted": 0, "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0,
+               "upserted": [], "writeErrors": [], "writeConcernErrors": []}
+        with self._lock:
+            for index, request in enumerate(requests):
+                kind = type(request).__name__
+                if kind == "InsertOne":
+                    stored = self._insert(request._doc)
+                    request._doc["_id"] = stored["_id"]
+                    raw["nInserted"] += 1
+                elif kind in ("UpdateOne", "UpdateMany", "ReplaceOne"):
+                    result = self._update(request._filter, request._doc, request._upsert,
+                                          getattr(request, "_array_filters", None),
+                                          limit=0 if kind == "UpdateMany" else 1).raw_result
+                    if "upserted" in result:
+                        raw["nUpserted"] += 1
+                        raw["upserted"].append({"index": index, "_id": result["upserted"]})
+                    else:
+                        raw["nMatched"] += result["n"]
+                        raw["nModified"] += result["nModified"]
+                elif kind in ("DeleteOne", "DeleteMany"):
+                    result = self._delete(request._filter, limit=1 if kind == "DeleteOne" else 0)
+                    raw["nRemoved"] += result.deleted_count
+                else:
+                    raise NotImplementedError(f"Bulk request {kind} is not supported by the memory backend")
+        return BulkWriteResult(raw, True)
+
+    def find_one_and_update(self, filter, update, upsert=False, array_filters=None, **kwargs):
+        with self._lock:
+            keys = self._matching_keys(filter, 1)
+            before = copy.deepcopy(self._docs[keys[0]]) if keys else None
+            self._update(filter, update, upsert, array_filters, limit=1)
+        return before
+
+    # ----- indexes -----
+
+    def create_index(self, keys, name=None, unique=False, **kwargs):
+        if isinstance(keys, str):
+            keys = [(keys, 1)]
+        keys = list(keys.items() if isinstance(keys, dict) else keys)
+        name = name or "_".join(f"{field}_{direction}" for field, direction in keys)
+        with self._lock:
+            if name not in self._indexes:
+                index = _Index(name, keys, unique=unique, **kwargs)
+                for key, doc in self._docs.items():
+                    index.add(key, doc)
+                self._indexes[name] = index
+        return name
+
+    def create_indexes(self, indexes, **kwargs):
+        return [self.create_index(index.document["key"].items(),
+                                  **{k: v for k, v in index.document.items() if k != "key"})
+                for index in indexes]
+
+    def drop_index(self, name, **kwargs):
+        with self._lock:
+            self._indexes.pop(name, None)
+
+    def drop_indexes(self, **kwargs):
+        with self._lock:
+            self._indexes.clear()
+
+    def index_information(self):
+        info = {"_id_": {"key": [("_id", 1)]}}
+        info.update({name: index.info() for name, index in self._indexes.items()})
+        return info
+
+    def list_indexes(self, **kwargs):
+        return MemoryCommandCursor(lambda: [{"name": name, **index}
+                                            for name, index in self.index_information().items()])
+
+    def drop(self, **kwargs):
+        self.database.drop_collection(self.name)
+
+    def __repr__(self):
+        return f"MemoryCollection({self.full_name!r})"
+
+
+# ===== AGGREGATION PIPELINE =====
+
+def _group(documents, spec):
+    groups = {}
+    for doc in documents:
+        group_id = _value(evaluate(spec["_id"], doc))
+        key = _hashable(group_id)
+        if key not in groups:
+            groups[key] = {"_id": group_id, "_values": defaultdict(list)}
+        for field, accumulator in spec.items():
+            if field == "_id":
+                continue
+            op, expr = next(iter(accumulator.items()))
+            value = 1 if op == "$count" else evaluate(expr, doc)
+            groups[key]["_values"][field].append(value)
+
+    results = []
+    for group in groups.values():
+        result = {"_id": group["_id"]}
+        for field, accumulator in spec.items():
+            if field == "_id":
+                continue
+            op = next(iter(accumulator))
+            values = group["_values"][field]
+            if op in ("$sum", "$avg", "$max", "$min"):
+                result[field] = _accumulate(op, values)
+            elif op == "$count":
+                result[field] = len(values)
+            elif op == "$first":
+                result[field] = _value(values[0])
+            elif op == "$last":
+                result[field] = _value(values[-1])
+            elif op == "$push":
+                result[field] = [v for v in values if v is not _MISSING]
+            elif op == "$addToSet":
+                unique = []
+                for value in values:
+                    if value is not _MISSING and not any(_equals(value, u) for u in unique):
+                        unique.append(value)
+                result[field] = unique
+            else:
+                raise NotImplementedError(f"Accumulator {op} is not supported by the memory backend")
+        results.append(result)
+    return results
+
+
+def _unwind(documents, spec):
+    if isinstance(spec, str):
+        spec = {"path": spec}
+    path = spec["path"][1:]
+    preserve = spec.get("preserveNullAndEmptyArrays", False)
+    index_field = spec.get("includeArrayIndex")
+    for doc in documents:
+        value = _get_path(doc, path)
+        if isinstance(value, list) and value:
+            for position, item in enumerate(value):
+                unwound = copy.deepcopy(doc)
+                _set_path(unwound, path, item)
+                if index_field:
+                    unwound[index_field] = position
+                yield unwound
+        elif isinstance(value, list) or value in (_MISSING, None):
+            if preserve:
+                if isinstance(value, list):
+                    _unset_path(doc, path)
+                if index_field:
+                    doc[index_field] = None
+                yield doc
+        else:
+            if index_field:
+                doc[index_field] = None
+            yield doc
+
+
+def _lookup(collection, documents, spec):
+    foreign = collection.database[spec["from"]]
+    for doc in documents:
+        if "pipeline" in spec:
+            variables = {name: _value(evaluate(expr, doc)) for name, expr in spec.get("let", {}).items()}
+            matched = run_pipeline(foreign, spec["pipeline"], variables)
+        else:
+            local = _get_path(doc, spec["localField"])
+            local = local if isinstance(local, list) else [_value(local)]
+            matched = foreign._select({spec["foreignField"]: {"$in": local}})
+        doc[spec["as"]] = matched
+        yield doc
+
+
+def _merge(collection, documents, spec):
+    if isinstance(spec, str):
+        spec = {"into": spec}
+    into = spec["into"]
+    if isinstance(into, dict):
+        target = collection.database.client[into.get("db", collection.database.name)][into["coll"]]
+    else:
+        target = collection.database[into]
+    on = spec.get("on", "_id")
+    on = [on] if isinstance(on, str) else list(on)
+    when_matched = spec.get("whenMatched", "merge")
+    when_not_matched = spec.get("whenNotMatched", "insert")
+
+    with target._lock:
+        for doc in documents:
+            keys = target._matching_keys({field: doc.get(field) for field in on}, limit=1)
+            if keys:
+                key = keys[0]
+                existing = target._docs[key]
+                if when_matched == "replace":
+                    new_doc = _normalize(copy.deepcopy(doc))
+                    new_doc["_id"] = existing["_id"]
+                elif when_matched == "merge":
+                    new_doc = {**copy.deepcopy(existing), **_normalize(copy.deepcopy(doc))}
+                    new_doc["_id"] = existing["_id"]
+                elif when_matched == "keepExisting":
+                    continue
+                elif when_matched == "fail":
+                    raise ValueError(f"$merge found an existing document in {target.full_name}")
+                else:
+                    raise NotImplementedError("Pipeline-style whenMatched is not supported by the memory backend")
+                target._replace(key, new_doc)
+            elif when_not_matched == "insert":
+                target._insert(doc)
+            elif when_not_matched == "fail":
+                raise ValueError(f"$merge could not find a matching document in {target.full_name}")
+
+
+def run_pipeline(collection, pipeline, variables=None):
+    """Execute an aggregation pipeline against a memory collection"""
+    stages = list(pipeline)
+    if stages and "$match" in stages[0]:
+        documents = collection._select(stages.pop(0)["$match"], variables)
+    else:
+        documents = collection._select({})
+
+    for stage in stages:
+        name, spec = next(iter(stage.items()))
+        if name == "$match":
+            spec = _normalize(spec)
+            documents = [doc for doc in documents if matches(doc, spec, variables)]
+        elif name == "$project":
+            documents = [project(doc, spec) for doc in documents]
+        elif name in ("$addFields", "$set"):
+            for doc in documents:
+                for field, expr in spec.items():
+                    value = evaluate(expr, doc, variables)
+                    if value is not _MISSING:
+                        _set_path(doc, field, _normalize(value))
+        elif name == "$unset":
+            for doc in documents:
+                for field in [spec] if isinstance(spec, str) else spec:
+                    _unset_path(doc, field)
+        elif name == "$replaceRoot":
+            documents = [evaluate(spec["newRoot"], doc, variables) for doc in documents]
+        elif name == "$sort":
+            documents = _sort_documents(documents, spec.items())
+        elif name == "$skip":
+            documents = documents[spec:]
+        elif name == "$limit":
+            documents = documents[:spec]
+        elif name == "$sample":
+            documents = random.sample(documents, min(spec["size"], len(documents)))
+        elif name == "$count":
+            documents = [{spec: len(documents)}] if documents else []
+        elif name == "$unwind":
+            documents = list(_unwind(documents, spec))
+        elif name == "$group":
+            documents = _group(documents, spec)
+        elif name == "$lookup":
+            documents = list(_lookup(collection, documents, spec))
+        elif name == "$merge":
+            _merge(collection, documents, spec)
+            documents = []
+        elif name == "$out":
+            target = collection.database[spec if isinstance(spec, str) else spec["coll"]]
+            with target._lock:
+                for key in list(target._docs):
+                    target._remove(key)
+                for doc in documents:
+                    target._insert(doc)
+            documents = []
+        else:
+            raise NotImplementedError(f"Stage {name} is not supported by the memory backend")
+    return documents
+
+
+# ===== DATABASE AND CLIENT =====
+
+class MemoryDatabase:
+    """Named group of memory collections"""
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self._collections = {}
+
+    def get_collection(self, name, **kwargs):
+        with self.client._lock:
+            if name not in self._collections:
+                self._collections[name] = MemoryCollection(self, name)
+            return self._collections[name]
+
+    def __getitem__(self, name):
+        return self.get_collection(name)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self.get_collection(name)
+
+    def with_options(self, **kwargs):
+        return self
+
+    def create_collection(self, name, **kwargs):
+        return self.get_collection(name)
+
+    def list_collection_names(self, **kwargs):
+        return [name for name, c in self._collections.items() if c._docs or c._indexes]
+
+    def drop_collection(self, name, **kwargs):
+        with self.client._lock:
+            self._collections.pop(name if isinstance(name, str) else name.name, None)
+
+    def command(self, command, *args, **kwargs):
+        name = command if isinstance(command, str) else next(iter(command))
+        if name in ("ping", "collMod", "shardCollection", "enableSharding"):
+            return {"ok": 1.0}
+        if name == "dbStats":
+            return {"db": self.name, "collections": len(self._collections), "ok": 1.0}
+        raise NotImplementedError(f"Command {name} is not supported by the memory backend")
+
+    def __repr__(self):
+        return f"MemoryDatabase({self.name!r})"
+
+
+class MemorySession:
+    """Session so code written for transactions also runs in memory
+
+    A transaction snapshots every collection of the client when it starts and
+    restores them on abort. Writes are not isolated from other sessions, but
+    ``with_transaction`` holds the client lock for the whole callback.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.in_transaction = False
+        self._snapshot = None
+
+    def start_transaction(self, *args, **kwargs):
+        with self.client._lock:
+            self._snapshot = self.client._snapshot()
+        self.in_transaction = True
+        return self
+
+    def commit_transaction(self):
+        self._snapshot = None
+        self.in_transaction = False
+
+    def abort_transaction(self):
+        if self._snapshot is not None:
+            with self.client._lock:
+                self.client._restore(self._snapshot)
+        self._snapshot = None
+        self.in_transaction = False
+
+    def with_transaction(self, callback, *args, **kwargs):
+        with self.client._lock:
+            self.start_transaction()
+            try:
+                result = callback(self)
+            except BaseException:
+                self.abort_transaction()
+                raise
+            self.commit_transaction()
+            return result
+
+    def end_session(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.in_transaction:
+            self.abort_transaction()
+        self.end_session()
+
+
+class MemoryClient:
+    """Embedded stand-in for ``MongoClient``; no server, starts instantly"""
+
+    def __init__(self, host=None, **kwargs):
+        self.host = host or MEMORY_SCHEME
+        self._lock = threading.RLock()
+        self._databases = {}
+
+    @classmethod
+    def from_uri(cls, uri):
+        """Return the shared client for ``uri`` so handles on the same URI see the same data"""
+        with _CLIENTS_LOCK:
+            if uri not in _CLIENTS:
+                _CLIENTS[uri] = cls(uri)
+            return _CLIENTS[uri]
+
+    def get_database(self, name=None, **kwargs):
+        name = name or "test"
+        with self._lock:
+            if name not in self._databases:
+                self._databases[name] = MemoryDatabase(self, name)
+            return self._databases[name]
+
+    def __getitem__(self, name):
+        return self.get_database(name)
+
+    @property
+    def admin(self):
+        return self.get_database("admin")
+
+    def list_database_names(self, **kwargs):
+        return list(self._databases)
+
+    def drop_database(self, name, **kwargs):
+        with self._lock:
+            self._databases.pop(name if isinstance(name, str) else name.name, None)
+
+    def _snapshot(self):
+        return {name: (database, dict(database._collections),
+                       {c: collection._snapshot() for c, collection in database._collections.items()})
+                for name, database in self._databases.items()}
+
+    def _restore(self, snapshot):
+        self._databases = {}
+        for name, (database, collections, states) in snapshot.items():
+            database._collections = dict(collections)
+            for c, collection in collections.items():
+                collection._restore(states[c])
+            self._databases[name] = database
+
+    def start_session(self, **kwargs):
+        return MemorySession(self)
+
+    def server_info(self, **kwargs):
+        return {"version": "7.0.0-memory", "ok": 1.0}
+
+    def close(self):
+        pass
+
+    def __repr__(self):
+        return f"MemoryClient({self.host!r})"
@@ -0,0 +1,129 @@
+"""Parallel full-collection scans over key ranges.
+
+``parallel_scan`` splits a collection into ranges of an indexed, evenly spread
+key (``pid`` UUIDs, ``_id`` ObjectIds) using split points drawn from a
+``$sample`` of the key, the way ``splitVector`` picks chunk bounds. It then
+reads the ranges concurrently in a process pool, each worker with its own
+client, so decoding BSON and reducing documents scale with cores instead of
+running on one cursor.
+
+Workers either return their documents (merged in key order) or a partial
+result from ``reducer(documents)``. The partials are merged with
+``combine(partials)``, which defaults to adding them, e.g. ``Counter``\\s.
+``reducer`` and ``combine`` are sent to other processes, so they must be
+module-level functions.
+
+Collections reached through an explicit ``client=`` object or a ``memory://``
+URI cannot be reopened in another process, so they are scanned with threads.
+"""
+import functools
+import operator
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Same value as memory.MEMORY_SCHEME (memory.py is only imported when used)
+MEMORY_SCHEME = "memory://"
+
+# Per-process clients, reused by every partition a worker reads
+_CLIENTS = {}
+
+
+class CollectionSpec:
+    """Picklable way to (re)open a collection in a worker process"""
+
+    def __init__(self, uri, db_name, name, client=None, client_options=None):
+        self.uri = uri
+        self.db_name = db_name
+        self.name = name
+        # An explicit client cannot cross processes: scans using it run on threads
+        self.client = client
+        self.client_options = client_options or {}
+
+    @property
+    def local_only(self):
+        return self.client is not None or (self.uri or '').startswith(MEMORY_SCHEME)
+
+    def open(self):
+        client = self.client or _CLIENTS.get(self.uri)
+        if client is None:
+            uri = self.uri
+            if uri and uri.startswith(MEMORY_SCHEME):
+                from .memory import MemoryClient
+                client = MemoryClient.from_uri(uri)
+            else:
+                from pymongo import MongoClient
+                client = MongoClient(uri, **self.client_options)
+            _CLIENTS[self.uri] = client
+        return client[self.db_name][self.name]
+
+    def __getstate__(self):
+        return {**self.__dict__, 'client': None}
+
+
+def split_points(collection, key, partitions, oversample=20):
+    """``partitions - 1`` increasing values of ``key`` cutting the collection into even ranges"""
+    if partitions <= 1:
+        return []
+    sample = collection.aggregate([
+        {'$sample': {'size': partitions * oversample}},
+        {'$project': {'_id': 0, 'value': f'${key}'}},
+    ])
+    values = sorted({document['value'] for document in sample if document.get('value') is not None})
+    step = len(values) / partitions
+    points = []
+    for i in range(1, partitions):
+        value = values[int(i * step)] if values else None
+        if value is not None and (not points or value > points[-1]):
+            points.append(value)
+    return points
+
+
+def ranges(key, points):
+    """Filters covering the whole key space, one per range between consecutive split points"""
+    bounds = [None, *points, None]
+    filters = []
+    for low, high in zip(bounds, bounds[1:]):
+        condition = {}
+        if low is not None:
+            condition['$gte'] = low
+        if high is not None:
+            condition['$lt'] = high
+        filters.append({key: condition} if condition else {})
+    return filters
+
+
+def _scan_range(spec, filter, projection, key, reducer, batch_size):
+    """Worker: read one range in key order and return its documents or ``reducer(documents)``"""
+    cursor = spec.open().find(filter, projection).sort(key, 1).batch_size(batch_size)
+    return reducer(cursor) if reducer else list(cursor)
+
+
+def parallel_scan(spec, filter=None, projection=None, key='_id', partitions=None, workers=None,
+                  reducer=None, combine=None, batch_size=1000, sampler=None):
+    """Scan the collection of ``spec`` in ``partitions`` key ranges on ``workers`` processes
+
+    ``sampler`` is the collection used to draw split points (defaults to ``spec.open()``).
+    Returns the documents in key order, or ``combine(partials)`` when a ``reducer`` is given.
+    """
+    workers = workers or os.cpu_count() or 1
+    partitions = partitions or workers * 2
+    points = split_points(sampler if sampler is not None else spec.open(), key, partitions)
+
+    filters = []
+    for key_range in ranges(key, points):
+        if filter and key_range:
+            filters.append({'$and': [filter, key_range]})
+        else:
+            filters.append(filter or key_range)
+
+    pool_class = ThreadPoolExecutor if spec.local_only else ProcessPoolExecutor
+    with pool_class(max_workers=min(workers, len(filters))) as pool:
+        futures = [pool.submit(_scan_range, spec, range_filter, projection, key, reducer, batch_size)
+                   for range_filter in filters]
+        partials = [future.result() for future in futures]
+
+    if reducer is None:
+        return [document for partial in partials for document in partial]
+    if combine is None:
+        return functools.reduce(operator.add, partials)
+    return combine(partials)
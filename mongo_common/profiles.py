@@ -0,0 +1,70 @@
+"""Named connection profiles: wire compression, cursor batch size, allowDiskUse, write concern.
+
+A profile is chosen once per ``Database`` (``Database(profile="throughput")``):
+its client options go to ``MongoClient`` and its cursor options are applied by
+``ResilientCollection`` to every ``find``/``aggregate`` unless the call sets
+them itself.
+
+- ``latency``: small interactive queries. Cheap snappy (or level 1 zlib)
+  compression, server default batch sizes, ``w=1`` acknowledgements.
+- ``throughput``: large result sets such as ``get_items`` without a limit.
+  zstd (then snappy/zlib) compression, 1000-document batches, ``allowDiskUse``
+  and majority writes.
+- ``bulk-export``: full collection scans and exports. Strongest compression
+  and 10000-document batches to minimise round trips.
+
+Compressors are negotiated with the server in order; unavailable ones
+(``zstandard``/``python-snappy`` not installed, or disabled server side) are
+skipped by the driver.
+"""
+
+
+class ConnectionProfile:
+    """Client and cursor settings applied together under one name"""
+
+    def __init__(self, name, compressors=None, zlib_level=None, batch_size=None, allow_disk_use=None,
+                 write_concern=None):
+        self.name = name
+        self.compressors = compressors
+        self.zlib_level = zlib_level
+        self.batch_size = batch_size
+        self.allow_disk_use = allow_disk_use
+        self.write_concern = write_concern or {}
+
+    def client_options(self):
+        """Keyword arguments for ``MongoClient``"""
+        options = dict(self.write_concern)
+        if self.compressors:
+            options['compressors'] = self.compressors
+        if self.zlib_level is not None:
+            options['zlibCompressionLevel'] = self.zlib_level
+        return options
+
+    def cursor_options(self, kwargs):
+        """Add the profile's ``aggregate`` options to ``kwargs`` (explicit values win)"""
+        if self.batch_size:
+            kwargs.setdefault('batchSize', self.batch_size)
+        if self.allow_disk_use is not None:
+            kwargs.setdefault('allowDiskUse', self.allow_disk_use)
+        return kwargs
+
+    def __repr__(self):
+        return f"ConnectionProfile({self.name!r})"
+
+
+PROFILES = {
+    'latency': ConnectionProfile('latency', compressors='snappy,zlib', zlib_level=1, write_concern={'w': 1}),
+    'throughput': ConnectionProfile('throughput', compressors='zstd,snappy,zlib', batch_size=1000,
+                                    allow_disk_use=True, write_concern={'w': 'majority'}),
+    'bulk-export': ConnectionProfile('bulk-export', compressors='zstd,zlib', zlib_level=9, batch_size=10000,
+                                     allow_disk_use=True, write_concern={'w': 1}),
+}
+
+
+def get_profile(profile):
+    """Resolve a profile name (or pass a ConnectionProfile / None through)"""
+    if profile is None or isinstance(profile, ConnectionProfile):
+        return profile
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown connection profile {profile!r}, expected one of {tuple(PROFILES)}")
+    return PROFILES[profile]
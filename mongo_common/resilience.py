@@ -0,0 +1,347 @@
+"""Typed errors, timeouts, retries with jittered backoff and per-cluster circuit breaking.
+
+``ResilientCollection`` wraps a PyMongo (or memory) collection so every call:
+- gets a server-side ``maxTimeMS`` (default or per-call via ``Executor.timeout``),
+- is refused immediately while the cluster's circuit breaker is open,
+- is retried with full-jitter exponential backoff when it is a read that failed
+  with a retryable error (writes rely on the driver's own retryable writes, since
+  re-running a ``$merge``/``$concatArrays`` update is not idempotent),
+- raises a ``DatabaseError`` subclass instead of a raw driver exception.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_CLIENT_TIMEOUTS = {
+    'connectTimeoutMS': 5000,
+    'serverSelectionTimeoutMS': 5000,
+    'socketTimeoutMS': 30000,
+}
+
+# Server error codes that are safe to retry (see the MongoDB retryable reads spec)
+RETRYABLE_CODES = {6, 7, 89, 91, 189, 262, 9001, 10107, 11600, 11602, 13435, 13436}
+DOCUMENT_VALIDATION_FAILURE = 121
+
+
+class DatabaseError(Exception):
+    """Base class for errors raised by the database layer"""
+
+    def __init__(self, message, operation=None, cause=None):
+        super().__init__(message)
+        self.operation = operation
+        self.cause = cause
+
+
+class QueryTimeoutError(DatabaseError):
+    """The operation exceeded maxTimeMS or the socket timeout"""
+
+
+class ServiceUnavailableError(DatabaseError):
+    """No suitable server could be reached (failover, network error, ...)"""
+
+
+class CircuitOpenError(ServiceUnavailableError):
+    """The circuit breaker is open; the call was not attempted"""
+
+
+class QueryError(DatabaseError):
+    """The server rejected the operation; retrying will not help"""
+
+
+class DocumentValidationError(QueryError):
+    """A write broke the collection's ``$jsonSchema`` validator"""
+
+
+def classify(exc):
+    """Map a driver exception to ``(DatabaseError subclass, retryable)``"""
+    from pymongo import errors
+
+    if isinstance(exc, DatabaseError):
+        return type(exc), False
+    if isinstance(exc, errors.ExecutionTimeout):
+        return QueryTimeoutError, False
+    if isinstance(exc, errors.NetworkTimeout):
+        return QueryTimeoutError, True
+    if isinstance(exc, (errors.AutoReconnect, errors.ConnectionFailure)):
+        return ServiceUnavailableError, True
+    if isinstance(exc, errors.BulkWriteError):
+        if any(error.get('code') == DOCUMENT_VALIDATION_FAILURE for error in exc.details.get('writeErrors', ())):
+            return DocumentValidationError, False
+    elif isinstance(exc, errors.OperationFailure) and exc.code == DOCUMENT_VALIDATION_FAILURE:
+        return DocumentValidationError, False
+    if isinstance(exc, errors.OperationFailure):
+        retryable = exc.has_error_label('RetryableWriteError') or exc.code in RETRYABLE_CODES
+        return (ServiceUnavailableError if retryable else QueryError), retryable
+    return QueryError, False
+
+
+def is_cluster_failure(exc, error_class):
+    """Whether a failure says the cluster is unhealthy (the breaker counts those)
+
+    A server reply, even an error or an exceeded maxTimeMS, shows the cluster is
+    up: only connection failures and socket timeouts count.
+    """
+    from pymongo import errors
+
+    if issubclass(error_class, ServiceUnavailableError):
+        return True
+    if issubclass(error_class, QueryTimeoutError):
+        cause = exc.cause if isinstance(exc, DatabaseError) else exc
+        return not isinstance(cause, errors.ExecutionTimeout)
+    return False
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, bounded by attempts and a total deadline"""
+
+    def __init__(self, max_attempts=3, base_delay=0.05, max_delay=1.0, deadline=5.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    def delay(self, attempt):
+        """Sleep time before retry number ``attempt`` (1-based)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures; lets one probe call through after ``reset_timeout``"""
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    _registry = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_cluster(cls, key, **kwargs):
+        """Shared breaker for every client talking to the same cluster"""
+        with cls._registry_lock:
+            if key not in cls._registry:
+                cls._registry[key] = cls(**kwargs)
+            return cls._registry[key]
+
+    def before_call(self, operation=None):
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    raise CircuitOpenError('Circuit breaker is open', operation)
+                self.state = self.HALF_OPEN
+            elif self.state == self.HALF_OPEN:
+                raise CircuitOpenError('Circuit breaker is probing the cluster', operation)
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class Executor:
+    """Runs database calls with timeouts, retries and circuit breaking"""
+
+    def __init__(self, breaker=None, retry_policy=None, max_time_ms=None):
+        self.breaker = breaker or CircuitBreaker()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.default_max_time_ms = max_time_ms
+        self._local = threading.local()
+
+    @property
+    def max_time_ms(self):
+        return getattr(self._local, 'max_time_ms', self.default_max_time_ms)
+
+    @contextmanager
+    def timeout(self, max_time_ms):
+        """Override maxTimeMS for the calls made by this thread inside the block"""
+        previous = self.max_time_ms
+        self._local.max_time_ms = max_time_ms
+        try:
+            yield self
+        finally:
+            self._local.max_time_ms = previous
+
+    def call(self, operation, fn, retry=True):
+        """Call ``fn()``; retry retryable failures when ``retry``; raise DatabaseError subclasses"""
+        policy = self.retry_policy
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            self.breaker.before_call(operation)
+            try:
+                result = fn()
+            except Exception as exc:
+                error_class, retryable = classify(exc)
+                if is_cluster_failure(exc, error_class):
+                    self.breaker.record_failure()
+                else:
+                    # The server answered: closes the breaker (releases a half-open probe)
+                    self.breaker.record_success()
+                delay = policy.delay(attempt)
+                if (not retry or not retryable or attempt >= policy.max_attempts
+                        or time.monotonic() - started + delay > policy.deadline):
+                    if isinstance(exc, DatabaseError):
+                        raise
+                    raise error_class(f'{operation} failed: {exc}', operation, exc) from exc
+                time.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return result
+
+
+def _is_write_pipeline(pipeline):
+    return any('$merge' in stage or '$out' in stage for stage in pipeline)
+
+
+class ResilientCursor:
+    """Cursor whose first batch is fetched through the executor; later errors are typed"""
+
+    def __init__(self, executor, operation, factory, retry=True):
+        self._executor = executor
+        self._operation = operation
+        self._factory = factory
+        self._retry = retry
+        self._modifiers = []
+        self._cursor = None
+        self._first = None
+
+    def _start(self):
+        def open_cursor():
+            cursor = self._factory()
+            for name, args, kwargs in self._modifiers:
+                cursor = getattr(cursor, name)(*args, **kwargs)
+            try:
+                first = [next(cursor)]
+            except StopIteration:
+                first = []
+            return cursor, first
+
+        self._cursor, self._first = self._executor.call(self._operation, open_cursor, self._retry)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._cursor is None:
+            self._start()
+        if self._first:
+            return self._first.pop()
+        try:
+            return next(self._cursor)
+        except StopIteration:
+            raise
+        except Exception as exc:
+            error_class, _ = classify(exc)
+            raise error_class(f'{self._operation} failed: {exc}', self._operation, exc) from exc
+
+    def __getattr__(self, name):
+        # sort/skip/limit/batch_size/... are recorded and replayed on (re)open
+        def modifier(*args, **kwargs):
+            self._modifiers.append((name, args, kwargs))
+            return self
+        return modifier
+
+    def close(self):
+        if self._cursor is not None:
+            self._cursor.close()
+
+    def to_list(self, length=None):
+        items = list(self)
+        return items if length is None else items[:length]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class ResilientCollection:
+    """Collection proxy routing every call through an ``Executor`` (and optional ``ReadRouter``)
+
+    An optional ``profiles.ConnectionProfile`` supplies default cursor batch sizes and allowDiskUse.
+    """
+
+    _READS = ('find_one', 'count_documents', 'estimated_document_count', 'distinct')
+    _WRITES = ('insert_one', 'insert_many', 'update_one', 'update_many', 'replace_one',
+               'delete_one', 'delete_many', 'bulk_write', 'find_one_and_update',
+               'create_index', 'create_indexes', 'drop_index')
+
+    def __init__(self, collection, executor, router=None, profile=None):
+        self.collection = collection
+        self.executor = executor
+        self.router = router
+        self.profile = profile
+
+    @property
+    def name(self):
+        return self.collection.name
+
+    @property
+    def database(self):
+        return self.collection.database
+
+    def _operation(self, method):
+        return f'{self.collection.name}.{method}'
+
+    def _target(self, kwargs):
+        """Collection and kwargs for a call, resolved now for the calling thread"""
+        if self.router is None:
+            return self.collection, kwargs
+        return self.router.route(self.collection), self.router.bind(kwargs)
+
+    def with_options(self, **kwargs):
+        return ResilientCollection(self.collection.with_options(**kwargs), self.executor, self.router,
+                                   self.profile)
+
+    def find(self, *args, **kwargs):
+        collection, kwargs = self._target(kwargs)
+        max_time_ms = self.executor.max_time_ms
+        cursor = ResilientCursor(self.executor, self._operation('find'),
+                                 lambda: collection.find(*args, **kwargs))
+        if self.profile is not None and self.profile.batch_size:
+            # Recorded first, so a caller's own batch_size() still wins
+            cursor.batch_size(self.profile.batch_size)
+        return cursor.max_time_ms(max_time_ms) if max_time_ms else cursor
+
+    def aggregate(self, pipeline, **kwargs):
+        collection, kwargs = self._target(kwargs)
+        if self.executor.max_time_ms:
+            kwargs.setdefault('maxTimeMS', self.executor.max_time_ms)
+        if self.profile is not None:
+            self.profile.cursor_options(kwargs)
+        operation = self._operation('aggregate')
+        if _is_write_pipeline(pipeline):
+            cursor = self.executor.call(operation, lambda: collection.aggregate(pipeline, **kwargs),
+                                        retry=False)
+            return ResilientCursor(self.executor, operation, lambda: cursor, retry=False)
+        return ResilientCursor(self.executor, operation, lambda: collection.aggregate(pipeline, **kwargs))
+
+    def __getattr__(self, name):
+        if name not in self._READS and name not in self._WRITES:
+            return getattr(self.collection, name)
+        retry = name in self._READS
+
+        def call(*args, **kwargs):
+            collection, kwargs = self._target(kwargs)
+            if retry and self.executor.max_time_ms and name != 'estimated_document_count':
+                kwargs.setdefault('max_time_ms' if name == 'find_one' else 'maxTimeMS',
+                                  self.executor.max_time_ms)
+            method = getattr(collection, name)
+            return self.executor.call(self._operation(name), lambda: method(*args, **kwargs), retry)
+        return call
@@ -0,0 +1,101 @@
+"""Read preference routing and causally consistent sessions.
+
+A ``ReadRouter`` decides, per thread, which replica set members serve reads:
+a per-call override (``router.read_preference(...)``) wins over a per-method
+default (``router.for_method(...)``), which wins over the router default.
+Inside ``router.causal_session(client)`` every call is bound to a causally
+consistent session with majority read/write concern, so a read routed to a
+secondary still observes the writes made earlier in the block.
+"""
+import threading
+from contextlib import contextmanager
+
+MODES = ('primary', 'primaryPreferred', 'secondary', 'secondaryPreferred', 'nearest')
+
+
+def read_preference(mode, tag_sets=None, max_staleness=-1):
+    """Build a PyMongo read preference from a mode name, tag sets and maxStalenessSeconds"""
+    if mode is None or not isinstance(mode, str):
+        return mode
+    from pymongo import read_preferences
+
+    if mode not in MODES:
+        raise ValueError(f"Unknown read preference {mode!r}, expected one of {MODES}")
+    if mode == 'primary':
+        if tag_sets or max_staleness != -1:
+            raise ValueError("primary read preference does not accept tag sets or maxStalenessSeconds")
+        return read_preferences.Primary()
+    classes = {
+        'primaryPreferred': read_preferences.PrimaryPreferred,
+        'secondary': read_preferences.Secondary,
+        'secondaryPreferred': read_preferences.SecondaryPreferred,
+        'nearest': read_preferences.Nearest,
+    }
+    return classes[mode](tag_sets=tag_sets, max_staleness=max_staleness)
+
+
+class ReadRouter:
+    """Chooses the read preference and session applied to each collection call"""
+
+    def __init__(self, default=None):
+        self.default = read_preference(default)
+        self._local = threading.local()
+
+    @property
+    def current(self):
+        """Read preference in effect for this thread (None means the client default)"""
+        override = getattr(self._local, 'override', None)
+        if override is not None:
+            return override
+        method = getattr(self._local, 'method', None)
+        return method if method is not None else self.default
+
+    @property
+    def session(self):
+        return getattr(self._local, 'session', None)
+
+    @contextmanager
+    def _set(self, name, value):
+        previous = getattr(self._local, name, None)
+        setattr(self._local, name, value)
+        try:
+            yield self
+        finally:
+            setattr(self._local, name, previous)
+
+    def read_preference(self, mode, tag_sets=None, max_staleness=-1):
+        """Per-call override: route the reads made inside the block"""
+        return self._set('override', read_preference(mode, tag_sets, max_staleness))
+
+    def for_method(self, mode):
+        """Per-method default, used unless a per-call override is active"""
+        return self._set('method', read_preference(mode))
+
+    @contextmanager
+    def causal_session(self, client):
+        """Bind the calls made inside the block to one causally consistent session"""
+        if self.session is not None:
+            yield self.session
+            return
+        with client.start_session(causal_consistency=True) as session:
+            with self._set('session', session):
+                yield session
+
+    def route(self, collection):
+        """Collection configured for the current read preference and session"""
+        options = {}
+        preference = self.current
+        if preference is not None:
+            options['read_preference'] = preference
+        if self.session is not None:
+            from pymongo.read_concern import ReadConcern
+            from pymongo.write_concern import WriteConcern
+            options['read_concern'] = ReadConcern('majority')
+            options['write_concern'] = WriteConcern('majority')
+        return collection.with_options(**options) if options else collection
+
+    def bind(self, kwargs):
+        """Add the active session to a call's keyword arguments"""
+        if self.session is not None:
+            kwargs.setdefault('session', self.session)
+        return kwargs
@@ -0,0 +1,263 @@
+"""Approximate counts for stats and dashboards.
+
+- ``CountCache``: exact counts reused for ``ttl`` seconds. A cached value is at
+  most ``ttl`` seconds stale. The cache keeps a bounded number of entries (LRU).
+- ``estimated_document_count`` (used by ``Database.count_items(approximate=True)``
+  when there is no filter) reads the collection metadata in constant time. It
+  is exact after a clean shutdown. It can drift after an unclean shutdown, and
+  on sharded clusters it counts orphaned documents too.
+- ``HyperLogLog`` estimates distinct values with ``2**p`` one-byte registers
+  (4 KB for p=12). The relative standard error is ``1.04 / sqrt(2**p)``, which
+  is ±1.6% for p=12 (within ±3.2% 95% of the time).
+- ``CountMinSketch`` estimates frequencies in ``width * depth`` counters. An
+  estimate is never below the true count. It exceeds it by at most
+  ``e / width * N`` (N = values added) with probability ``1 - e**-depth``. For
+  the defaults that is +0.13% of N with 99.3% probability.
+- ``FieldSketch`` combines both for one field and keeps the ``capacity`` most
+  frequent values as top-K candidates. With ``capacity=256``, any value
+  holding more than about N/256 of the occurrences is kept.
+
+Every query on a sketch costs the same whatever the collection size. Sketches
+built on separate ranges (``parallel_scan``) merge with ``+``.
+"""
+import hashlib
+import json
+import math
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+
+def _hashes(value):
+    """Two independent 64-bit hashes, stable across processes (unlike ``hash()``)"""
+    digest = hashlib.blake2b(f'{type(value).__name__}:{value}'.encode(), digest_size=16).digest()
+    return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little')
+
+
+def _lookup(document, path):
+    for part in path.split('.'):
+        if not isinstance(document, dict):
+            return None
+        document = document.get(part)
+    return document
+
+
+class HyperLogLog:
+    """Distinct-count estimator"""
+
+    def __init__(self, p=12):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+
+    def add(self, value, hashes=None):
+        h = (hashes or _hashes(value))[0]
+        index = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def estimate(self):
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            return round(m * math.log(m / zeros))  # Linear counting for small cardinalities
+        return round(raw)
+
+    @property
+    def relative_error(self):
+        return 1.04 / math.sqrt(self.m)
+
+    def __add__(self, other):
+        if self.p != other.p:
+            raise ValueError("Cannot merge HyperLogLogs of different precision")
+        merged = HyperLogLog(self.p)
+        merged.registers = bytearray(map(max, self.registers, other.registers))
+        return merged
+
+
+class CountMinSketch:
+    """Frequency estimator (never underestimates)"""
+
+    def __init__(self, width=2048, depth=5):
+        self.width = width
+        self.depth = depth
+        self.rows = [array('q', bytes(8 * width)) for _ in range(depth)]
+        self.total = 0
+
+    def _cells(self, hashes):
+        h1, h2 = hashes
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def add(self, value, count=1, hashes=None):
+        for row, cell in zip(self.rows, self._cells(hashes or _hashes(value))):
+            row[cell] += count
+        self.total += count
+
+    def estimate(self, value, hashes=None):
+        return min(row[cell] for row, cell in zip(self.rows, self._cells(hashes or _hashes(value))))
+
+    @property
+    def epsilon(self):
+        """Overestimate bound, as a fraction of ``total``"""
+        return math.e / self.width
+
+    @property
+    def delta(self):
+        """Probability that an estimate exceeds the bound"""
+        return math.exp(-self.depth)
+
+    def __add__(self, other):
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError("Cannot merge Count-Min sketches of different shapes")
+        merged = CountMinSketch(self.width, self.depth)
+        merged.rows = [array('q', map(int.__add__, a, b)) for a, b in zip(self.rows, other.rows)]
+        merged.total = self.total + other.total
+        return merged
+
+
+class FieldSketch:
+    """Distinct values, frequencies and top-K of one (dotted, possibly array) field"""
+
+    def __init__(self, field, p=12, width=2048, depth=5, capacity=256):
+        self.field = field
+        self.capacity = capacity
+        self.hll = HyperLogLog(p)
+        self.cms = CountMinSketch(width, depth)
+        self.candidates = {}  # value -> estimated count, at most ``capacity`` entries
+        self._floor = 0  # Smallest candidate count once the candidate set is full
+        self.documents = 0
+
+    def add(self, value):
+        hashes = _hashes(value)
+        self.hll.add(value, hashes)
+        self.cms.add(value, hashes=hashes)
+        estimate = self.cms.estimate(value, hashes)
+        if value in self.candidates:
+            self.candidates[value] = estimate
+        elif len(self.candidates) < self.capacity:
+            self.candidates[value] = estimate
+            if len(self.candidates) == self.capacity:
+                self._floor = min(self.candidates.values())
+        elif estimate > self._floor:
+            del self.candidates[min(self.candidates, key=self.candidates.get)]
+            self.candidates[value] = estimate
+            self._floor = min(self.candidates.values())
+
+    def add_document(self, document):
+        """Count the field of a document, once per element when it is an array (like ``$unwind``)"""
+        self.documents += 1
+        value = _lookup(document, self.field)
+        if value is None:
+            return
+        for item in value if isinstance(value, list) else (value,):
+            if item is not None:
+                self.add(item)
+
+    def distinct(self):
+        return self.hll.estimate()
+
+    def count(self, value):
+        return self.cms.estimate(value)
+
+    def top(self, k=None):
+        """``[(value, estimated count)]``, most frequent first"""
+        ranked = sorted(((value, self.cms.estimate(value)) for value in self.candidates),
+                        key=lambda pair: pair[1], reverse=True)
+        return ranked[:k] if k else ranked
+
+    def error_bounds(self):
+        return {
+            'distinct_relative_error': round(self.hll.relative_error, 4),
+            'count_overestimate': math.ceil(self.cms.epsilon * self.cms.total),
+            'count_confidence': round(1 - self.cms.delta, 4),
+        }
+
+    def __add__(self, other):
+        merged = FieldSketch(self.field, self.hll.p, self.cms.width, self.cms.depth, self.capacity)
+        merged.hll = self.hll + other.hll
+        merged.cms = self.cms + other.cms
+        merged.documents = self.documents + other.documents
+        values = set(self.candidates) | set(other.candidates)
+        ranked = sorted(values, key=merged.cms.estimate, reverse=True)[:self.capacity]
+        merged.candidates = {value: merged.cms.estimate(value) for value in ranked}
+        if len(merged.candidates) >= self.capacity:
+            merged._floor = min(merged.candidates.values())
+        return merged
+
+
+def sketch_documents(fields, documents, **options):
+    """``{field: FieldSketch}`` of the documents (a ``parallel_scan`` reducer via functools.partial)"""
+    sketches = {field: FieldSketch(field, **options) for field in fields}
+    for document in documents:
+        for sketch in sketches.values():
+            sketch.add_document(document)
+    return sketches
+
+
+def merge_sketches(partials):
+    """``parallel_scan`` combine for ``sketch_documents`` results"""
+    merged = {}
+    for partial in partials:
+        for field, sketch in partial.items():
+            merged[field] = merged[field] + sketch if field in merged else sketch
+    return merged
+
+
+def canonical_key(value):
+    """Text key for a filter or pipeline, keeping its key order
+
+    MongoDB compares embedded documents field by field in order and applies a
+    multi-key ``$sort`` in order, so reordered keys can be a different query.
+    """
+    return json.dumps(value, default=repr)
+
+
+class CountCache:
+    """Counts computed on demand and reused for ``ttl`` seconds
+
+    At most ``max_entries`` counts are kept: expired ones are purged on insert,
+    then the least recently used are evicted.
+    """
+
+    def __init__(self, ttl=60.0, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._counts = OrderedDict()  # key -> (expires_at, count), least recently used first
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._counts.get(key)
+            if cached is not None and cached[0] > now:
+                self._counts.move_to_end(key)
+                return cached[1]
+        count = compute()
+        self._put(key, count, now)
+        return count
+
+    def _put(self, key, count, now):
+        with self._lock:
+            self._counts[key] = (now + self.ttl, count)
+            self._counts.move_to_end(key)
+            for expired in [k for k, (expires_at, _) in self._counts.items() if expires_at <= now]:
+                del self._counts[expired]
+            while len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+
+    def __len__(self):
+        return len(self._counts)
+
+    def invalidate(self, table=None):
+        """Forget the cached counts (of one table, whose name starts every key)"""
+        with self._lock:
+            if table is None:
+                self._counts.clear()
+            else:
+                for key in [key for key in self._counts if key[0] == table]:
+                    del self._counts[key]
@@ -0,0 +1,176 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+from bson import ObjectId
+
+from mongo_common.columnar import Column, projection, to_numpy
+
+SNAPSHOT_SCHEMA = [
+    Column("_id"),
+    Column("year", dtype="int32"),
+    Column("runtime", dtype="int32"),
+    Column("rating", "imdb.rating", "float64"),
+    # Raw imdb.rating, only to tell rated movies (field set, maybe non-numeric like "") from unrated ones
+    Column("rated", "imdb.rating"),
+    Column("votes", "imdb.votes", "int64"),
+    Column("genres", dtype="list<str>"),
+    Column("cast", dtype="list<str>"),
+]
+
+
+class _Dictionary:
+    """Dictionary encoding of a list field stored as (row, code) pairs."""
+
+    def __init__(self):
+        self.names: List[str] = []
+        self.codes_by_name: Dict[str, int] = {}
+        self.rows = np.empty(0, dtype=np.int64)
+        self.codes = np.empty(0, dtype=np.int32)
+
+    def append(self, values: np.ndarray, offsets: np.ndarray, first_row: int):
+        """Encode the CSR list column of a batch whose first row is ``first_row``."""
+        codes = np.fromiter((self._code(name) for name in values), dtype=np.int32, count=len(values))
+        rows = np.repeat(np.arange(first_row, first_row + len(offsets) - 1, dtype=np.int64), np.diff(offsets))
+        self.rows = np.concatenate([self.rows, rows])
+        self.codes = np.concatenate([self.codes, codes])
+
+    def _code(self, name) -> int:
+        code = self.codes_by_name.get(name)
+        if code is None:
+            code = self.codes_by_name[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+
+class MovieSnapshot:
+    """
+    Columnar in-process snapshot of the movies collection.
+    Answers the MovieController group-bys with vectorized NumPy kernels instead of
+    running $unwind/$group on the cluster.
+    """
+
+    def __init__(self, movies, updated_field: Optional[str] = None, batch_size: int = 10000):
+        """
+        movies is the movies collection. When updated_field names a monotonically
+        increasing string field (e.g. 'lastupdated'), refresh() also picks up modified
+        movies; otherwise it only appends movies inserted since the last load.
+        Deleted movies are only dropped by a full load().
+        """
+        self.movies = movies
+        self.updated_field = updated_field
+        self.batch_size = batch_size
+        self.load()
+
+    def load(self) -> "MovieSnapshot":
+        """(Re)load the whole collection."""
+        self.row_by_id: Dict[str, int] = {}
+        self.live = np.empty(0, dtype=bool)
+        self.year = np.empty(0, dtype=np.int32)
+        self.runtime = np.empty(0, dtype=np.int32)
+        self.rating = np.empty(0, dtype=np.float64)
+        self.rated = np.empty(0, dtype=bool)
+        self.votes = np.empty(0, dtype=np.int64)
+        self.genres = _Dictionary()
+        self.cast = _Dictionary()
+        self.max_id: Optional[ObjectId] = None
+        self.watermark = None
+        self._append({})
+        return self
+
+    def refresh(self) -> int:
+        """Fetch movies added (or updated, see updated_field) since the last load; return rows read."""
+        conditions = []
+        if self.max_id is not None:
+            conditions.append({"_id": {"$gt": self.max_id}})
+        if self.updated_field and self.watermark is not None:
+            conditions.append({self.updated_field: {"$gt": self.watermark}})
+        if not conditions:
+            return self._append({})
+        return self._append({"$or": conditions} if len(conditions) > 1 else conditions[0])
+
+    def _append(self, query: Dict) -> int:
+        schema = list(SNAPSHOT_SCHEMA)
+        if self.updated_field:
+            schema.append(Column("updated", self.updated_field))
+        cursor = self.movies.find(query, projection(schema)).batch_size(self.batch_size)
+        columns = to_numpy(cursor, schema, self.batch_size)
+
+        count = len(columns["_id"])
+        if count == 0:
+            return 0
+        first_row = len(self.live)
+
+        self.live = np.concatenate([self.live, np.ones(count, dtype=bool)])
+
+        # Updated movies are appended again; their previous rows stop counting
+        for row, movie_id in enumerate(columns["_id"], start=first_row):
+            previous = self.row_by_id.get(movie_id)
+            if previous is not None:
+                self.live[previous] = False
+            self.row_by_id[movie_id] = row
+
+        self.year = np.concatenate([self.year, np.ma.filled(columns["year"], 0)])
+        self.runtime = np.concatenate([self.runtime, np.ma.filled(columns["runtime"], 0)])
+        self.rating = np.concatenate([self.rating, columns["rating"]])
+        rated = np.fromiter((value is not None for value in columns["rated"]), dtype=bool, count=count)
+        self.rated = np.concatenate([self.rated, rated])
+        self.votes = np.concatenate([self.votes, np.ma.filled(columns["votes"], 0)])
+        self.genres.append(columns["genres"], columns["genres_offsets"], first_row)
+        self.cast.append(columns["cast"], columns["cast_offsets"], first_row)
+
+        newest = max(ObjectId(movie_id) for movie_id in columns["_id"])
+        self.max_id = newest if self.max_id is None else max(self.max_id, newest)
+        if self.updated_field:
+            updates = [value for value in columns["updated"] if value is not None]
+            if updates:
+                self.watermark = max([self.watermark, *updates]) if self.watermark is not None else max(updates)
+        return count
+
+    @property
+    def movie_count(self) -> int:
+        return int(self.live.sum())
+
+    # ===== VECTORIZED KERNELS =====
+
+    def count_movies_by_genre(self) -> List[Dict]:
+        """Same result as MovieController.count_movies_by_genre."""
+        keep = self.live[self.genres.rows]
+        counts = np.bincount(self.genres.codes[keep], minlength=len(self.genres.names))
+        order = np.argsort(-counts, kind="stable")
+        return [{"_id": self.genres.names[code], "count": int(counts[code])}
+                for code in order if counts[code] > 0]
+
+    def get_average_rating_by_genre(self) -> List[Dict]:
+        """
+        Same result as MovieController.get_average_rating_by_genre: movie_count counts every
+        movie whose imdb.rating is set, and the average only the numeric ratings ($avg skips
+        the others, e.g. ""; a genre without any gets None).
+        """
+        rows = self.genres.rows
+        keep = self.live[rows] & self.rated[rows]
+        codes = self.genres.codes[keep]
+        ratings = self.rating[rows][keep]
+        numeric = ~np.isnan(ratings)
+        size = len(self.genres.names)
+        counts = np.bincount(codes, minlength=size)
+        rated_counts = np.bincount(codes[numeric], minlength=size)
+        sums = np.bincount(codes[numeric], weights=ratings[numeric], minlength=size)
+        present = np.flatnonzero(counts)
+        averages = np.full(len(present), np.nan)
+        np.divide(sums[present], rated_counts[present], out=averages, where=rated_counts[present] > 0)
+        # NaN sorts last, like null averages on the server
+        order = np.argsort(-averages, kind="stable")
+        return [{"_id": self.genres.names[present[i]],
+                 "average_rating": None if np.isnan(averages[i]) else float(averages[i]),
+                 "movie_count": int(counts[present[i]])} for i in order]
+
+    def get_most_frequent_actors(self, limit: int = 20) -> List[Dict]:
+        """Same result as MovieController.get_most_frequent_actors."""
+        keep = self.live[self.cast.rows]
+        counts = np.bincount(self.cast.codes[keep], minlength=len(self.cast.names))
+        limit = min(limit, int(np.count_nonzero(counts)))
+        if limit <= 0:
+            return []
+        top = np.argpartition(-counts, limit - 1)[:limit]
+        top = top[np.argsort(-counts[top], kind="stable")]
+        return [{"_id": self.cast.names[code], "movie_count": int(counts[code])} for code in top]
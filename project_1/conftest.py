@@ -0,0 +1,52 @@
+import uuid
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from database import Database
+from mongo_common.memory import MemoryClient
+from movie_controller import MovieController
+
+MOVIES = [
+    {"title": "Alien", "year": 1979, "runtime": 117, "genres": ["Horror", "Sci-Fi"],
+     "cast": ["Sigourney Weaver", "Tom Skerritt"], "imdb": {"rating": 8.5, "votes": 700}},
+    {"title": "Aliens", "year": 1986, "runtime": 137, "genres": ["Action", "Sci-Fi"],
+     "cast": ["Sigourney Weaver", "Michael Biehn"], "imdb": {"rating": 8.4, "votes": 600}},
+    {"title": "Heat", "year": 1995, "runtime": 170, "genres": ["Crime", "Drama"],
+     "cast": ["Al Pacino", "Robert De Niro"], "imdb": {"rating": "", "votes": 500}},
+    {"title": "Up", "year": 2009, "runtime": 96, "genres": ["Animation", "Comedy"], "cast": ["Ed Asner"]},
+]
+
+
+@pytest.fixture
+def db():
+    """project_1 Database on a fresh memory client seeded with a few sample_mflix movies"""
+    client = MemoryClient.from_uri(f"memory://{uuid.uuid4().hex}")
+    movies = [dict(movie, _id=ObjectId()) for movie in MOVIES]
+    client["sample_mflix"]["movies"].insert_many(movies)
+    return Database(client=client)
+
+
+@pytest.fixture
+def controller(db):
+    return MovieController(db)
+
+
+@pytest.fixture
+def movie_ids(db):
+    return {movie["title"]: movie["_id"] for movie in db.movies.find({}, {"title": 1})}
+
+
+@pytest.fixture
+def comments(db, movie_ids):
+    """Alien 3 comments, Aliens 2, Heat 1 (2010), plus two deleted movies with 5 comments each"""
+    counts = [(movie_ids["Alien"], 3), (movie_ids["Aliens"], 2), (movie_ids["Heat"], 1),
+              (ObjectId(), 5), (ObjectId(), 5)]
+    documents = [
+        {"movie_id": movie_id, "name": f"viewer{i % 2}", "text": "...",
+         "date": datetime(2010 if movie_id == movie_ids["Heat"] else 2015, 1, 1)}
+        for movie_id, count in counts for i in range(count)
+    ]
+    db.comments.insert_many(documents)
+    return documents
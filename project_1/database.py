@@ -1,16 +1,108 @@
-from pymongo.mongo_client import MongoClient
-from pymongo.server_api import ServerApi
-from dotenv import load_dotenv
+import logging
 import os
+import threading
+
+from mongo_common.profiles import get_profile
+from mongo_common.resilience import DEFAULT_CLIENT_TIMEOUTS, CircuitBreaker, Executor, ResilientCollection
+from mongo_common.routing import ReadRouter
+
+MEMORY_SCHEME = "memory://"
+
+logger = logging.getLogger(__name__)
+
 
 class Database:
-    def __init__(self):
-        load_dotenv()
-        uri = os.getenv("MONGO_URI")
-        self.client = MongoClient(uri, 
-                                server_api=ServerApi('1'),
-                                tlsAllowInvalidCertificates=True)
-        self.database = self.client.get_database("sample_mflix")
-        self.movies = self.database.get_collection("movies")
-        self.comments = self.database.get_collection("comments")
-        self.users = self.database.get_collection("users")
\ No newline at end of file
+    def __init__(self, client=None, max_time_ms=None, retry_policy=None, timeouts=None, read_preference=None,
+                 profile=None):
+        # Nothing is loaded or connected here: configuration is resolved on first use
+        self.timeouts = timeouts
+        # Connection profile ('latency', 'throughput', 'bulk-export'), see mongo_common/profiles.py
+        self.profile = get_profile(profile)
+        self._client = client
+        self._client_given = client is not None
+        self._database = None
+        self._collections = {}
+        self._connect_lock = threading.Lock()
+        self.executor = Executor(None, retry_policy, max_time_ms)
+        self.router = ReadRouter(read_preference)
+
+    def _connect(self):
+        """Resolve MONGO_URI (.env) and create the client."""
+        with self._connect_lock:
+            if self._database is not None:
+                return
+            uri = None
+            if self._client is None:
+                from dotenv import load_dotenv
+                load_dotenv()
+                uri = os.getenv("MONGO_URI")
+                if uri and uri.startswith(MEMORY_SCHEME):
+                    from mongo_common.memory import MemoryClient
+                    self._client = MemoryClient.from_uri(uri)
+                else:
+                    from pymongo.mongo_client import MongoClient
+                    from pymongo.server_api import ServerApi
+                    self._client = MongoClient(uri,
+                                               server_api=ServerApi('1'),
+                                               tlsAllowInvalidCertificates=True,
+                                               **{**DEFAULT_CLIENT_TIMEOUTS,
+                                                  **(self.profile.client_options() if self.profile else {}),
+                                                  **(self.timeouts or {})})
+            self.executor.breaker = CircuitBreaker.for_cluster(uri or id(self._client))
+            self._database = self._client.get_database("sample_mflix")
+
+    def _collection(self, name):
+        if name not in self._collections:
+            self._collections[name] = ResilientCollection(self.database.get_collection(name),
+                                                          self.executor, self.router, self.profile)
+        return self._collections[name]
+
+    @property
+    def client(self):
+        if self._database is None:
+            self._connect()
+        return self._client
+
+    @property
+    def database(self):
+        if self._database is None:
+            self._connect()
+        return self._database
+
+    @property
+    def movies(self):
+        return self._collection("movies")
+
+    @property
+    def comments(self):
+        return self._collection("comments")
+
+    @property
+    def users(self):
+        return self._collection("users")
+
+    def collection_spec(self, name):
+        """Picklable description of a collection, reopened by parallel scan workers."""
+        from mongo_common.parallel import CollectionSpec
+        from pymongo.server_api import ServerApi
+
+        self.client  # Resolves MONGO_URI (.env)
+        # Same options as the main client, so workers pin the same Stable API version
+        options = {**DEFAULT_CLIENT_TIMEOUTS, 'server_api': ServerApi('1'), 'tlsAllowInvalidCertificates': True,
+                   **(self.profile.client_options() if self.profile else {}), **(self.timeouts or {})}
+        return CollectionSpec(os.getenv("MONGO_URI"), "sample_mflix", name,
+                              client=self._client if self._client_given else None, client_options=options)
+
+    def warm_up(self, background=True):
+        """Connect and select a server ahead of the first query, in a daemon thread by default."""
+        def ping():
+            try:
+                self.executor.call("server_info", self.client.server_info)
+            except Exception as e:
+                logger.warning("Warm-up failed: %s", e)
+
+        if not background:
+            return ping()
+        thread = threading.Thread(target=ping, name="database-warm-up", daemon=True)
+        thread.start()
+        return thread
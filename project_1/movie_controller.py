@@ -1,8 +1,5 @@
 from database import Database
-from pymongo.mongo_client import MongoClient
-from pymongo.server_api import ServerApi
-from dotenv import load_dotenv
-import os
+import functools
 from typing import List, Dict, Optional
 from datetime import datetime
 
@@ -29,24 +26,90 @@ from datetime import datetime
 # 20. Trouver tous les films avec au moins un commentaire posté après 2020.
 # 21. Compter le nombre de commentaires par utilisateur.
 
+def routed(method):
+    """Apply the controller's per-method read preference (see MovieController.routing)."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.router.for_method(self.routing.get(method.__name__)):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
 class MovieController:
     """
     Reusable MongoDB controller for movie database operations.
     Implements comprehensive querying capabilities for the sample_mflix database.
+    Failures raise resilience.DatabaseError subclasses (QueryTimeoutError,
+    ServiceUnavailableError, CircuitOpenError, QueryError) instead of returning empty results.
     """
     
-    def __init__(self, database: Database):
-        """Initialize the MovieController with database connection."""
-        self.client = database.client
-        self.database = database.database
-        self.movies = database.movies
-        self.comments = database.comments
-        self.users = database.users
+    # Full-collection aggregations, routed to secondaries when routing=ANALYTICS_ROUTING
+    ANALYTICS_ROUTING = {
+        "count_movies_by_genre": "secondaryPreferred",
+        "get_average_rating_by_genre": "secondaryPreferred",
+        "get_most_frequent_actors": "secondaryPreferred",
+        "count_comments_per_movie": "secondaryPreferred",
+        "count_comments_per_user": "secondaryPreferred",
+        "get_movies_with_comments": "secondaryPreferred",
+        "get_movies_with_recent_comments": "secondaryPreferred",
+    }
+    
+    def __init__(self, database: Database, snapshot=None, routing: Optional[Dict[str, str]] = None,
+                 sketches: Optional[Dict] = None):
+        """
+        Initialize the MovieController with database connection.
+        When an analytics.MovieSnapshot is given, the genre/actor group-bys (14, 15, 16)
+        are answered locally from the snapshot instead of on the cluster.
+        routing maps method names to a read preference mode (e.g. ANALYTICS_ROUTING);
+        read_preference() overrides it for a single call.
+        sketches ({field: sketches.FieldSketch} for genres and cast) answers the
+        approximate=True genre/actor counts; built by movie_sketches() on first use.
+        """
+        self.snapshot = snapshot
+        self.sketches = sketches
+        self.routing = routing or {}
+        self.router = database.router
+        self.executor = database.executor
+        self._database = database
+    
+    # Resolved lazily so building a controller does not connect
+    
+    @property
+    def client(self):
+        return self._database.client
+    
+    @property
+    def database(self):
+        return self._database.database
+    
+    @property
+    def movies(self):
+        return self._database.movies
+    
+    @property
+    def comments(self):
+        return self._database.comments
+    
+    @property
+    def users(self):
+        return self._database.users
     
     def close_connection(self):
         """Close the database connection."""
         self.client.close()
     
+    def timeout(self, max_time_ms: int):
+        """Context manager overriding maxTimeMS for the queries run inside it."""
+        return self.executor.timeout(max_time_ms)
+    
+    def read_preference(self, mode: str, tag_sets: Optional[List[Dict]] = None, max_staleness: int = -1):
+        """Context manager routing the queries run inside it (mode, tag sets, maxStalenessSeconds)."""
+        return self.router.read_preference(mode, tag_sets, max_staleness)
+    
+    def causal_session(self):
+        """Context manager binding the queries run inside it to a causally consistent session."""
+        return self.router.causal_session(self.client)
+    
     def __enter__(self):
         """Context manager entry."""
         return self
@@ -57,280 +120,361 @@ class MovieController:
     
     # ===== BASIC FILTERING QUERIES =====
     
+    @routed
     def get_movies_by_year(self, year: int) -> List[Dict]:
         """1. Films sortis en 1999 (ou une année donnée)"""
-        try:
-            return list(self.movies.find({"year": year}))
-        except Exception as e:
-            print(f"Error fetching movies by year: {e}")
-            return []
+        return list(self.movies.find({"year": year}))
     
+    @routed
     def get_movies_by_genre(self, genre: str) -> List[Dict]:
         """2. Films dont le 'genre' inclut 'Comedy' (ou un genre donné)"""
-        try:
-            return list(self.movies.find({"genres": genre}))
-        except Exception as e:
-            print(f"Error fetching movies by genre: {e}")
-            return []
+        return list(self.movies.find({"genres": genre}))
     
+    @routed
     def get_movie_by_exact_title(self, title: str) -> Optional[Dict]:
         """3. Films avec le 'title' exacte 'The Matrix' (ou un titre donné)"""
-        try:
-            return self.movies.find_one({"title": title})
-        except Exception as e:
-            print(f"Error fetching movie by title: {e}")
-            return None
+        return self.movies.find_one({"title": title})
     
+    @routed
     def get_movies_by_runtime(self, min_runtime: int) -> List[Dict]:
         """4. Films avec un 'runtime' supérieur à 120 minutes (ou une durée donnée)"""
-        try:
-            return list(self.movies.find({"runtime": {"$gt": min_runtime}}))
-        except Exception as e:
-            print(f"Error fetching movies by runtime: {e}")
-            return []
-    
-    def get_movies_title_and_year(self) -> List[Dict]:
-        """5. Afficher seulement le 'title' et 'year' de tous les films"""
-        try:
-            return list(self.movies.find({}, {"title": 1, "year": 1, "_id": 0}))
-        except Exception as e:
-            print(f"Error fetching movies title and year: {e}")
-            return []
+        return list(self.movies.find({"runtime": {"$gt": min_runtime}}))
+    
+    @routed
+    def get_movies_title_and_year(self, workers: Optional[int] = None) -> List[Dict]:
+        """5. Afficher seulement le 'title' et 'year' de tous les films
+        
+        With workers, the collection is read in _id ranges on a process pool (see scan).
+        """
+        if workers:
+            return self.scan(projection={"title": 1, "year": 1, "_id": 0}, workers=workers)
+        return list(self.movies.find({}, {"title": 1, "year": 1, "_id": 0}))
     
+    @routed
     def get_movies_by_rating(self, min_rating: float) -> List[Dict]:
         """6. Films avec un 'imdb.rating' supérieur à 8 (ou une note donnée)"""
-        try:
-            return list(self.movies.find({"imdb.rating": {"$gt": min_rating}}))
-        except Exception as e:
-            print(f"Error fetching movies by rating: {e}")
-            return []
+        return list(self.movies.find({"imdb.rating": {"$gt": min_rating}}))
     
+    @routed
     def get_movies_by_year_range(self, start_year: int, end_year: int) -> List[Dict]:
         """7. Films sortis entre 1990 et 2000 (ou une période donnée)"""
-        try:
-            return list(self.movies.find({
-                "year": {"$gte": start_year, "$lte": end_year}
-            }))
-        except Exception as e:
-            print(f"Error fetching movies by year range: {e}")
-            return []
+        return list(self.movies.find({
+            "year": {"$gte": start_year, "$lte": end_year}
+        }))
     
+    @routed
     def get_movies_by_multiple_genres(self, genres: List[str]) -> List[Dict]:
         """8. Films dont le 'genres' inclut 'Sci-Fi' et 'Action' (ou plusieurs genres)"""
-        try:
-            return list(self.movies.find({"genres": {"$all": genres}}))
-        except Exception as e:
-            print(f"Error fetching movies by multiple genres: {e}")
-            return []
+        return list(self.movies.find({"genres": {"$all": genres}}))
     
+    @routed
     def get_movies_by_cast_member(self, actor: str) -> List[Dict]:
         """9. Films où 'Tom Hanks' est dans le 'cast' (ou un acteur donné)"""
-        try:
-            return list(self.movies.find({"cast": actor}))
-        except Exception as e:
-            print(f"Error fetching movies by cast member: {e}")
-            return []
+        return list(self.movies.find({"cast": actor}))
     
+    @routed
     def get_movies_by_plot_keyword(self, keyword: str) -> List[Dict]:
         """10. Films avec un 'plot' contenant le mot 'space' (ou un mot-clé donné)"""
-        try:
-            return list(self.movies.find({
-                "plot": {"$regex": keyword, "$options": "i"}
-            }))
-        except Exception as e:
-            print(f"Error fetching movies by plot keyword: {e}")
-            return []
+        return list(self.movies.find({
+            "plot": {"$regex": keyword, "$options": "i"}
+        }))
     
     # ===== SORTING AND LIMITING QUERIES =====
     
+    @routed
     def get_top_rated_movies(self, limit: int = 10) -> List[Dict]:
         """11. Afficher les 10 films les mieux notés (imdb.rating), triés par note décroissante"""
-        try:
-            return list(self.movies.find(
-                {"imdb.rating": {"$exists": True, "$ne": None, "$gte": 1}},
-                {"title": 1, "year": 1, "imdb": 1, "_id": 0}
-            ).sort("imdb.rating", -1).limit(limit))
-        except Exception as e:
-            print(f"Error fetching top rated movies: {e}")
-            return []
+        return list(self.movies.find(
+            {"imdb.rating": {"$exists": True, "$ne": None, "$gte": 1}},
+            {"title": 1, "year": 1, "imdb": 1, "_id": 0}
+        ).sort("imdb.rating", -1).limit(limit))
     
+    @routed
     def get_most_recent_movies(self, limit: int = 5) -> List[Dict]:
         """12. Afficher les 5 films les plus récents"""
-        try:
-            return list(self.movies.find(
-                {"year": {"$exists": True, "$ne": None}},
-                {"title": 1, "year": 1, "_id": 0}
-            ).sort("year", -1).limit(limit))
-        except Exception as e:
-            print(f"Error fetching most recent movies: {e}")
-            return []
+        return list(self.movies.find(
+            {"year": {"$exists": True, "$ne": None}},
+            {"title": 1, "year": 1, "_id": 0}
+        ).sort("year", -1).limit(limit))
     
+    @routed
     def get_longest_comedy_movies(self, limit: int = 10) -> List[Dict]:
         """13. Afficher les films comédies (Comedy) avec le plus long runtime"""
-        try:
-            return list(self.movies.find(
-                {
-                    "genres": "Comedy",
-                    "runtime": {"$exists": True, "$ne": None}
-                },
-                {"title": 1, "runtime": 1, "year": 1, "_id": 0}
-            ).sort("runtime", -1).limit(limit))
-        except Exception as e:
-            print(f"Error fetching longest comedy movies: {e}")
-            return []
+        return list(self.movies.find(
+            {
+                "genres": "Comedy",
+                "runtime": {"$exists": True, "$ne": None}
+            },
+            {"title": 1, "runtime": 1, "year": 1, "_id": 0}
+        ).sort("runtime", -1).limit(limit))
     
     # ===== AGGREGATION QUERIES =====
     
-    def count_movies_by_genre(self) -> List[Dict]:
-        """14. Compter le nombre total de films par genre"""
-        try:
-            pipeline = [
-                {"$unwind": "$genres"},
-                {"$group": {
-                    "_id": "$genres",
-                    "count": {"$sum": 1}
-                }},
-                {"$sort": {"count": -1}}
-            ]
-            return list(self.movies.aggregate(pipeline))
-        except Exception as e:
-            print(f"Error counting movies by genre: {e}")
-            return []
+    @routed
+    def count_movies_by_genre(self, approximate: bool = False) -> List[Dict]:
+        """14. Compter le nombre total de films par genre (approximate: Count-Min estimates)"""
+        if approximate:
+            return [{"_id": genre, "count": count} for genre, count in self.movie_sketches()["genres"].top()]
+        if self.snapshot is not None:
+            return self.snapshot.count_movies_by_genre()
+        pipeline = [
+            {"$unwind": "$genres"},
+            {"$group": {
+                "_id": "$genres",
+                "count": {"$sum": 1}
+            }},
+            {"$sort": {"count": -1}}
+        ]
+        return list(self.movies.aggregate(pipeline))
     
+    @routed
     def get_average_rating_by_genre(self) -> List[Dict]:
         """15. Trouver la note moyenne IMDb (imdb.rating) par genre"""
-        try:
-            pipeline = [
-                {"$match": {"imdb.rating": {"$exists": True, "$ne": None}}},
-                {"$unwind": "$genres"},
-                {"$group": {
-                    "_id": "$genres",
-                    "average_rating": {"$avg": "$imdb.rating"},
-                    "movie_count": {"$sum": 1}
-                }},
-                {"$sort": {"average_rating": -1}}
-            ]
-            return list(self.movies.aggregate(pipeline))
-        except Exception as e:
-            print(f"Error calculating average rating by genre: {e}")
-            return []
-    
-    def get_most_frequent_actors(self, limit: int = 20) -> List[Dict]:
-        """16. Lister les acteurs les plus fréquents dans la base"""
-        try:
-            pipeline = [
-                {"$unwind": "$cast"},
-                {"$group": {
-                    "_id": "$cast",
-                    "movie_count": {"$sum": 1}
-                }},
-                {"$sort": {"movie_count": -1}},
-                {"$limit": limit}
-            ]
-            return list(self.movies.aggregate(pipeline))
-        except Exception as e:
-            print(f"Error fetching most frequent actors: {e}")
-            return []
-    
-    def count_comments_per_movie(self) -> List[Dict]:
-        """17. Compter le nombre de commentaires (comments) par film"""
-        try:
-            pipeline = [
-                {"$group": {
-                    "_id": "$movie_id",
-                    "comment_count": {"$sum": 1}
-                }},
-                {"$lookup": {
-                    "from": "movies",
-                    "localField": "_id",
-                    "foreignField": "_id",
-                    "as": "movie_info"
-                }},
-                {"$unwind": "$movie_info"},
-                {"$project": {
-                    "movie_title": "$movie_info.title",
-                    "comment_count": 1,
-                    "_id": 1
-                }},
-                {"$sort": {"comment_count": -1}}
-            ]
-            return list(self.comments.aggregate(pipeline))
-        except Exception as e:
-            print(f"Error counting comments per movie: {e}")
-            return []
+        if self.snapshot is not None:
+            return self.snapshot.get_average_rating_by_genre()
+        pipeline = [
+            {"$match": {"imdb.rating": {"$exists": True, "$ne": None}}},
+            {"$unwind": "$genres"},
+            {"$group": {
+                "_id": "$genres",
+                "average_rating": {"$avg": "$imdb.rating"},
+                "movie_count": {"$sum": 1}
+            }},
+            {"$sort": {"average_rating": -1}}
+        ]
+        return list(self.movies.aggregate(pipeline))
     
+    @routed
+    def get_most_frequent_actors(self, limit: int = 20, approximate: bool = False) -> List[Dict]:
+        """16. Lister les acteurs les plus fréquents dans la base (approximate: sketch top-K)"""
+        if approximate:
+            return [{"_id": actor, "movie_count": count}
+                    for actor, count in self.movie_sketches()["cast"].top(limit)]
+        if self.snapshot is not None:
+            return self.snapshot.get_most_frequent_actors(limit)
+        pipeline = [
+            {"$unwind": "$cast"},
+            {"$group": {
+                "_id": "$cast",
+                "movie_count": {"$sum": 1}
+            }},
+            {"$sort": {"movie_count": -1}},
+            {"$limit": limit}
+        ]
+        return list(self.movies.aggregate(pipeline))
+    
+    @routed
+    def count_comments_per_movie(self, limit: Optional[int] = None, allow_disk_use: bool = True,
+                                 stream: bool = False, out: Optional[str] = None, merge: bool = False,
+                                 batch_size: int = 1000):
+        """17. Compter le nombre de commentaires (comments) par film
+        
+        See _report for limit (top-K), allow_disk_use, stream and out/merge. Groups whose
+        movie is missing are dropped by the join before the limit, so top-K still returns
+        K movies; the join is pulled lazily, so only about K groups are looked up.
+        """
+        pipeline = [
+            {"$group": {
+                "_id": "$movie_id",
+                "comment_count": {"$sum": 1}
+            }}
+        ]
+        join = [
+            {"$lookup": {
+                "from": "movies",
+                "localField": "_id",
+                "foreignField": "_id",
+                "as": "movie_info"
+            }},
+            {"$unwind": "$movie_info"},
+            {"$project": {
+                "movie_title": "$movie_info.title",
+                "comment_count": 1,
+                "_id": 1
+            }}
+        ]
+        return self._report(pipeline, {"comment_count": -1, "_id": 1}, join, limit, allow_disk_use,
+                            stream, out, merge, batch_size)
+    
+    @routed
     def get_movie_with_most_votes(self) -> Optional[Dict]:
         """18. Trouver le film avec le plus grand nombre de votes IMDb (imdb.votes)"""
-        try:
-            return self.movies.find_one(
-                {"imdb.votes": {"$exists": True, "$ne": None, "$gte": 1}},
-                {"title": 1, "year": 1, "imdb": 1, "_id": 0},
-                sort=[("imdb.votes", -1)]
-            )
-        except Exception as e:
-            print(f"Error fetching movie with most votes: {e}")
-            return None
+        return self.movies.find_one(
+            {"imdb.votes": {"$exists": True, "$ne": None, "$gte": 1}},
+            {"title": 1, "year": 1, "imdb": 1, "_id": 0},
+            sort=[("imdb.votes", -1)]
+        )
     
     # ===== LOOKUP QUERIES =====
     
+    @routed
     def get_movies_with_comments(self, limit: int = 10) -> List[Dict]:
         """19. Lister tous les films avec leurs commentaires (utiliser $lookup entre movies et comments)"""
-        try:
-            comment_counts = self.count_comments_per_movie()
-            results = []
+        comment_counts = self.count_comments_per_movie(limit=limit)
+        results = []
+        
+        for movie_data in comment_counts:
+            movie_id = movie_data.get('_id')
             
-            for movie_data in comment_counts[:limit]:
-                movie_id = movie_data.get('_id')
-                
-                movie_comments = list(self.comments.find(
-                    {"movie_id": movie_id}, 
-                    {"name": 1, "text": 1, "date": 1, "_id": 0}
-                ))
-                
-                result = {
-                    "title": movie_data.get('movie_title'),
-                    "comment_count": movie_data.get('comment_count'),
-                    "comments": movie_comments
-                }
-                results.append(result)
-                
-            return results
-        except Exception as e:
-            print(f"Error fetching movies with comments: {e}")
-            return []
-    
-    def get_movies_with_recent_comments(self, year: int = 2012) -> List[Dict]:
-        """20. Trouver tous les films avec au moins un commentaire posté après 2012"""
-        try:
-            pipeline = [
-                {"$match": {"date": {"$gte": datetime(year, 1, 1, 0, 0, 0)}}},
-                {"$group": {"_id": "$movie_id"}},
-                {"$project": {"movie_id": "$_id", "_id": 0}}
-            ]
+            movie_comments = list(self.comments.find(
+                {"movie_id": movie_id}, 
+                {"name": 1, "text": 1, "date": 1, "_id": 0}
+            ))
             
-            recent_comment_movies = list(self.comments.aggregate(pipeline))
-
-            movie_ids = [doc["movie_id"] for doc in recent_comment_movies]
+            result = {
+                "title": movie_data.get('movie_title'),
+                "comment_count": movie_data.get('comment_count'),
+                "comments": movie_comments
+            }
+            results.append(result)
             
-            return list(self.movies.find(
-                {"_id": {"$in": movie_ids}},
-                {"title": 1, "year": 1, "_id": 0}
-            ))
-        except Exception as e:
-            print(f"Error fetching movies with recent comments: {e}")
-            return []
-    
-    def count_comments_per_user(self) -> List[Dict]:
-        """21. Compter le nombre de commentaires par utilisateur"""
-        try:
-            pipeline = [
-                {"$group": {
-                    "_id": "$name",
-                    "comment_count": {"$sum": 1}
-                }},
-                {"$sort": {"comment_count": -1}}
-            ]
-            return list(self.comments.aggregate(pipeline))
-        except Exception as e:
-            print(f"Error counting comments per user: {e}")
-            return []
+        return results
+    
+    @routed
+    def get_movies_with_recent_comments(self, year: int = 2012, skip: int = 0,
+                                        limit: Optional[int] = None) -> List[Dict]:
+        """20. Trouver tous les films avec au moins un commentaire posté après 2012
+        
+        Semijoin run entirely on the server: recent comments are grouped by movie
+        (covered by the {date, movie_id} index), paginated in movie id order, and
+        only the requested page is joined with movies.
+        """
+        pipeline = [
+            {"$match": {"date": {"$gte": datetime(year, 1, 1, 0, 0, 0)}}},
+            {"$group": {"_id": "$movie_id"}},
+            {"$sort": {"_id": 1}}
+        ]
+        if skip:
+            pipeline.append({"$skip": skip})
+        if limit:
+            pipeline.append({"$limit": limit})
+        pipeline += [
+            {"$lookup": {
+                "from": "movies",
+                "localField": "_id",
+                "foreignField": "_id",
+                "as": "movie"
+            }},
+            {"$unwind": "$movie"},
+            {"$project": {"title": "$movie.title", "year": "$movie.year", "_id": 0}}
+        ]
+        return list(self.comments.aggregate(pipeline, allowDiskUse=True))
+    
+    @routed
+    def count_comments_per_user(self, limit: Optional[int] = None, allow_disk_use: bool = True,
+                                stream: bool = False, out: Optional[str] = None, merge: bool = False,
+                                batch_size: int = 1000):
+        """21. Compter le nombre de commentaires par utilisateur (options: see _report)"""
+        pipeline = [
+            {"$group": {
+                "_id": "$name",
+                "comment_count": {"$sum": 1}
+            }}
+        ]
+        return self._report(pipeline, {"comment_count": -1, "_id": 1}, [], limit, allow_disk_use,
+                            stream, out, merge, batch_size)
+    
+    def _report(self, pipeline: List[Dict], sort: Dict, join: List[Dict], limit: Optional[int],
+                allow_disk_use: bool, stream: bool, out: Optional[str], merge: bool, batch_size: int):
+        """Run a comments $group report with bounded memory on the server and the client.
+        
+        - limit: top-K only; $sort directly followed by $limit keeps K groups in memory instead of all
+          of them
+        - allow_disk_use: $group/$sort spill to temporary files past the 100MB stage limit
+        - stream: return the cursor (fetched batch_size groups at a time) instead of a list
+        - out: write the groups to that collection ($out replaces it, merge=True upserts by _id
+          with $merge) and return the collection instead of documents
+        ``join`` stages (e.g. $lookup + $unwind, which can drop groups) run between the sort and the
+        limit so the limit counts joined rows. The pipeline is pulled lazily, so they still only
+        process the groups up to the limit; the sort then keeps every group (spilled with
+        allow_disk_use) instead of K.
+        """
+        pipeline = pipeline + [{"$sort": sort}] + join
+        if limit:
+            pipeline.append({"$limit": limit})
+        if out:
+            if merge:
+                pipeline.append({"$merge": {"into": out, "on": "_id",
+                                            "whenMatched": "replace", "whenNotMatched": "insert"}})
+            else:
+                pipeline.append({"$out": out})
+            list(self.comments.aggregate(pipeline, allowDiskUse=allow_disk_use))
+            return self._database._collection(out)
+        cursor = self.comments.aggregate(pipeline, allowDiskUse=allow_disk_use, batchSize=batch_size)
+        return cursor if stream else list(cursor)
+    
+    # ===== PARALLEL SCAN =====
+    
+    def scan(self, filter: Optional[Dict] = None, projection: Optional[Dict] = None, collection: str = "movies",
+             reducer=None, combine=None, partitions: Optional[int] = None, workers: Optional[int] = None):
+        """Read a whole collection in _id ranges on a process pool (parallel.parallel_scan).
+        
+        Returns the documents in _id order, or combine() of the module-level reducer(documents)
+        results computed in each worker (partials are added together by default).
+        """
+        from mongo_common.parallel import parallel_scan
+        
+        spec = self._database.collection_spec(collection)
+        return self.executor.call(
+            f"{collection}.parallel_scan",
+            lambda: parallel_scan(spec, filter, projection, "_id", partitions, workers, reducer, combine,
+                                  sampler=getattr(self._database, collection)),
+            retry=False)
+    
+    # ===== APPROXIMATE COUNTS =====
+    
+    def movie_sketches(self, refresh: bool = False, workers: Optional[int] = None) -> Dict:
+        """Genre and actor sketches (distinct counts, frequencies, top-K), built in one pass over movies.
+        
+        Queries on them take constant time; see mongo_common/sketches.py for the error bounds.
+        With workers, the pass is split with scan() and the partial sketches are merged.
+        """
+        if self.sketches is None or refresh:
+            from mongo_common.sketches import merge_sketches, sketch_documents
+            
+            fields = ["genres", "cast"]
+            projection = {"genres": 1, "cast": 1}
+            if workers:
+                reducer = functools.partial(sketch_documents, fields)
+                self.sketches = self.scan(projection=projection, reducer=reducer, combine=merge_sketches,
+                                          workers=workers)
+            else:
+                self.sketches = sketch_documents(fields, self.movies.find({}, projection))
+        return self.sketches
+    
+    def estimated_movie_count(self) -> int:
+        """Number of movies from the collection metadata (constant time, no filter)."""
+        return self.movies.estimated_document_count()
+    
+    # ===== TIME RANGE QUERIES =====
+    
+    def ensure_indexes(self) -> List[str]:
+        """Create the index backing the comment date range scans and the recent-comments semijoin."""
+        return [self.comments.create_index([("date", 1), ("movie_id", 1)])]
+    
+    @routed
+    def get_comments_between(self, start: datetime, end: Optional[datetime] = None,
+                             movie_id=None, limit: Optional[int] = None) -> List[Dict]:
+        """Comments posted in [start, end), oldest first (uses the {date, movie_id} index)."""
+        date = {"$gte": start}
+        if end is not None:
+            date["$lt"] = end
+        filter = {"date": date}
+        if movie_id is not None:
+            filter["movie_id"] = movie_id
+        cursor = self.comments.find(filter, {"name": 1, "text": 1, "date": 1, "movie_id": 1}).sort("date", 1)
+        return list(cursor.limit(limit) if limit else cursor)
+    
+    # ===== COLUMNAR EXPORT =====
+    
+    def export_movies(self, filter: Optional[Dict] = None, schema: Optional[List] = None,
+                      format: str = "arrow", path: Optional[str] = None, batch_size: int = 10000):
+        """Export movies as NumPy/Arrow columns, or stream them to a Parquet/Feather file.
+
+        Defaults to columnar.MOVIE_SCHEMA (title, year, runtime, rating, votes, genres, cast).
+        """
+        from mongo_common import columnar
+
+        schema = schema or columnar.MOVIE_SCHEMA
+        cursor = self.movies.find(filter or {}, columnar.projection(schema)).batch_size(batch_size)
+        return columnar.export(cursor, schema, format, path, batch_size)
@@ -112,8 +112,8 @@ def main():
         print()
 
         print("17. Nombre de commentaires par film:")
-        comments_by_movie = controller.count_comments_per_movie()
-        for movie in comments_by_movie[:5]:  # Top 5 most commented
+        comments_by_movie = controller.count_comments_per_movie(limit=5)
+        for movie in comments_by_movie:  # Top 5 most commented
             print(f"  - {movie.get('movie_title')}: {movie.get('comment_count')} comments")
         print()
 
@@ -143,8 +143,8 @@ def main():
         print(f"   Total: {len(recent_comments_movies)} movies\n")
         
         print("21. Nombre de commentaires par utilisateur:")
-        comments_per_user = controller.count_comments_per_user()
-        for user in comments_per_user[:10]:  # Top 10 commenters
+        comments_per_user = controller.count_comments_per_user(limit=10)
+        for user in comments_per_user:  # Top 10 commenters
             print(f"  - {user['_id']}: {user['comment_count']} comments")
         print()
 
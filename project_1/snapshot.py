@@ -0,0 +1,174 @@
+"""Dump and restore the sample_mflix collections used by MovieController.
+
+A snapshot is a directory holding gzip-compressed NDJSON chunks
+(``<collection>-00000.ndjson.gz``, ...) in MongoDB Extended JSON, so ObjectIds
+and dates round-trip, plus a ``manifest.json`` listing the chunks, document
+counts and index definitions of each collection.
+
+Restore loads the chunks with parallel ``insert_many(ordered=False)`` workers
+and only builds the secondary indexes once the data is in, which is much
+faster than maintaining them during the load.
+
+Usage:
+    python project_1/snapshot.py dump snapshots/mflix                       # from MONGO_URI (.env)
+    python project_1/snapshot.py restore snapshots/mflix --uri mongodb://localhost:27017 --drop
+"""
+import argparse
+import gzip
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mongo_common.resilience import DEFAULT_CLIENT_TIMEOUTS
+
+from database import MEMORY_SCHEME, Database
+
+COLLECTIONS = ("movies", "comments", "users")
+MANIFEST = "manifest.json"
+
+
+def _database(uri=None):
+    """Database on ``uri``, or on MONGO_URI from .env when not given"""
+    if uri is None:
+        return Database()
+    if uri.startswith(MEMORY_SCHEME):
+        from mongo_common.memory import MemoryClient
+        return Database(client=MemoryClient.from_uri(uri))
+    from pymongo.mongo_client import MongoClient
+    return Database(client=MongoClient(uri, **DEFAULT_CLIENT_TIMEOUTS))
+
+
+def _chunk_path(directory, collection, number):
+    return os.path.join(directory, f"{collection}-{number:05d}.ndjson.gz")
+
+
+def _index_definitions(collection):
+    """Secondary index definitions (key + options) as stored in the manifest"""
+    indexes = []
+    for name, info in collection.index_information().items():
+        if name == "_id_":
+            continue
+        options = {k: v for k, v in info.items() if k not in ("key", "v", "ns")}
+        indexes.append({"name": name, "key": [list(pair) for pair in info["key"]], "options": options})
+    return indexes
+
+
+def dump(database, directory, collections=COLLECTIONS, chunk_size=10000, compresslevel=6):
+    """Write each collection as gzip NDJSON chunks of ``chunk_size`` documents"""
+    from bson import json_util
+
+    os.makedirs(directory, exist_ok=True)
+    manifest = {"database": database.database.name, "collections": {}}
+    for name in collections:
+        collection = database.database[name]
+        started = time.perf_counter()
+        chunks, count, chunk, out = [], 0, 0, None
+        for document in collection.find({}).batch_size(chunk_size):
+            if count % chunk_size == 0:
+                if out is not None:
+                    out.close()
+                path = _chunk_path(directory, name, chunk)
+                out = gzip.open(path, "wt", encoding="utf-8", compresslevel=compresslevel)
+                chunks.append(os.path.basename(path))
+                chunk += 1
+            out.write(json_util.dumps(document, json_options=json_util.CANONICAL_JSON_OPTIONS))
+            out.write("\n")
+            count += 1
+        if out is not None:
+            out.close()
+        manifest["collections"][name] = {
+            "count": count,
+            "chunks": chunks,
+            "indexes": _index_definitions(collection),
+        }
+        elapsed = time.perf_counter() - started
+        print(f"dumped {name}: {count} documents in {len(chunks)} chunks, {elapsed:.2f}s")
+
+    with open(os.path.join(directory, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def _load_chunk(collection, path, batch_size):
+    """Insert one chunk file; return (documents, compressed bytes)"""
+    from bson import json_util
+
+    inserted, batch = 0, []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            batch.append(json_util.loads(line))
+            if len(batch) >= batch_size:
+                collection.insert_many(batch, ordered=False)
+                inserted += len(batch)
+                batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+        inserted += len(batch)
+    return inserted, os.path.getsize(path)
+
+
+def restore(database, directory, collections=None, workers=4, batch_size=1000, drop=False):
+    """Load a snapshot with parallel workers, then build its indexes; return throughput stats"""
+    from pymongo import IndexModel
+
+    with open(os.path.join(directory, MANIFEST)) as f:
+        manifest = json.load(f)
+    names = collections or list(manifest["collections"])
+    stats = {}
+    for name in names:
+        entry = manifest["collections"][name]
+        if drop:
+            database.database.drop_collection(name)
+        collection = database.database[name]
+
+        started = time.perf_counter()
+        paths = [os.path.join(directory, chunk) for chunk in entry["chunks"]]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda path: _load_chunk(collection, path, batch_size), paths))
+        loaded = time.perf_counter() - started
+
+        # Deferred index builds: one pass over the loaded data instead of per-insert maintenance
+        indexes = [IndexModel([tuple(pair) for pair in index["key"]], name=index["name"], **index["options"])
+                   for index in entry["indexes"]]
+        if indexes:
+            collection.create_indexes(indexes)
+        total = time.perf_counter() - started
+
+        documents = sum(count for count, _ in results)
+        compressed = sum(size for _, size in results)
+        stats[name] = {
+            "documents": documents,
+            "chunks": len(paths),
+            "load_seconds": round(loaded, 3),
+            "index_seconds": round(total - loaded, 3),
+            "docs_per_second": round(documents / loaded, 1) if loaded else 0.0,
+            "compressed_mb_per_second": round(compressed / 1e6 / loaded, 2) if loaded else 0.0,
+        }
+        print(f"restored {name}: {documents} documents in {loaded:.2f}s "
+              f"({stats[name]['docs_per_second']:.0f} docs/s, {stats[name]['compressed_mb_per_second']} MB/s gz), "
+              f"{len(indexes)} indexes in {total - loaded:.2f}s")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=("dump", "restore"))
+    parser.add_argument("directory")
+    parser.add_argument("--uri", help="source (dump) or target (restore); defaults to MONGO_URI")
+    parser.add_argument("--collections", nargs="*", default=None, metavar="name")
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--drop", action="store_true", help="drop target collections before restoring")
+    args = parser.parse_args()
+
+    database = _database(args.uri)
+    if args.command == "dump":
+        dump(database, args.directory, args.collections or COLLECTIONS, args.chunk_size)
+    else:
+        restore(database, args.directory, args.collections, args.workers, args.batch_size, args.drop)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import pytest
+
+from analytics import MovieSnapshot
+from movie_controller import MovieController
+
+
+@pytest.fixture
+def snapshot(db):
+    return MovieSnapshot(db.movies, updated_field="lastupdated")
+
+
+@pytest.mark.parametrize("method", ["count_movies_by_genre", "get_average_rating_by_genre"])
+def test_snapshot_matches_the_server_pipelines(db, snapshot, method):
+    server = getattr(MovieController(db), method)()
+    assert getattr(MovieController(db, snapshot=snapshot), method)() == server
+
+
+def test_snapshot_most_frequent_actors(db, snapshot):
+    server = MovieController(db).get_most_frequent_actors(3)
+    local = MovieController(db, snapshot=snapshot).get_most_frequent_actors(3)
+    # Ties may come in another order: compare the leader and the counts
+    assert local[0] == server[0] == {"_id": "Sigourney Weaver", "movie_count": 2}
+    assert [actor["movie_count"] for actor in local] == [actor["movie_count"] for actor in server]
+
+
+def test_non_numeric_ratings_are_counted_but_not_averaged(snapshot):
+    groups = {group["_id"]: group for group in snapshot.get_average_rating_by_genre()}
+    assert groups["Crime"] == {"_id": "Crime", "average_rating": None, "movie_count": 1}
+    assert groups["Sci-Fi"]["movie_count"] == 2
+    # Movies without imdb.rating are left out, like the server's $match
+    assert "Comedy" not in groups
+    # Genres without any numeric rating sort last
+    assert [group["average_rating"] for group in snapshot.get_average_rating_by_genre()][-1] is None
+
+
+def test_refresh_picks_up_inserts_and_updates(db, snapshot):
+    db.database["movies"].insert_one({"title": "Jaws", "genres": ["Horror"], "imdb": {"rating": 8.0},
+                                      "lastupdated": "2020-01-01"})
+    assert snapshot.refresh() == 1
+    db.database["movies"].update_one({"title": "Up"}, {"$set": {"genres": ["Horror"], "lastupdated": "2021-01-01"}})
+    assert snapshot.refresh() == 1
+    counts = {group["_id"]: group["count"] for group in snapshot.count_movies_by_genre()}
+    assert (counts["Horror"], counts.get("Comedy")) == (3, None)
+    assert snapshot.movie_count == 5
@@ -0,0 +1,62 @@
+import pytest
+
+from movie_controller import MovieController
+
+
+def titles(movies):
+    return sorted(movie["title"] for movie in movies)
+
+
+def test_simple_queries(controller):
+    assert titles(controller.get_movies_by_genre("Sci-Fi")) == ["Alien", "Aliens"]
+    assert titles(controller.get_movies_by_year_range(1980, 2000)) == ["Aliens", "Heat"]
+    assert titles(controller.get_movies_by_cast_member("Sigourney Weaver")) == ["Alien", "Aliens"]
+    assert controller.get_movie_by_exact_title("Up")["year"] == 2009
+
+
+def test_count_movies_by_genre(controller):
+    counts = {group["_id"]: group["count"] for group in controller.count_movies_by_genre()}
+    assert counts["Sci-Fi"] == 2
+    assert sum(counts.values()) == 8
+
+
+def test_average_rating_counts_movies_with_a_non_numeric_rating(controller):
+    groups = {group["_id"]: group for group in controller.get_average_rating_by_genre()}
+    assert groups["Sci-Fi"]["average_rating"] == pytest.approx(8.45)
+    assert (groups["Crime"]["average_rating"], groups["Crime"]["movie_count"]) == (None, 1)
+    assert "Comedy" not in groups
+
+
+def test_top_k_comments_skips_deleted_movies(controller, comments):
+    top = controller.count_comments_per_movie(limit=3)
+    assert [(movie["movie_title"], movie["comment_count"]) for movie in top] == \
+        [("Alien", 3), ("Aliens", 2), ("Heat", 1)]
+
+
+def test_comments_per_movie_can_stream_or_write_a_collection(controller, comments):
+    assert len(list(controller.count_comments_per_movie(stream=True))) == 3
+    controller.count_comments_per_movie(out="comment_counts")
+    assert controller.database["comment_counts"].count_documents({}) == 3
+
+
+def test_count_comments_per_user(controller, comments):
+    assert controller.count_comments_per_user(limit=1) == [{"_id": "viewer0", "comment_count": 10}]
+
+
+def test_movies_with_recent_comments_are_paginated(controller, comments):
+    assert titles(controller.get_movies_with_recent_comments(2012)) == ["Alien", "Aliens"]
+    assert len(controller.get_movies_with_recent_comments(2012, skip=1, limit=1)) == 1
+
+
+def test_movies_with_comments(controller, comments):
+    movies = controller.get_movies_with_comments(limit=2)
+    assert [(movie["title"], len(movie["comments"])) for movie in movies] == [("Alien", 3), ("Aliens", 2)]
+
+
+def test_parallel_title_and_year_scan(controller):
+    assert titles(controller.get_movies_title_and_year(workers=2)) == ["Alien", "Aliens", "Heat", "Up"]
+
+
+def test_analytics_routing_sends_reads_to_secondaries(db):
+    controller = MovieController(db, routing=MovieController.ANALYTICS_ROUTING)
+    assert controller.count_movies_by_genre()
@@ -0,0 +1,239 @@
+"""Benchmarks for the Database class.
+
+Usage: python project_2/benchmark.py [benchmark ...]   (default: all)
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROJECT_1 = os.path.join(HERE, "..", "project_1")
+
+COLD_START_TARGET_MS = 50
+# Local mongod used by the connection profile benchmark
+PROFILE_BENCH_URI = os.getenv("BENCH_MONGO_URI", "mongodb://localhost:27017")
+
+
+def _child_ms(code, cwd, runs):
+    """Median of the in-process time (ms) printed by ``code`` across fresh interpreters"""
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", code], cwd=cwd, check=True,
+                                capture_output=True, text=True).stdout
+        timings.append(float(output.strip().splitlines()[-1]))
+    return statistics.median(timings)
+
+
+def _process_ms(code, cwd, runs):
+    """Median wall time (ms) of a fresh interpreter running ``code``"""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=cwd, check=True, capture_output=True)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def bench_cold_start(runs=10):
+    """Import + construction cost of the no-DB path (nothing should load or connect)"""
+    timed = ("import time; started = time.perf_counter(); {}; "
+             "print((time.perf_counter() - started) * 1000)")
+    cases = {
+        "project_2 Database()": (HERE, "from database import Database; Database()"),
+        "project_1 MovieController()": (PROJECT_1, "from movie_controller import MovieController; "
+                                                   "from database import Database; MovieController(Database())"),
+    }
+    interpreter = _process_ms("pass", HERE, runs)
+    print(f"python interpreter startup: {interpreter:.1f} ms")
+    for name, (cwd, code) in cases.items():
+        in_process = _child_ms(timed.format(code), cwd, runs)
+        process = _process_ms(code, cwd, runs) - interpreter
+        verdict = "OK" if in_process < COLD_START_TARGET_MS else "SLOW"
+        print(f"{name}: import+init {in_process:.1f} ms, process overhead {process:.1f} ms "
+              f"[{verdict}, target < {COLD_START_TARGET_MS} ms]")
+
+    connect = _child_ms(timed.format("from database import Database; Database('memory://bench').db"), HERE, runs)
+    print(f"project_2 first use (memory backend): {connect:.1f} ms")
+
+
+def _per_op_us(fn, ops):
+    started = time.perf_counter()
+    for i in range(ops):
+        fn(i)
+    return (time.perf_counter() - started) / ops * 1e6
+
+
+def bench_tenant_routing(tenants=5000, ops=20000):
+    """Routing overhead of per-tenant handles with thousands of tenants (memory backend)"""
+    from database import Database
+    from tenancy import TenantRouter
+
+    for strategy in ("field", "database"):
+        router = TenantRouter(f"memory://bench-tenants-{strategy}", strategy=strategy)
+        router.ensure_indexes(("users",))
+        started = time.perf_counter()
+        pids = [router.for_tenant(f"t{t}").create_item("users", {"name": f"user {t}"})["pid"]
+                for t in range(tenants)]
+        setup = time.perf_counter() - started
+
+        lookup = _per_op_us(lambda i: router.for_tenant(f"t{i % tenants}"), ops)
+        routed = _per_op_us(lambda i: router.for_tenant(f"t{i % tenants}").get_item_by_pid(
+            "users", pids[i % tenants]), ops // 10)
+        print(f"{strategy}: {tenants} tenants created in {setup:.2f}s, "
+              f"handle lookup {lookup:.2f} us, routed get_item_by_pid {routed:.1f} us")
+
+    plain = Database("memory://bench-tenants-plain")
+    plain._get_collection("users").create_index("pid")
+    plain_pids = [plain.create_item("users", {"name": f"user {t}"})["pid"] for t in range(tenants)]
+    direct = _per_op_us(lambda i: plain.get_item_by_pid("users", plain_pids[i % tenants]), ops // 10)
+    print(f"untenanted get_item_by_pid baseline: {direct:.1f} us")
+
+
+class LatencyProxy:
+    """TCP proxy adding ``delay`` seconds to every chunk forwarded (simulated network latency)"""
+
+    def __init__(self, target_host, target_port, delay):
+        self.target = (target_host, target_port)
+        self.delay = delay
+        self.server = socket.create_server(("127.0.0.1", 0))
+        self.port = self.server.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self.server.accept()
+            except OSError:
+                return
+            upstream = socket.create_connection(self.target)
+            for source, sink in ((client, upstream), (upstream, client)):
+                threading.Thread(target=self._pipe, args=(source, sink), daemon=True).start()
+
+    def _pipe(self, source, sink):
+        try:
+            while True:
+                data = source.recv(65536)
+                if not data:
+                    break
+                time.sleep(self.delay)
+                sink.sendall(data)
+        except OSError:
+            pass
+        finally:
+            source.close()
+            sink.close()
+
+    def close(self):
+        self.server.close()
+
+
+def bench_connection_profiles(documents=20000, latency_ms=20, runs=3):
+    """Bytes on the wire and wall time of a full get_items per connection profile (local mongod)"""
+    from urllib.parse import urlparse
+
+    from mongo_common.profiles import PROFILES
+    from pymongo import MongoClient
+
+    from database import Database
+
+    admin = MongoClient(PROFILE_BENCH_URI, serverSelectionTimeoutMS=2000)
+    try:
+        admin.admin.command("ping")
+    except Exception:
+        print(f"skipped: no mongod at {PROFILE_BENCH_URI} (set BENCH_MONGO_URI)")
+        return
+
+    collection = admin.bench_profiles.projects
+    collection.drop()
+    collection.insert_many([{"pid": str(i), "name": f"Project {i}", "description": "lorem ipsum " * 20,
+                             "status": ["active", "archived"][i % 2], "tags": [f"t{i % 50}", f"t{i % 7}"],
+                             "budget": i * 10.5} for i in range(documents)])
+
+    target = urlparse(PROFILE_BENCH_URI)
+    proxy = LatencyProxy(target.hostname or "localhost", target.port or 27017, latency_ms / 1000)
+    uri = f"mongodb://127.0.0.1:{proxy.port}/?directConnection=true"
+    print(f"{documents} documents, {latency_ms} ms simulated latency per hop")
+    try:
+        for name in (None, *PROFILES):
+            db = Database(uri, db_name="bench_profiles", profile=name)
+            db.test_connection()
+            timings, wire = [], []
+            for _ in range(runs):
+                before = admin.admin.command("serverStatus")["network"]["bytesOut"]
+                started = time.perf_counter()
+                db.get_items("projects", {}, fields=[])
+                timings.append((time.perf_counter() - started) * 1000)
+                wire.append(admin.admin.command("serverStatus")["network"]["bytesOut"] - before)
+            print(f"{name or 'default'}: {statistics.median(timings):.0f} ms, "
+                  f"{statistics.median(wire) / 1e6:.2f} MB on the wire")
+            db.client.close()
+    finally:
+        proxy.close()
+        admin.drop_database("bench_profiles")
+
+
+def bench_models(items=20000, members=5):
+    """Memory per team page item: decoded dicts vs __slots__ models built from raw BSON"""
+    import tracemalloc
+    import uuid
+    from datetime import datetime, timezone
+
+    import bson
+    from bson.raw_bson import RawBSONDocument
+
+    from models import decode
+
+    now = datetime.now(timezone.utc)
+    blobs = []
+    for i in range(items):
+        pids = [str(uuid.uuid4()) for _ in range(members)]
+        blobs.append(bson.encode({
+            "pid": str(uuid.uuid4()), "name": f"team {i}", "members": pids,
+            "member_details": [{"pid": pid, "name": f"user {pid[:8]}", "role": "developer"} for pid in pids],
+            "created_at": now, "updated_at": now, "created_by": "bench",
+        }))
+
+    def traced(build):
+        tracemalloc.start()
+        try:
+            result = build()
+            return tracemalloc.get_traced_memory()[0] / items, result
+        finally:
+            tracemalloc.stop()
+
+    dicts, _ = traced(lambda: [bson.decode(blob) for blob in blobs])
+    compact, teams = traced(lambda: decode("teams", [RawBSONDocument(blob) for blob in blobs]))
+    nested, _ = traced(lambda: [team.member_details for team in teams])
+    print(f"{items} teams with {members} members")
+    print(f"dict: {dicts:.0f} B/item")
+    print(f"model: {compact:.0f} B/item ({1 - compact / dicts:.0%} less), "
+          f"+{nested:.0f} B/item once member_details is read")
+
+
+BENCHMARKS = {
+    "cold_start": bench_cold_start,
+    "tenant_routing": bench_tenant_routing,
+    "connection_profiles": bench_connection_profiles,
+    "models": bench_models,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("benchmarks", nargs="*", metavar="benchmark", help=", ".join(BENCHMARKS))
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+    for name in args.benchmarks or BENCHMARKS:
+        print(f"== {name} ==")
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main()
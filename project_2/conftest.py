@@ -0,0 +1,24 @@
+import uuid
+
+import pytest
+
+from database import Database
+
+
+@pytest.fixture
+def memory_uri():
+    """A fresh memory:// URI, so every test gets its own data and circuit breaker"""
+    return f"memory://{uuid.uuid4().hex}"
+
+
+@pytest.fixture
+def db(memory_uri):
+    return Database(memory_uri)
+
+
+@pytest.fixture
+def users(db):
+    return db.create_items('users', [
+        {'name': f'user{i}', 'email': f'user{i}@example.com', 'role': 'admin' if i == 0 else 'dev'}
+        for i in range(3)
+    ])
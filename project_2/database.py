@@ -1,26 +1,130 @@
-from pymongo.mongo_client import MongoClient
-from pymongo.server_api import ServerApi
-from dotenv import load_dotenv
+import logging
 import os
+import threading
 import uuid
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+
+from mongo_common.profiles import get_profile
+from mongo_common.resilience import (DEFAULT_CLIENT_TIMEOUTS, CircuitBreaker, DatabaseError, Executor,
+                                     ResilientCollection)
+from mongo_common.routing import ReadRouter
+from mongo_common.sketches import CountCache, canonical_key
+
+from denormalization import Denormalizer
+from history import HISTORY_SUFFIX, ChangeLog
+
+# Same value as memory.MEMORY_SCHEME; repeated so the engine (and bson) only load when used
+MEMORY_SCHEME = "memory://"
+
+logger = logging.getLogger(__name__)
+
+
+def _and_condition(attributes, field, condition):
+    """Add ``field: condition`` to a filter without overriding a caller condition on the same field"""
+    scoped = dict(attributes or {})
+    if field in scoped:
+        return {'$and': [scoped, {field: condition}]}
+    scoped[field] = condition
+    return scoped
+
 
 class Database:
-    def __init__(self, connection_string=None):
-        if connection_string:
-            self.client = MongoClient(connection_string,
-                                    server_api=ServerApi('1'),
-                                    tlsAllowInvalidCertificates=True)
-        else:
-            load_dotenv()
-            uri = os.getenv("MONGO_URI")
-            self.client = MongoClient(uri,
-                                    server_api=ServerApi('1'),
-                                    tlsAllowInvalidCertificates=True)
-
-        self.db = self.client.get_database("project_2_db")
-
-        print("DATABASE NAME", self.db.name)
+    def __init__(self, connection_string=None, client=None, max_time_ms=None, retry_policy=None, timeouts=None,
+                 read_preference=None, db_name="project_2_db", executor=None, soft_delete=False, history=False,
+                 profile=None, denormalize=None, coalesce_window_ms=None, count_cache_ttl=60):
+        # Nothing is loaded or connected here: configuration is resolved on first use
+        self.connection_string = connection_string
+        self.db_name = db_name
+        # Soft delete: delete_* set deleted_at, reads skip those items, BatchPurger/TTL purge them
+        self.soft_delete = soft_delete
+        # History: True for every table or a collection of table names (see history.py)
+        self.history = history
+        self.changelog = ChangeLog(self)
+        # Embedded summaries ('sync' or 'background' propagation, see denormalization.py)
+        self.denormalizer = Denormalizer(self, mode=denormalize) if denormalize else None
+        # Concurrent get_item_by_pid calls within this window share one $in query (see dataloader.py)
+        self.coalesce_window_ms = coalesce_window_ms
+        self._loader = None
+        # Approximate stats: counts reused for count_cache_ttl seconds, per-field sketches (see mongo_common/sketches.py)
+        self.count_cache = CountCache(count_cache_ttl)
+        self._sketches = {}  # (table, field) -> FieldSketch
+        self.timeouts = timeouts
+        # Connection profile ('latency', 'throughput', 'bulk-export'): compression, batch size, write concern
+        self.profile = get_profile(profile)
+        self._client = client
+        self._client_given = client is not None
+        self._db = None
+        self._connect_lock = threading.Lock()
+
+        # A shared executor (e.g. from a TenantRouter) is already bound to its cluster breaker
+        self._bind_breaker = executor is None
+        self.executor = executor or Executor(None, retry_policy, max_time_ms)
+        self.router = ReadRouter(read_preference)
+
+    @property
+    def client(self):
+        if self._db is None:
+            self._connect()
+        return self._client
+
+    @property
+    def db(self):
+        if self._db is None:
+            self._connect()
+        return self._db
+
+    def _connect(self):
+        """Resolve the connection string (.env) and create the client"""
+        with self._connect_lock:
+            if self._db is not None:
+                return
+            connection_string = self.connection_string
+            if self._client is None:
+                if not connection_string:
+                    from dotenv import load_dotenv
+                    load_dotenv()
+                    connection_string = os.getenv("MONGO_URI")
+                self._client = self._create_client(connection_string, self.timeouts, self.profile)
+
+            # One circuit breaker per cluster, shared by every handle on it
+            if self._bind_breaker:
+                self.executor.breaker = CircuitBreaker.for_cluster(connection_string or id(self._client))
+            self._db = self._client.get_database(self.db_name)
+
+    def warm_up(self, background=True):
+        """Connect and select a server ahead of the first operation, in a daemon thread by default"""
+        if not background:
+            return self.test_connection()
+        thread = threading.Thread(target=self.test_connection, name="database-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    @staticmethod
+    def _create_client(connection_string, timeouts=None, profile=None):
+        """Create a MongoDB client, or an in-memory one for memory:// URIs"""
+        if connection_string and connection_string.startswith(MEMORY_SCHEME):
+            from mongo_common.memory import MemoryClient
+            return MemoryClient.from_uri(connection_string)
+
+        from pymongo.mongo_client import MongoClient
+        from pymongo.server_api import ServerApi
+        return MongoClient(connection_string,
+                           server_api=ServerApi('1'),
+                           tlsAllowInvalidCertificates=True,
+                           **{**DEFAULT_CLIENT_TIMEOUTS, **(profile.client_options() if profile else {}),
+                              **(timeouts or {})})
+
+    def timeout(self, max_time_ms):
+        """Context manager overriding maxTimeMS for the calls made inside it"""
+        return self.executor.timeout(max_time_ms)
+
+    def read_preference(self, mode, tag_sets=None, max_staleness=-1):
+        """Context manager routing the reads made inside it (e.g. 'secondaryPreferred', 'nearest')"""
+        return self.router.read_preference(mode, tag_sets, max_staleness)
+
+    def causal_session(self):
+        """Context manager giving read-your-writes across members for the calls made inside it"""
+        return self.router.causal_session(self.client)
 
     def _generate_metadata(self, created_by=None):
         """Generate automatic metadata fields"""
@@ -33,9 +137,38 @@ class Database:
             metadata['created_by'] = created_by
         return metadata
 
+    def _scope(self, attributes, include_deleted=False):
+        """Filter actually sent to the server for ``attributes`` (hook for scoped subclasses)"""
+        if not self.soft_delete or include_deleted:
+            return attributes
+        return _and_condition(attributes, 'deleted_at', None)
+
+    def _tracks_history(self, table):
+        if not self.history or table.endswith(HISTORY_SUFFIX):
+            return False
+        return self.history is True or table in self.history
+
+    def _write(self, table, filter, write, updated_by=None):
+        """Run ``write()``; on tracked tables also record its diff / propagate it to embedded copies"""
+        history = self._tracks_history(table)
+        denormalize = self.denormalizer is not None and self.denormalizer.is_source(table)
+        if not history and not denormalize:
+            return write()
+        collection = self._get_collection(table)
+        before = {item['pid']: item for item in collection.find(filter, {'_id': 0})}
+        result = write()
+        if before:
+            after = collection.find({'pid': {'$in': list(before)}}, {'_id': 0})
+            after = {item['pid']: item for item in after}
+            if history:
+                self.changelog.record(table, before, after, updated_by)
+            if denormalize:
+                self.denormalizer.on_change(table, before, after)
+        return result
+
     def _get_collection(self, table):
-        """Get collection by table name"""
-        return self.db[table]
+        """Get collection by table name, wrapped with timeouts, retries and typed errors"""
+        return ResilientCollection(self.db[table], self.executor, self.router, self.profile)
 
     def _build_field_projection(self, fields):
         """Build MongoDB projection based on fields parameter"""
@@ -60,10 +193,11 @@ class Database:
 
         # Insert the item
         collection.insert_one(item)
+        self._sketch_inserted(table, [item])
 
         # Return the created item using aggregate
         pipeline = [
-            {'$match': {'pid': item['pid']}},
+            {'$match': self._scope({'pid': item['pid']})},
             {'$project': {'_id': 0}}
         ]
 
@@ -80,11 +214,12 @@ class Database:
 
         # Insert all items
         result = collection.insert_many(items)
+        self._sketch_inserted(table, items)
 
         # Return created items using aggregate
         pids = [item['pid'] for item in items]
         pipeline = [
-            {'$match': {'pid': {'$in': pids}}},
+            {'$match': self._scope({'pid': {'$in': pids}})},
             {'$project': {'_id': 0}}
         ]
 
@@ -105,12 +240,12 @@ class Database:
 
         # Use aggregate pipeline for update
         pipeline = [
-            {'$match': {'pid': pid}},
+            {'$match': self._scope({'pid': pid})},
             {'$addFields': update_data},
             {'$merge': {'into': table, 'whenMatched': 'replace'}}
         ]
 
-        list(collection.aggregate(pipeline))
+        self._write(table, pipeline[0]['$match'], lambda: list(collection.aggregate(pipeline)), updated_by)
         return self.get_item_by_pid(table, pid, fields=[])
 
     def update_item_by_attr(self, table, attributes, item_data, updated_by=None):
@@ -127,13 +262,13 @@ class Database:
 
         # Use aggregate pipeline for update
         pipeline = [
-            {'$match': attributes},
+            {'$match': self._scope(attributes)},
             {'$limit': 1},
             {'$addFields': update_data},
             {'$merge': {'into': table, 'whenMatched': 'replace'}}
         ]
 
-        list(collection.aggregate(pipeline))
+        self._write(table, pipeline[0]['$match'], lambda: list(collection.aggregate(pipeline)), updated_by)
         return self.get_item_by_attr(table, attributes, fields=[])
 
     def update_items_by_pids(self, table, pids, items_data, updated_by=None):
@@ -150,12 +285,12 @@ class Database:
 
         # Use aggregate pipeline for update
         pipeline = [
-            {'$match': {'pid': {'$in': pids}}},
+            {'$match': self._scope({'pid': {'$in': pids}})},
             {'$addFields': update_data},
             {'$merge': {'into': table, 'whenMatched': 'replace'}}
         ]
 
-        list(collection.aggregate(pipeline))
+        self._write(table, pipeline[0]['$match'], lambda: list(collection.aggregate(pipeline)), updated_by)
         return self.get_items(table, {'pid': {'$in': pids}}, fields=[])
 
     def update_items_by_attr(self, table, attributes, items_data, updated_by=None):
@@ -179,24 +314,28 @@ class Database:
 
         # Use aggregate pipeline for update
         pipeline = [
-            {'$match': attributes},
+            {'$match': self._scope(attributes)},
             {'$addFields': update_data},
             {'$merge': {'into': table, 'whenMatched': 'replace'}}
         ]
 
-        list(collection.aggregate(pipeline))
+        self._write(table, pipeline[0]['$match'], lambda: list(collection.aggregate(pipeline)), updated_by)
         return self.get_items(table, {'pid': {'$in': pids}}, fields=[])
 
     # PARTIE 5 - GET SIMPLE FUNCTIONS
     def get_item_by_pid(self, table, pid, fields=None, pipeline=None):
         """Get a single item by PID"""
+        # Plain lookups are batched with concurrent ones when coalescing is on
+        if self.coalesce_window_ms is not None and not fields and not pipeline:
+            return self.loader.load(table, pid)
+
         collection = self._get_collection(table)
 
         # Default to returning all fields for basic get operations
         if fields is None:
             fields = []
 
-        base_pipeline = [{'$match': {'pid': pid}}]
+        base_pipeline = [{'$match': self._scope({'pid': pid})}]
 
         # Add custom pipeline if provided
         if pipeline:
@@ -218,7 +357,7 @@ class Database:
             fields = []
 
         base_pipeline = [
-            {'$match': attributes},
+            {'$match': self._scope(attributes)},
             {'$limit': 1}
         ]
 
@@ -233,30 +372,65 @@ class Database:
         result = list(collection.aggregate(base_pipeline))
         return result[0] if result else None
 
+    @property
+    def loader(self):
+        """PidLoader coalescing get_item_by_pid lookups (created on first use)"""
+        if self._loader is None:
+            from dataloader import PidLoader
+            with self._connect_lock:
+                if self._loader is None:
+                    window = self.coalesce_window_ms if self.coalesce_window_ms is not None else 2
+                    self._loader = PidLoader(self, window)
+        return self._loader
+
+    async def aget_item_by_pid(self, table, pid):
+        """Asyncio get_item_by_pid, batched with the lookups awaited concurrently"""
+        return await self.loader.aload(table, pid)
+
     # PARTIE 6 - DELETE FUNCTIONS
+    def _delete(self, table, filter, many):
+        """Delete (or soft delete) matching items and return how many were affected"""
+        collection = self._get_collection(table)
+        if self.soft_delete:
+            now = datetime.now(timezone.utc)
+            update = {'$set': {'deleted_at': now, 'updated_at': now}}
+            method = collection.update_many if many else collection.update_one
+            return self._write(table, filter, lambda: method(filter, update).modified_count)
+        method = collection.delete_many if many else collection.delete_one
+        return self._write(table, filter, lambda: method(filter).deleted_count)
+
     def delete_item_by_pid(self, table, pid):
         """Delete a single item by PID"""
-        collection = self._get_collection(table)
-        result = collection.delete_one({'pid': pid})
-        return result.deleted_count > 0
+        return self._delete(table, self._scope({'pid': pid}), many=False) > 0
 
     def delete_item_by_attr(self, table, attributes):
         """Delete a single item by attributes"""
-        collection = self._get_collection(table)
-        result = collection.delete_one(attributes)
-        return result.deleted_count > 0
+        return self._delete(table, self._scope(attributes), many=False) > 0
 
     def delete_items_by_pids(self, table, pids):
         """Delete multiple items by PIDs"""
-        collection = self._get_collection(table)
-        result = collection.delete_many({'pid': {'$in': pids}})
-        return result.deleted_count
+        return self._delete(table, self._scope({'pid': {'$in': pids}}), many=True)
 
     def delete_items_by_attr(self, table, attributes):
         """Delete multiple items by attributes"""
+        return self._delete(table, self._scope(attributes), many=True)
+
+    def restore_items_by_attr(self, table, attributes):
+        """Undo a soft delete for the matching items"""
+        collection = self._get_collection(table)
+        filter = self._scope(attributes, include_deleted=True)
+        filter = _and_condition(filter, 'deleted_at', {'$ne': None})
+        update = {
+            '$unset': {'deleted_at': ''},
+            '$set': {'updated_at': datetime.now(timezone.utc)}
+        }
+        # Recorded in the history; restored sources get their embedded copies back
+        return self._write(table, filter, lambda: collection.update_many(filter, update).modified_count)
+
+    def ensure_purge_ttl(self, table, expire_after_seconds):
+        """Let the server purge soft-deleted items ``expire_after_seconds`` after deletion (TTL index)"""
         collection = self._get_collection(table)
-        result = collection.delete_many(attributes)
-        return result.deleted_count
+        return collection.create_index('deleted_at', expireAfterSeconds=expire_after_seconds)
 
     # PARTIE 7 - ARRAY FUNCTIONS
     def array_push_item_by_pid(self, table, pid, array_field, new_item, updated_by=None):
@@ -268,7 +442,7 @@ class Database:
             update_data['updated_by'] = updated_by
 
         pipeline = [
-            {'$match': {'pid': pid}},
+            {'$match': self._scope({'pid': pid})},
             {'$addFields': {
                 array_field: {'$concatArrays': [f'${array_field}', [new_item]]},
                 **update_data
@@ -276,7 +450,7 @@ class Database:
             {'$merge': {'into': table, 'whenMatched': 'replace'}}
         ]
 
-        list(collection.aggregate(pipeline))
+        self._write(table, pipeline[0]['$match'], lambda: list(collection.aggregate(pipeline)), updated_by)
         return self.get_item_by_pid(table, pid, fields=[])
 
     def array_push_item_by_attr(self, table, attributes, array_field, new_item, updated_by=None):
@@ -288,7 +462,7 @@ class Database:
             update_data['updated_by'] = updated_by
 
         pipeline = [
-            {'$match': attributes},
+            {'$match': self._scope(attributes)},
             {'$addFields': {
                 array_field: {'$concatArrays': [f'${array_field}', [new_item]]},
                 **update_data
@@ -296,7 +470,7 @@ class Database:
             {'$merge': {'into': table, 'whenMatched': 'replace'}}
         ]
 
-        list(collection.aggregate(pipeline))
+        self._write(table, pipeline[0]['$match'], lambda: list(collection.aggregate(pipeline)), updated_by)
         return self.get_items(table, attributes, fields=[])
 
     def array_pull_item_by_pid(self, table, pid, array_field, item_attr, updated_by=None):
@@ -308,7 +482,7 @@ class Database:
             update_data['updated_by'] = updated_by
 
         pipeline = [
-            {'$match': {'pid': pid}},
+            {'$match': self._scope({'pid': pid})},
             {'$addFields': {
                 array_field: {
                     '$filter': {
@@ -321,7 +495,7 @@ class Database:
             {'$merge': {'into': table, 'whenMatched': 'replace'}}
         ]
 
-        list(collection.aggregate(pipeline))
+        self._write(table, pipeline[0]['$match'], lambda: list(collection.aggregate(pipeline)), updated_by)
         return self.get_item_by_pid(table, pid, fields=[])
 
     def array_pull_item_by_attr(self, table, attributes, array_field, item_attr, updated_by=None):
@@ -333,7 +507,7 @@ class Database:
             update_data['updated_by'] = updated_by
 
         pipeline = [
-            {'$match': attributes},
+            {'$match': self._scope(attributes)},
             {'$addFields': {
                 array_field: {
                     '$filter': {
@@ -346,18 +520,28 @@ class Database:
             {'$merge': {'into': table, 'whenMatched': 'replace'}}
         ]
 
-        list(collection.aggregate(pipeline))
+        self._write(table, pipeline[0]['$match'], lambda: list(collection.aggregate(pipeline)), updated_by)
         return self.get_items(table, attributes, fields=[])
 
     # PARTIE 8 - ADVANCED GET FUNCTION
-    def get_items(self, table, attributes=None, fields=None, sort=None, skip=0, limit=None, return_stats=False, pipeline=None):
-        """Advanced get function with filtering, sorting, pagination, and stats"""
+    def get_items(self, table, attributes=None, fields=None, sort=None, skip=0, limit=None, return_stats=False, pipeline=None,
+                  read_preference=None, approximate=False):
+        """Advanced get function with filtering, sorting, pagination, and stats
+
+        ``approximate`` computes ``itemsCount`` like ``count_items(approximate=True)``.
+        """
+        if read_preference:
+            with self.read_preference(read_preference):
+                return self.get_items(table, attributes, fields, sort, skip, limit, return_stats, pipeline,
+                                      approximate=approximate)
+
         collection = self._get_collection(table)
 
         # Build base pipeline
         base_pipeline = []
 
         # Add filtering
+        attributes = self._scope(attributes)
         if attributes:
             base_pipeline.append({'$match': attributes})
 
@@ -368,9 +552,7 @@ class Database:
         # For stats, count total items before pagination
         total_items = 0
         if return_stats:
-            count_pipeline = base_pipeline + [{'$count': 'total'}]
-            count_result = list(collection.aggregate(count_pipeline))
-            total_items = count_result[0]['total'] if count_result else 0
+            total_items = self._count(table, attributes, pipeline, approximate)
 
         # Add sorting
         if sort:
@@ -399,16 +581,246 @@ class Database:
                 'lastIndexReturned': skip + len(results) - 1 if results else skip,
                 'itemsReturned': len(results)
             }
+            if approximate:
+                stats['approximate'] = True
             return {'items': results, 'stats': stats}
 
         return results
 
+    # APPROXIMATE STATS
+    def _count(self, table, filter, pipeline=None, approximate=False):
+        """Items matching an already scoped filter (and pipeline)"""
+        collection = self._get_collection(table)
+        if approximate and not filter and not pipeline:
+            return collection.estimated_document_count()
+
+        count_pipeline = ([{'$match': filter}] if filter else []) + (pipeline or []) + [{'$count': 'total'}]
+
+        def count():
+            result = list(collection.aggregate(count_pipeline))
+            return result[0]['total'] if result else 0
+
+        if not approximate:
+            return count()
+        return self.count_cache.get((table, canonical_key(count_pipeline)), count)
+
+    def count_items(self, table, attributes=None, pipeline=None, approximate=False):
+        """Number of matching items
+
+        ``approximate``: collection metadata when there is no filter (constant time),
+        otherwise an exact count reused for ``count_cache_ttl`` seconds.
+        """
+        return self._count(table, self._scope(attributes), pipeline, approximate)
+
+    def get_sketch(self, table, field, refresh=False, workers=None, **options):
+        """FieldSketch (distinct count, frequencies, top-K) of ``field``, built once then kept up to date on inserts
+
+        Updates and deletes are only reflected by ``refresh=True``; until then counts
+        stay upper bounds. ``workers`` builds it with parallel_scan. ``options`` are
+        the FieldSketch sizes (p, width, depth, capacity).
+        """
+        key = (table, field)
+        if refresh or key not in self._sketches:
+            from mongo_common.sketches import merge_sketches, sketch_documents
+
+            if workers:
+                import functools
+                reducer = functools.partial(sketch_documents, [field], **options)
+                sketches = self.parallel_scan(table, fields=[field], reducer=reducer, combine=merge_sketches,
+                                              workers=workers)
+            else:
+                collection = self._get_collection(table)
+                sketches = sketch_documents([field], collection.find(self._scope({}), {'_id': 0, field: 1}),
+                                            **options)
+            self._sketches[key] = sketches[field]
+        return self._sketches[key]
+
+    def _sketch_inserted(self, table, items):
+        """Add newly created items to the table's sketches and forget its cached counts"""
+        self.count_cache.invalidate(table)
+        for (sketched, _), sketch in self._sketches.items():
+            if sketched == table:
+                for item in items:
+                    sketch.add_document(item)
+
+    # TIME RANGE FUNCTIONS
+    def ensure_time_indexes(self, table):
+        """Indexes backing the time range helpers and changes_since"""
+        collection = self._get_collection(table)
+        return [
+            collection.create_index('created_at'),
+            collection.create_index([('updated_at', 1), ('pid', 1)]),
+        ]
+
+    def get_items_by_time_range(self, table, start, end=None, field='updated_at', attributes=None, **options):
+        """Items whose ``field`` (created_at/updated_at) is in [start, end), oldest first"""
+        condition = {'$gte': start}
+        if end is not None:
+            condition['$lt'] = end
+        options.setdefault('sort', {field: 1, 'pid': 1})
+        return self.get_items(table, _and_condition(attributes, field, condition), **options)
+
+    def get_recent_items(self, table, within, field='updated_at', attributes=None, **options):
+        """Items created/changed in the last ``within`` (timedelta or seconds)"""
+        if not isinstance(within, timedelta):
+            within = timedelta(seconds=within)
+        start = datetime.now(timezone.utc) - within
+        return self.get_items_by_time_range(table, start, None, field, attributes, **options)
+
+    def changes_since(self, table, watermark=None, limit=1000, fields=None):
+        """Next page of items changed after ``watermark``, in (updated_at, pid) order
+
+        Soft-deleted items are included (with their deleted_at) so sync jobs see
+        deletions; hard deletes are not visible here. Returns
+        ``{'items': [...], 'watermark': {...}}``: pass the watermark back to get the
+        following page. Each call is one index range scan on (updated_at, pid), so its
+        cost depends on the number of changed items only.
+        """
+        collection = self._get_collection(table)
+        filter = self._scope({}, include_deleted=True)
+        if watermark:
+            since, pid = watermark['updated_at'], watermark['pid']
+            filter = _and_condition(filter, 'updated_at', {'$gte': since})
+            filter = {'$and': [filter, {'$or': [
+                {'updated_at': {'$gt': since}},
+                {'updated_at': since, 'pid': {'$gt': pid}},
+            ]}]}
+
+        # The watermark fields are always returned, whatever ``fields`` selects
+        fields = fields + ['updated_at', 'deleted_at'] if fields else []
+        pipeline = [
+            {'$match': filter},
+            {'$sort': {'updated_at': 1, 'pid': 1}},
+            {'$limit': limit},
+            {'$project': self._build_field_projection(fields)}
+        ]
+        items = list(collection.aggregate(pipeline))
+        if items:
+            watermark = {'updated_at': items[-1]['updated_at'], 'pid': items[-1]['pid']}
+        return {'items': items, 'watermark': watermark}
+
+    # PARALLEL SCAN
+    def collection_spec(self, table):
+        """Picklable description of a table's collection, reopened by parallel scan workers"""
+        from mongo_common.parallel import CollectionSpec
+        from pymongo.server_api import ServerApi
+
+        self.client  # Resolves MONGO_URI (.env) when no connection string was given
+        # Same options as the main client, so workers pin the same Stable API version
+        options = {**DEFAULT_CLIENT_TIMEOUTS, 'server_api': ServerApi('1'), 'tlsAllowInvalidCertificates': True,
+                   **(self.profile.client_options() if self.profile else {}), **(self.timeouts or {})}
+        return CollectionSpec(self.connection_string or os.getenv("MONGO_URI"), self.db_name, table,
+                              client=self.client if self._client_given else None, client_options=options)
+
+    def parallel_scan(self, table, attributes=None, fields=None, key='pid', partitions=None, workers=None,
+                      reducer=None, combine=None):
+        """Scan a table in ``pid`` ranges on a process pool (see mongo_common/parallel.py)
+
+        Returns the items (all fields by default) or ``combine`` of the per-range ``reducer`` results.
+        """
+        from mongo_common.parallel import parallel_scan
+
+        spec = self.collection_spec(table)
+        filter = self._scope(attributes or {})
+        projection = self._build_field_projection([] if fields is None else fields)
+        return self.executor.call(
+            f'{table}.parallel_scan',
+            lambda: parallel_scan(spec, filter, projection, key, partitions, workers, reducer, combine,
+                                  sampler=self._get_collection(table)),
+            retry=False)
+
+    # UNIT OF WORK
+    def unit_of_work(self, updated_by=None):
+        """Collect mutations across tables and commit them in one transaction (see unit_of_work.py)"""
+        from unit_of_work import UnitOfWork
+        return UnitOfWork(self, updated_by)
+
+    def move_user_between_teams(self, user_pid, from_team_pid, to_team_pid, updated_by=None):
+        """Move a user from one team's members to another's atomically"""
+        # With denormalization on, the unit of work also moves the member_details summary
+        with self.unit_of_work(updated_by) as uow:
+            uow.pull('teams', from_team_pid, 'members', user_pid)
+            uow.push('teams', to_team_pid, 'members', user_pid, unique=True)
+        return self.get_items('teams', {'pid': {'$in': [from_team_pid, to_team_pid]}}, fields=[])
+
+    def move_team_between_projects(self, team_pid, from_project_pid, to_project_pid, updated_by=None):
+        """Re-assign a team from one project's teams to another's atomically"""
+        with self.unit_of_work(updated_by) as uow:
+            uow.pull('projects', from_project_pid, 'teams', team_pid)
+            uow.push('projects', to_project_pid, 'teams', team_pid, unique=True)
+        return self.get_items('projects', {'pid': {'$in': [from_project_pid, to_project_pid]}}, fields=[])
+
+    # WRITE-BEHIND
+    def write_behind(self, flush_interval=0.05, max_pending=1000, flush_at_exit=True, write_concern=None):
+        """Buffer coalescing update_item_by_pid/array_push_item_by_pid calls (see write_behind.py)"""
+        from write_behind import WriteBehindBuffer
+        return WriteBehindBuffer(self, flush_interval, max_pending, flush_at_exit, write_concern)
+
+    # HISTORY
+    def get_history(self, table, pid, field=None, since=None):
+        """Changes recorded for an item, oldest first (``field``: only those touching it)"""
+        return self.changelog.changes(table, pid, field, since)
+
+    def get_item_at(self, table, pid, at):
+        """Item as it was at time ``at``, rebuilt from its history (None if it did not exist)"""
+        collection = self._get_collection(table)
+        current = collection.find_one(self._scope({'pid': pid}, include_deleted=True), {'_id': 0})
+        return self.changelog.item_at(table, pid, at, current)
+
+    # SCHEMAS AND MODELS
+    def ensure_schemas(self, tables=None, level='moderate', action='error'):
+        """Install the ``$jsonSchema`` validators of models.JSON_SCHEMAS (all tables by default)"""
+        from models import JSON_SCHEMAS, ensure_validator
+
+        for table in tables or JSON_SCHEMAS:
+            self.executor.call(f'{table}.collMod', lambda: ensure_validator(
+                self.db, table, JSON_SCHEMAS[table], level, action), retry=False)
+
+    def get_models(self, table, attributes=None, sort=None, skip=0, limit=None):
+        """Items decoded into compact ``__slots__`` models (see models.py)"""
+        from bson.codec_options import CodecOptions
+        from bson.raw_bson import RawBSONDocument
+        from models import decode
+
+        # Raw documents: nested summaries are only decoded when a model reads them
+        collection = self._get_collection(table).with_options(
+            codec_options=CodecOptions(document_class=RawBSONDocument))
+        cursor = collection.find(self._scope(attributes or {}), {'_id': 0})
+        if sort:
+            cursor = cursor.sort(list(sort.items()))
+        if skip:
+            cursor = cursor.skip(skip)
+        if limit:
+            cursor = cursor.limit(limit)
+        return decode(table, cursor)
+
+    # COLUMNAR EXPORT
+    def export_items(self, table, attributes=None, schema=None, format="arrow", path=None, batch_size=10000):
+        """Export items as numpy/arrow columns or stream them to a parquet/feather file"""
+        from mongo_common import columnar
+
+        schema = schema or columnar.SCHEMAS[table]
+        collection = self._get_collection(table)
+
+        pipeline = []
+        attributes = self._scope(attributes)
+        if attributes:
+            pipeline.append({'$match': attributes})
+        pipeline.append({'$project': columnar.projection(schema)})
+
+        cursor = collection.aggregate(pipeline, batchSize=batch_size)
+        return columnar.export(cursor, schema, format, path, batch_size)
+
     # CONNECTION TEST FUNCTION
+    def ping(self):
+        """Check the cluster is reachable, raising a DatabaseError subclass if not"""
+        return self.executor.call('server_info', self.client.server_info)
+
     def test_connection(self):
         """Test MongoDB connection"""
         try:
-            self.client.server_info()
+            self.ping()
             return True
-        except Exception as e:
-            print(f"Connection failed: {e}")
+        except DatabaseError as e:
+            logger.warning("Connection failed: %s", e)
             return False
\ No newline at end of file
@@ -0,0 +1,137 @@
+"""Coalescing of concurrent ``get_item_by_pid`` lookups (dataloader pattern).
+
+Lookups arriving within ``window_ms`` of each other for the same table are
+answered by a single ``get_items(table, {'pid': {'$in': [...]}})`` query.
+A pid already queued for the next batch is not requested twice: its callers
+share one future. Lookups made once a batch is in flight start a new batch,
+so a read issued after a write never gets a result fetched before it.
+
+The first caller of a window waits ``window_ms`` and then runs the batch.
+A batch reaching ``max_batch`` pids is dispatched at once by the caller that
+filled it. ``load`` blocks the calling thread. ``aload`` is the asyncio
+version: it awaits the window, and the query runs in the loop's default
+executor because PyMongo is synchronous.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+
+
+class PidLoader:
+    """Batches and de-duplicates pid lookups against one Database"""
+
+    def __init__(self, db, window_ms=2, max_batch=500):
+        self.db = db
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._pending = {}  # table -> {pid: future} waiting for the next batch
+        self._futures = {}  # (table, pid) -> future queued for the next batch
+        self._async_pending = {}  # (loop, table) -> {pid: asyncio future}
+        self._async_futures = {}  # (loop, table, pid) -> asyncio future queued for the next batch
+        self.requests = 0
+        self.deduplicated = 0
+        self.batches = 0
+        self.fetched = 0
+
+    def _fetch(self, table, pids):
+        """One round trip for a batch; returns ``{pid: item}``"""
+        items = self.db.get_items(table, {'pid': {'$in': pids}}, fields=[])
+        with self._lock:
+            self.batches += 1
+            self.fetched += len(pids)
+        return {item['pid']: item for item in items}
+
+    # ----- threads -----
+
+    def load(self, table, pid):
+        """Item ``pid`` of ``table`` (None if missing), fetched together with concurrent lookups"""
+        leader = full = False
+        with self._lock:
+            self.requests += 1
+            future = self._futures.get((table, pid))
+            if future is not None:
+                self.deduplicated += 1
+            else:
+                future = Future()
+                self._futures[(table, pid)] = future
+                pending = self._pending.setdefault(table, {})
+                leader = not pending
+                pending[pid] = future
+                full = len(pending) >= self.max_batch
+        if full:
+            self._dispatch(table)
+        elif leader:
+            time.sleep(self.window)
+            self._dispatch(table)
+        return future.result()
+
+    def _dispatch(self, table):
+        with self._lock:
+            batch = self._pending.pop(table, None) or {}
+            for pid in batch:
+                self._futures.pop((table, pid), None)
+        if not batch:
+            return
+        try:
+            items = self._fetch(table, list(batch))
+        except Exception as e:
+            for future in batch.values():
+                future.set_exception(e)
+        else:
+            for pid, future in batch.items():
+                future.set_result(items.get(pid))
+
+    # ----- asyncio -----
+
+    async def aload(self, table, pid):
+        """Asyncio version of ``load``"""
+        loop = asyncio.get_running_loop()
+        self.requests += 1
+        future = self._async_futures.get((loop, table, pid))
+        if future is not None:
+            self.deduplicated += 1
+            return await asyncio.shield(future)
+
+        future = loop.create_future()
+        self._async_futures[(loop, table, pid)] = future
+        pending = self._async_pending.setdefault((loop, table), {})
+        leader = not pending
+        pending[pid] = future
+        if len(pending) >= self.max_batch:
+            loop.create_task(self._adispatch(loop, table))
+        elif leader:
+            loop.call_later(self.window, lambda: loop.create_task(self._adispatch(loop, table)))
+        return await asyncio.shield(future)
+
+    async def _adispatch(self, loop, table):
+        batch = self._async_pending.pop((loop, table), None)
+        if not batch:
+            return
+        for pid in batch:
+            self._async_futures.pop((loop, table, pid), None)
+        try:
+            items = await loop.run_in_executor(None, self._fetch, table, list(batch))
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for pid, future in batch.items():
+                if not future.done():
+                    future.set_result(items.get(pid))
+
+    # ----- metrics -----
+
+    def stats(self):
+        """How much was coalesced: lookups, de-duplicated lookups, queries sent, pids per query"""
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'deduplicated': self.deduplicated,
+                'batches': self.batches,
+                'fetched': self.fetched,
+                'avg_batch_size': round(self.fetched / self.batches, 2) if self.batches else 0.0,
+                'round_trips_saved': self.requests - self.batches,
+            }
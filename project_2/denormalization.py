@@ -0,0 +1,276 @@
+"""Embedded summaries kept in sync with the items they copy.
+
+Teams reference their members by pid (``members``) and also embed a small
+summary of each one (``member_details``: pid, name, role) so a team reads in
+one document without a ``$lookup``; projects do the same for their teams. An
+``Embedding`` declares one such copy::
+
+    Embedding(source='users', target='teams', array='member_details',
+              fields=('name', 'role'), ref='members')
+
+When a ``Database`` is created with ``denormalize='sync'`` or
+``'background'``, every write that changes an embedded field of a source item
+is propagated to the copies with one targeted update per target collection::
+
+    {'member_details.pid': pid}
+    {'$set': {'member_details.$[item].name': ...}}, arrayFilters=[{'item.pid': pid}]
+
+Deleting a source item pulls its summary. ``UnitOfWork`` writes the same
+updates inside its transaction, so copies change atomically with the source.
+In ``background`` mode a daemon thread applies the updates in batches;
+``flush()`` waits for it. A batch that fails with a connection error
+(``ServiceUnavailableError``) is retried in place every ``retry_interval``
+seconds until it succeeds or ``stop()`` is called. Newer requests wait behind
+it, so the updates of an item are never reordered; replaying the part of the
+batch already applied is harmless because each update is idempotent. Other
+failures are logged and the batch is dropped (``rebuild()`` repairs the
+copies). ``metrics()`` reports propagation throughput, failures and the last
+error.
+"""
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+from mongo_common.resilience import ServiceUnavailableError
+
+logger = logging.getLogger(__name__)
+
+
+class Embedding:
+    """Fields of ``source`` items copied into the ``array`` of ``target`` items"""
+
+    def __init__(self, source, target, array, fields, ref=None):
+        self.source = source
+        self.target = target
+        self.array = array
+        self.fields = tuple(fields)
+        # Array of plain pids the summaries mirror (kept in the same order)
+        self.ref = ref
+
+    def summary(self, item):
+        """Embedded copy of a source item"""
+        return {'pid': item['pid'], **{field: item.get(field) for field in self.fields}}
+
+    def set_request(self, pid, changes):
+        """Update rewriting the changed fields in every copy of ``pid``"""
+        from pymongo import UpdateMany
+
+        update = {f'{self.array}.$[item].{field}': value for field, value in changes.items()}
+        update['updated_at'] = datetime.now(timezone.utc)
+        return UpdateMany({f'{self.array}.pid': pid}, {'$set': update},
+                          array_filters=[{'item.pid': pid}])
+
+    def restore_request(self, item):
+        """Update adding back the copy of a restored item to the targets still referencing it"""
+        from pymongo import UpdateMany
+
+        return UpdateMany({self.ref: item['pid'], f'{self.array}.pid': {'$ne': item['pid']}},
+                          {'$push': {self.array: self.summary(item)},
+                           '$set': {'updated_at': datetime.now(timezone.utc)}})
+
+    def pull_request(self, pid):
+        """Update removing every copy of ``pid``"""
+        from pymongo import UpdateMany
+
+        return UpdateMany({f'{self.array}.pid': pid},
+                          {'$pull': {self.array: {'pid': pid}},
+                           '$set': {'updated_at': datetime.now(timezone.utc)}})
+
+    def __repr__(self):
+        return f"Embedding({self.source!r} -> {self.target}.{self.array})"
+
+
+EMBEDDINGS = (
+    Embedding('users', 'teams', 'member_details', ('name', 'role'), ref='members'),
+    Embedding('teams', 'projects', 'team_details', ('name',), ref='teams'),
+)
+
+
+class Denormalizer:
+    """Propagates source item changes to their embedded copies"""
+
+    def __init__(self, db, embeddings=EMBEDDINGS, mode='sync', batch_size=500, retry_interval=1.0):
+        if mode not in ('sync', 'background'):
+            raise ValueError(f"Unknown denormalization mode: {mode}")
+        self.db = db
+        self.embeddings = embeddings
+        self.mode = mode
+        self.batch_size = batch_size
+        self.retry_interval = retry_interval
+        self.propagated = 0
+        self.requests = 0
+        self.batches = 0
+        self.last_batch_ms = 0.0
+        self.elapsed = 0.0
+        self.failed = 0
+        self.last_error = None
+        self._queue = queue.Queue()
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def is_source(self, table):
+        return any(embedding.source == table for embedding in self.embeddings)
+
+    def embeddings_for(self, target, ref):
+        """Embeddings mirroring the ``ref`` pid array of ``target``"""
+        return [e for e in self.embeddings if e.target == target and e.ref == ref]
+
+    def requests_for(self, table, pid, changes=None, removed=False, restored=None):
+        """``[(target, request)]`` propagating a change (or removal) of source item ``pid``
+
+        ``restored`` is the item when it comes back from a soft delete.
+        """
+        requests = []
+        for embedding in self.embeddings:
+            if embedding.source != table:
+                continue
+            if restored is not None:
+                if embedding.ref:
+                    requests.append((embedding.target, embedding.restore_request(restored)))
+                continue
+            if removed:
+                requests.append((embedding.target, embedding.pull_request(pid)))
+                continue
+            embedded = {field: value for field, value in (changes or {}).items() if field in embedding.fields}
+            if embedded:
+                requests.append((embedding.target, embedding.set_request(pid, embedded)))
+        return requests
+
+    def on_change(self, table, before, after):
+        """Propagate the differences between two ``{pid: item}`` states of a source table"""
+        requests = []
+        for pid, item in before.items():
+            new = after.get(pid)
+            if new is None or new.get('deleted_at') is not None:
+                requests += self.requests_for(table, pid, removed=True)
+                continue
+            if item.get('deleted_at') is not None:
+                requests += self.requests_for(table, pid, restored=new)
+                continue
+            changes = {field: value for field, value in new.items() if item.get(field) != value}
+            requests += self.requests_for(table, pid, changes)
+        if not requests:
+            return
+        if self.mode == 'sync':
+            self.apply(requests)
+        else:
+            for request in requests:
+                self._queue.put(request)
+            self._ensure_worker()
+
+    def apply(self, requests):
+        """Run ``[(target, request)]`` as one unordered bulk write per target; return copies updated"""
+        started = time.perf_counter()
+        by_target = {}
+        for target, request in requests:
+            by_target.setdefault(target, []).append(request)
+        modified = 0
+        for target, operations in by_target.items():
+            result = self.db._get_collection(target).bulk_write(operations, ordered=False)
+            modified += result.modified_count
+        with self._lock:
+            self.last_batch_ms = (time.perf_counter() - started) * 1000
+            self.elapsed += self.last_batch_ms / 1000
+            self.propagated += modified
+            self.requests += len(requests)
+            self.batches += 1
+        return modified
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._work, name="denormalizer", daemon=True)
+                self._thread.start()
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                batch = [self._queue.get(timeout=self.retry_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._apply_batch(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _apply_batch(self, batch):
+        """Apply a batch, retrying it in place (ahead of newer requests) while the cluster is unreachable"""
+        while True:
+            try:
+                self.apply(batch)
+                return
+            except ServiceUnavailableError as e:
+                self._failed(e, len(batch), retried=True)
+                if self._stop.wait(self.retry_interval):
+                    return
+            except Exception as e:
+                self._failed(e, len(batch), retried=False)
+                return
+
+    def _failed(self, error, size, retried):
+        with self._lock:
+            self.failed += 1
+            self.last_error = error
+        if retried:
+            logger.warning("Denormalization batch of %d requests failed, retrying: %s", size, error)
+        else:
+            logger.error("Denormalization batch of %d requests dropped: %s", size, error)
+
+    def flush(self):
+        """Wait until every queued propagation has been applied"""
+        self._queue.join()
+
+    def stop(self, timeout=None):
+        """Stop the background worker after its current batch; a batch still being retried is dropped"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def rebuild(self, embedding):
+        """Recompute every copy of ``embedding`` from its ``ref`` pids (backfill/repair); return targets updated"""
+        from pymongo import UpdateOne
+
+        targets = self.db._get_collection(embedding.target)
+        sources = self.db._get_collection(embedding.source)
+        items = list(targets.find(self.db._scope({}), {'_id': 0, 'pid': 1, embedding.ref: 1}))
+        pids = {pid for item in items for pid in item.get(embedding.ref, [])}
+        projection = {'_id': 0, 'pid': 1, **{field: 1 for field in embedding.fields}}
+        summaries = {source['pid']: embedding.summary(source)
+                     for source in sources.find(self.db._scope({'pid': {'$in': list(pids)}}), projection)}
+        operations = [UpdateOne(self.db._scope({'pid': item['pid']}), {'$set': {embedding.array: [
+            summaries[pid] for pid in item.get(embedding.ref, []) if pid in summaries]}})
+            for item in items]
+        started = time.perf_counter()
+        modified = targets.bulk_write(operations, ordered=False).modified_count if operations else 0
+        with self._lock:
+            self.elapsed += time.perf_counter() - started
+            self.propagated += modified
+            self.requests += len(operations)
+            self.batches += 1
+        return modified
+
+    def metrics(self):
+        """Propagation counters and throughput"""
+        with self._lock:
+            return {
+                'mode': self.mode,
+                'propagated': self.propagated,
+                'requests': self.requests,
+                'batches': self.batches,
+                'pending': self._queue.qsize(),
+                'failed': self.failed,
+                'last_error': repr(self.last_error) if self.last_error else None,
+                'last_batch_ms': round(self.last_batch_ms, 3),
+                'avg_batch_ms': round(self.elapsed * 1000 / self.batches, 3) if self.batches else 0.0,
+                'copies_per_second': round(self.propagated / self.elapsed, 1) if self.elapsed else 0.0,
+            }
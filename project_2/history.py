@@ -0,0 +1,156 @@
+"""Append-only, field-level change history for Database tables.
+
+Each write on a tracked table appends one entry per modified item to
+``<table>_history``::
+
+    {'at': ..., 'by': ..., 'op': 'update' | 'delete',
+     'set': {field: new value}, 'prev': {field: old value}, 'added': [field, ...]}
+
+Only the fields that changed are stored (``updated_at``/``updated_by`` are
+carried by ``at``/``by``) and empty keys are omitted. Entries are pushed into
+time buckets, one document per item and ``bucket_seconds`` window holding at
+most ``bucket_size`` entries, so the collection grows by one small document per
+item per window instead of one full copy per write. All the entries of one
+``Database`` write go to the server as a single ordered ``bulk_write``, and
+``ensure_collection`` creates the collection with zstd block compression.
+
+``item_at`` rebuilds an item as it was at a given time by undoing, newest
+first, only the entries recorded after that time: the cost is proportional to
+the changes since then, not to the whole history.
+"""
+from datetime import datetime, timezone
+
+HISTORY_SUFFIX = '_history'
+
+# Carried by the entry's ``at``/``by``; still kept in ``prev`` so item_at restores them
+IMPLICIT_FIELDS = ('updated_at', 'updated_by')
+
+
+def _utc(value):
+    """Aware UTC datetime (BSON dates come back naive, in UTC)"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def diff(before, after):
+    """Field-level change entry turning ``before`` into ``after`` (None when nothing changed)"""
+    if after is None:
+        return {'op': 'delete', 'prev': {k: v for k, v in before.items() if k != '_id'}}
+    changed, prev, added = {}, {}, []
+    for field, value in after.items():
+        if field == '_id':
+            continue
+        if field not in before:
+            changed[field] = value
+            added.append(field)
+        elif before[field] != value:
+            changed[field] = value
+            prev[field] = before[field]
+    for field, value in before.items():
+        if field != '_id' and field not in after:
+            prev[field] = value
+    if not prev and not added:
+        return None
+    entry = {'op': 'update'}
+    changed = {k: v for k, v in changed.items() if k not in IMPLICIT_FIELDS}
+    if changed:
+        entry['set'] = changed
+    if prev:
+        entry['prev'] = prev
+    if added:
+        entry['added'] = added
+    return entry
+
+
+def undo(document, entry):
+    """Revert ``entry`` on ``document`` in place"""
+    for field in entry.get('added', ()):
+        document.pop(field, None)
+    document.update(entry.get('prev', {}))
+    return document
+
+
+class ChangeLog:
+    """Writes and reads the bucketed ``<table>_history`` collections of a Database"""
+
+    def __init__(self, db, bucket_seconds=3600, bucket_size=200):
+        self.db = db
+        self.bucket_seconds = bucket_seconds
+        self.bucket_size = bucket_size
+
+    def collection(self, table):
+        return self.db._get_collection(f"{table}{HISTORY_SUFFIX}")
+
+    def bucket(self, at):
+        """Start of the time bucket containing ``at``"""
+        timestamp = _utc(at).timestamp()
+        return datetime.fromtimestamp(timestamp - timestamp % self.bucket_seconds, timezone.utc)
+
+    def ensure_collection(self, table):
+        """Create the history collection (zstd compressed) and its ``(pid, bucket)`` index"""
+        from pymongo.errors import CollectionInvalid
+
+        try:
+            self.db.db.create_collection(
+                f"{table}{HISTORY_SUFFIX}",
+                storageEngine={'wiredTiger': {'configString': 'block_compressor=zstd'}})
+        except CollectionInvalid:
+            pass  # Already exists
+        return self.collection(table).create_index([('pid', 1), ('bucket', -1)])
+
+    def requests(self, before, after, by=None):
+        """Bucket upserts appending the changes between two ``{pid: item}`` states"""
+        from pymongo import UpdateOne
+
+        now = datetime.now(timezone.utc)
+        requests = []
+        for pid, item in before.items():
+            entry = diff(item, after.get(pid))
+            if entry is None:
+                continue
+            at = after[pid].get('updated_at', now) if pid in after else now
+            entry = {'at': at, 'by': by, **entry} if by else {'at': at, **entry}
+            requests.append(UpdateOne(
+                {'pid': pid, 'bucket': self.bucket(at), 'count': {'$lt': self.bucket_size}},
+                {'$push': {'changes': entry}, '$inc': {'count': 1}},
+                upsert=True))
+        return requests
+
+    def record(self, table, before, after, by=None):
+        """Append the changes between two ``{pid: item}`` states in one bulk write; return how many"""
+        requests = self.requests(before, after, by)
+        if requests:
+            self.collection(table).bulk_write(requests, ordered=True)
+        return len(requests)
+
+    def _entries(self, table, pid, since=None):
+        """Entries of ``pid`` (recorded after ``since`` when given), oldest first"""
+        filter = {'pid': pid}
+        if since is not None:
+            filter['bucket'] = {'$gte': self.bucket(since)}
+        entries = [entry for bucket in self.collection(table).find(filter, {'_id': 0, 'changes': 1})
+                   for entry in bucket['changes']]
+        entries.sort(key=lambda entry: _utc(entry['at']))
+        if since is not None:
+            since = _utc(since)
+            entries = [entry for entry in entries if _utc(entry['at']) > since]
+        return entries
+
+    def changes(self, table, pid, field=None, since=None):
+        """History of an item, oldest first; ``field`` keeps only the entries touching it"""
+        entries = self._entries(table, pid, since)
+        if field is None:
+            return entries
+        return [entry for entry in entries
+                if field in entry.get('set', {}) or field in entry.get('prev', {})]
+
+    def item_at(self, table, pid, at, current):
+        """Item ``pid`` as it was at ``at``, given its ``current`` state (None if deleted)"""
+        document = dict(current) if current else {}
+        for entry in reversed(self._entries(table, pid, since=at)):
+            undo(document, entry)
+        created_at = document.get('created_at')
+        if not document or (created_at is not None and _utc(created_at) > _utc(at)):
+            return None
+        return document
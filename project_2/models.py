@@ -0,0 +1,209 @@
+"""Declared schemas and compact read models for users, teams and projects.
+
+``JSON_SCHEMAS`` describes the documents listed in the README. They are
+enforced server-side by ``Database.ensure_schemas()``, which installs them as
+``$jsonSchema`` collection validators. Writes that break a schema are then
+rejected by the server with ``DocumentValidationError``, so readers do not need
+to check the documents again. Extra fields such as ``tenant_id`` or
+``deleted_at`` are allowed. The memory backend accepts validators but does not
+enforce them.
+
+``Database.get_models()`` decodes results into ``User``/``Team``/``Project``.
+These classes use ``__slots__`` instead of a per-object ``__dict__``, which
+makes each item much smaller than the dict it replaces. The nested arrays
+(``members``, ``member_details``, ``teams``, ``team_details``, ``tags``) are
+kept as they came off the wire. They are only converted into tuples of
+summary models the first time they are read. With a ``RawBSONDocument``
+cursor, embedded summaries stay as raw BSON until then.
+
+Models read like dicts (``item['pid']``, ``item.get('role')``) as well as
+attributes, and ``to_dict()`` gives back the plain document.
+"""
+
+_METADATA_PROPERTIES = {
+    'pid': {'bsonType': 'string', 'minLength': 1},
+    'created_at': {'bsonType': 'date'},
+    'updated_at': {'bsonType': 'date'},
+    'created_by': {'bsonType': 'string'},
+    'updated_by': {'bsonType': 'string'},
+    'deleted_at': {'bsonType': ['date', 'null']},
+}
+_METADATA_REQUIRED = ['pid', 'created_at', 'updated_at']
+
+_PIDS = {'bsonType': 'array', 'items': {'bsonType': 'string'}}
+_NAME = {'bsonType': 'string', 'minLength': 1}
+
+
+def _object_schema(required, properties):
+    return {'$jsonSchema': {
+        'bsonType': 'object',
+        'required': _METADATA_REQUIRED + required,
+        'properties': {**_METADATA_PROPERTIES, **properties},
+    }}
+
+
+JSON_SCHEMAS = {
+    'users': _object_schema(['name', 'email', 'role'], {
+        'name': _NAME,
+        'email': {'bsonType': 'string', 'pattern': r'^[^@\s]+@[^@\s]+$'},
+        'role': {'bsonType': 'string', 'minLength': 1},
+    }),
+    'teams': _object_schema(['name', 'members'], {
+        'name': _NAME,
+        'members': _PIDS,
+        'member_details': {'bsonType': 'array', 'items': {
+            'bsonType': 'object', 'required': ['pid'],
+            'properties': {'pid': {'bsonType': 'string'}, 'name': {'bsonType': 'string'},
+                           'role': {'bsonType': 'string'}}}},
+    }),
+    'projects': _object_schema(['name', 'teams'], {
+        'name': _NAME,
+        'teams': _PIDS,
+        'team_details': {'bsonType': 'array', 'items': {
+            'bsonType': 'object', 'required': ['pid'],
+            'properties': {'pid': {'bsonType': 'string'}, 'name': {'bsonType': 'string'}}}},
+        'tags': {'bsonType': 'array', 'items': {'bsonType': 'string'}},
+        'budget': {'bsonType': ['int', 'long', 'double', 'decimal']},
+        'deadline': {'bsonType': 'date'},
+    }),
+}
+
+
+def ensure_validator(database, name, schema, level='moderate', action='error'):
+    """Install ``schema`` as the validator of collection ``name`` (created if missing)"""
+    from pymongo.errors import CollectionInvalid
+
+    options = {'validator': schema, 'validationLevel': level, 'validationAction': action}
+    try:
+        database.create_collection(name, **options)
+    except CollectionInvalid:
+        database.command('collMod', name, **options)
+
+
+class _LazyArray:
+    """Array field decoded on first access into a tuple (of ``model`` instances when given)"""
+
+    def __init__(self, model=None):
+        self.model = model
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.slot = getattr(owner, f'_{name}')
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        value = self.slot.__get__(obj, owner)
+        if isinstance(value, tuple):
+            return value
+        model = self.model
+        decoded = tuple(value or ()) if model is None else tuple(map(model.from_document, value or ()))
+        self.slot.__set__(obj, decoded)
+        return decoded
+
+
+class Model:
+    """Item decoded into ``__slots__``; subclasses list their ``FIELDS`` and lazy ``ARRAYS``"""
+
+    __slots__ = ('extra',)
+    FIELDS = ()
+    ARRAYS = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._known = frozenset(('_id', *cls.FIELDS, *cls.ARRAYS))
+        cls._slots = tuple(cls.FIELDS) + tuple(f'_{name}' for name in cls.ARRAYS)
+
+    @classmethod
+    def from_document(cls, document):
+        """Model for a dict or ``RawBSONDocument``; nested arrays are left undecoded"""
+        item = cls.__new__(cls)
+        get = document.get
+        for slot, field in zip(cls._slots, (*cls.FIELDS, *cls.ARRAYS)):
+            setattr(item, slot, get(field))
+        known = cls._known
+        extra = {field: document[field] for field in document if field not in known}
+        item.extra = extra or None
+        return item
+
+    def to_dict(self):
+        """Plain document (None fields omitted), nested arrays and summaries included"""
+        document = {field: getattr(self, field) for field in self.FIELDS if getattr(self, field) is not None}
+        for name in self.ARRAYS:
+            if getattr(self, f'_{name}') is None:
+                continue
+            document[name] = [value.to_dict() if isinstance(value, Model) else value
+                              for value in getattr(self, name)]
+        if self.extra:
+            document.update(self.extra)
+        return document
+
+    def get(self, field, default=None):
+        if field in self.FIELDS or field in self.ARRAYS:
+            value = getattr(self, field)
+            return default if value is None else value
+        return (self.extra or {}).get(field, default)
+
+    def __getitem__(self, field):
+        value = self.get(field)
+        if value is None:
+            raise KeyError(field)
+        return value
+
+    def __eq__(self, other):
+        if not isinstance(other, Model):
+            return NotImplemented
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"{type(self).__name__}(pid={self.pid!r}, name={getattr(self, 'name', None)!r})"
+
+
+class MemberSummary(Model):
+    __slots__ = ('pid', 'name', 'role')
+    FIELDS = ('pid', 'name', 'role')
+
+
+class TeamSummary(Model):
+    __slots__ = ('pid', 'name')
+    FIELDS = ('pid', 'name')
+
+
+_METADATA_FIELDS = ('pid', 'created_at', 'updated_at', 'created_by', 'updated_by', 'deleted_at')
+
+
+class User(Model):
+    __slots__ = _METADATA_FIELDS + ('name', 'email', 'role')
+    FIELDS = __slots__
+
+
+class Team(Model):
+    __slots__ = _METADATA_FIELDS + ('name', '_members', '_member_details')
+    FIELDS = _METADATA_FIELDS + ('name',)
+    ARRAYS = ('members', 'member_details')
+
+    members = _LazyArray()
+    member_details = _LazyArray(MemberSummary)
+
+
+class Project(Model):
+    __slots__ = _METADATA_FIELDS + ('name', 'budget', 'deadline', '_teams', '_team_details', '_tags')
+    FIELDS = _METADATA_FIELDS + ('name', 'budget', 'deadline')
+    ARRAYS = ('teams', 'team_details', 'tags')
+
+    teams = _LazyArray()
+    team_details = _LazyArray(TeamSummary)
+    tags = _LazyArray()
+
+
+MODELS = {
+    'users': User,
+    'teams': Team,
+    'projects': Project,
+}
+
+
+def decode(table, documents):
+    """Models for the documents of ``table``"""
+    from_document = MODELS[table].from_document
+    return [from_document(document) for document in documents]
@@ -0,0 +1,121 @@
+"""Rate-limited background purge of soft-deleted (or otherwise matching) documents.
+
+One unbounded ``delete_many`` over millions of documents holds locks for its
+whole duration, emits one oplog burst and blocks the caller. ``BatchPurger``
+instead deletes ``batch_size`` documents at a time by ``_id`` and sleeps
+``throttle`` seconds between batches, so replication and concurrent traffic
+keep up. It can run inline (``run``) or in a background thread (``start``)
+and exposes its progress through ``metrics()``.
+
+For soft deletes without a rate limit requirement, ``Database.ensure_purge_ttl``
+lets the server's TTL monitor do the same job.
+"""
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from database import _and_condition
+
+
+class BatchPurger:
+    """Deletes the documents matching ``filter`` in throttled ``_id`` batches"""
+
+    def __init__(self, db, table, filter=None, older_than=None, batch_size=1000, throttle=0.05):
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        self.db = db
+        self.table = table
+        # Default target: every soft-deleted document
+        self.filter = filter if filter is not None else {'deleted_at': {'$ne': None}}
+        if isinstance(older_than, (int, float)):
+            older_than = timedelta(seconds=older_than)
+        self.older_than = older_than
+        self.batch_size = batch_size
+        self.throttle = throttle
+        self.purged = 0
+        self.batches = 0
+        self.last_batch_ms = 0.0
+        self.elapsed = 0.0
+        self.started_at = None
+        self.finished_at = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _filter(self):
+        """Filter for the next batch (``older_than`` is re-evaluated each time), scoped like the handle"""
+        filter = self.filter
+        if self.older_than is not None:
+            cutoff = datetime.now(timezone.utc) - self.older_than
+            filter = _and_condition(filter, 'deleted_at', {'$lte': cutoff})
+        # A tenant handle only purges its own documents; soft-deleted ones are the point
+        return self.db._scope(filter, include_deleted=True)
+
+    def run_once(self):
+        """Delete one batch; return how many documents it removed"""
+        collection = self.db._get_collection(self.table)
+        started = time.perf_counter()
+        ids = [doc['_id'] for doc in collection.find(self._filter(), {'_id': 1}).limit(self.batch_size)]
+        deleted = collection.delete_many({'_id': {'$in': ids}}).deleted_count if ids else 0
+        self.last_batch_ms = (time.perf_counter() - started) * 1000
+        self.elapsed += self.last_batch_ms / 1000
+        if deleted:
+            self.purged += deleted
+            self.batches += 1
+        return deleted
+
+    def run(self, max_batches=None):
+        """Purge batch after batch until nothing matches, ``stop()`` is called or ``max_batches`` ran"""
+        self._stop.clear()
+        self.started_at = self.started_at or datetime.now(timezone.utc)
+        self.finished_at = None
+        batches = 0
+        while not self._stop.is_set():
+            # A short batch means the filter is drained
+            if self.run_once() < self.batch_size:
+                break
+            batches += 1
+            if max_batches is not None and batches >= max_batches:
+                break
+            if self.throttle:
+                self._stop.wait(self.throttle)
+        self.finished_at = datetime.now(timezone.utc)
+        return self.purged
+
+    def start(self):
+        """Run the purge in a daemon thread"""
+        if self.running:
+            return self
+        self._thread = threading.Thread(target=self.run, name=f"purge-{self.table}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Ask the background purge to stop after its current batch and wait for it"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def remaining(self):
+        """Number of documents still matching the purge filter"""
+        return self.db._get_collection(self.table).count_documents(self._filter())
+
+    def metrics(self, with_remaining=True):
+        """Progress snapshot (``with_remaining`` adds a count query)"""
+        metrics = {
+            'table': self.table,
+            'running': self.running,
+            'purged': self.purged,
+            'batches': self.batches,
+            'last_batch_ms': round(self.last_batch_ms, 3),
+            'avg_batch_ms': round(self.elapsed * 1000 / self.batches, 3) if self.batches else 0.0,
+            'docs_per_second': round(self.purged / self.elapsed, 1) if self.elapsed else 0.0,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+        if with_remaining:
+            metrics['remaining'] = self.remaining()
+        return metrics
@@ -1,6 +1,25 @@
+from collections import Counter
+from mongo_common.resilience import DatabaseError
+
 from database import Database
+from denormalization import EMBEDDINGS
 from datetime import datetime, timezone
 
+
+# Per-range reducers for parallel_scan (module level so worker processes can load them)
+def count_roles(users):
+    return Counter(user.get('role', 'unknown') for user in users)
+
+
+def count_tags(projects):
+    projects = list(projects)
+    return Counter(tag for project in projects for tag in project.get('tags', [])), len(projects)
+
+
+def merge_tag_counts(partials):
+    return sum((tags for tags, _ in partials), Counter()), sum(count for _, count in partials)
+
+
 class Seeder:
     def __init__(self, db_instance):
         self.db = db_instance
@@ -116,6 +135,7 @@ class Seeder:
             }
         ]
 
+        self.embed_summaries("teams", teams_data, users)
         teams = self.db.create_items("teams", teams_data, "seeder")
         print(f"Created {len(teams)} teams")
         return teams
@@ -183,41 +203,72 @@ class Seeder:
             }
         ]
 
+        self.embed_summaries("projects", projects_data, teams)
         projects = self.db.create_items("projects", projects_data, "seeder")
         print(f"Created {len(projects)} projects")
         return projects
 
+    def embed_summaries(self, table, items, sources):
+        """Add the embedded summaries (member_details, team_details) mirroring each pid array"""
+        by_pid = {source['pid']: source for source in sources}
+        for embedding in EMBEDDINGS:
+            if embedding.target != table:
+                continue
+            for item in items:
+                item[embedding.array] = [embedding.summary(by_pid[pid]) for pid in item[embedding.ref]]
+
     def get_sample_data(self, table, count=3):
         """Get sample data from a table for testing"""
         return self.db.get_items(table, limit=count, fields=[])
 
-    def print_summary(self):
-        """Print a summary of seeded data"""
+    def print_summary(self, workers=None, approximate=False):
+        """Print a summary of seeded data (users and projects are scanned in parallel with workers)
+
+        ``approximate`` reads counts from collection metadata / the count cache and the
+        role and tag breakdowns from sketches (see mongo_common/sketches.py for the error bounds).
+        """
         print("\n=== SEEDING SUMMARY ===")
 
         # Users summary
-        users_count = len(self.db.get_items("users", fields=None))
-        users_by_role = {}
-        all_users = self.db.get_items("users", fields=["role"])
-        for user in all_users:
-            role = user.get('role', 'unknown')
-            users_by_role[role] = users_by_role.get(role, 0) + 1
+        if approximate:
+            users_count = self.db.count_items("users", approximate=True)
+            users_by_role = dict(self.db.get_sketch("users", "role", workers=workers).top())
+        elif workers:
+            users_by_role = self.db.parallel_scan("users", fields=["role"], reducer=count_roles, workers=workers)
+            users_count = sum(users_by_role.values())
+        else:
+            users_count = len(self.db.get_items("users", fields=None))
+            users_by_role = {}
+            all_users = self.db.get_items("users", fields=["role"])
+            for user in all_users:
+                role = user.get('role', 'unknown')
+                users_by_role[role] = users_by_role.get(role, 0) + 1
 
         print(f"Users: {users_count} total")
         for role, count in users_by_role.items():
             print(f"  - {role}: {count}")
 
         # Teams summary
-        teams_count = len(self.db.get_items("teams", fields=None))
+        if approximate:
+            teams_count = self.db.count_items("teams", approximate=True)
+        else:
+            teams_count = len(self.db.get_items("teams", fields=None))
         print(f"Teams: {teams_count} total")
 
         # Projects summary
-        projects_count = len(self.db.get_items("projects", fields=None))
-        projects_by_tag = {}
-        all_projects = self.db.get_items("projects", fields=["tags"])
-        for project in all_projects:
-            for tag in project.get('tags', []):
-                projects_by_tag[tag] = projects_by_tag.get(tag, 0) + 1
+        if approximate:
+            projects_count = self.db.count_items("projects", approximate=True)
+            projects_by_tag = dict(self.db.get_sketch("projects", "tags", workers=workers).top(5))
+        elif workers:
+            projects_by_tag, projects_count = self.db.parallel_scan(
+                "projects", fields=["tags"], reducer=count_tags, combine=merge_tag_counts, workers=workers)
+        else:
+            projects_count = len(self.db.get_items("projects", fields=None))
+            projects_by_tag = {}
+            all_projects = self.db.get_items("projects", fields=["tags"])
+            for project in all_projects:
+                for tag in project.get('tags', []):
+                    projects_by_tag[tag] = projects_by_tag.get(tag, 0) + 1
 
         print(f"Projects: {projects_count} total")
         print("Popular tags:")
@@ -227,13 +278,16 @@ class Seeder:
 if __name__ == "__main__":
     db = Database()
 
-    if not db.test_connection():
-        print("Failed to connect to database!")
-        exit(1)
+    # Connect in the background instead of blocking on server_info() before any work
+    db.warm_up()
 
     # Create seeder and populate database
     seeder = Seeder(db)
-    result = seeder.seed_all()
+    try:
+        result = seeder.seed_all()
+    except DatabaseError as e:
+        print(f"Failed to seed database: {e}")
+        exit(1)
 
     print("RESULT USERS", seeder.get_sample_data("users", 3))
     print("RESULT TEAMS", seeder.get_sample_data("teams", 3))
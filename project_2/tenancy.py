@@ -0,0 +1,112 @@
+"""Multi-tenant routing for the Database class.
+
+Two strategies are supported, both sharing one MongoClient (and its
+connection pool) across every tenant handle:
+
+- ``"database"``: one database per tenant (``<prefix><tenant_id>``). Strong
+  isolation, cheap tenant drop, and databases can be spread over shards
+  with ``movePrimary``. Best for a moderate number of large tenants.
+- ``"field"``: one shared database where every document carries
+  ``tenant_id``. ``TenantDatabase`` injects it into every ``$match``, filter
+  and insert. Best for thousands of small tenants.
+
+Recommended shard key for the ``"field"`` strategy: ``{tenant_id: 1, pid: 1}``.
+Every query is tenant-scoped, so it targets only the shards owning that
+tenant's range. The random UUID ``pid`` suffix gives the cardinality needed
+to split large tenants into several chunks. Use ``{tenant_id: 1, pid: "hashed"}``
+instead if single tenants are insert-heavy enough to need their writes spread
+across shards.
+"""
+import threading
+
+from database import Database, _and_condition
+from purge import BatchPurger
+
+TABLES = ('users', 'teams', 'projects')
+
+
+class TenantDatabase(Database):
+    """Database handle that confines every operation to one tenant"""
+
+    def __init__(self, tenant_id, tenant_field='tenant_id', **kwargs):
+        super().__init__(**kwargs)
+        self.tenant_id = tenant_id
+        self.tenant_field = tenant_field
+
+    def _scope(self, attributes, include_deleted=False):
+        """Add the tenant key to a filter; a caller-supplied tenant key is AND-ed, not replaced"""
+        scoped = super()._scope(attributes, include_deleted)
+        return _and_condition(scoped, self.tenant_field, self.tenant_id)
+
+    def _generate_metadata(self, created_by=None):
+        """Generate automatic metadata fields, including the tenant key"""
+        metadata = super()._generate_metadata(created_by)
+        metadata[self.tenant_field] = self.tenant_id
+        return metadata
+
+
+class TenantRouter:
+    """Hands out per-tenant Database handles that share a single client"""
+
+    def __init__(self, connection_string=None, client=None, strategy='field', db_name='project_2_db',
+                 db_prefix='tenant_', tenant_field='tenant_id', **database_options):
+        if strategy not in ('field', 'database'):
+            raise ValueError(f"Unknown tenancy strategy: {strategy}")
+        self.strategy = strategy
+        self.db_name = db_name
+        self.db_prefix = db_prefix
+        self.tenant_field = tenant_field
+        self.database_options = database_options
+        self.root = Database(connection_string, client, db_name=db_name, **database_options)
+        self._handles = {}
+        self._lock = threading.Lock()
+
+    def for_tenant(self, tenant_id):
+        """Database handle for ``tenant_id`` (created once, then cached)"""
+        handle = self._handles.get(tenant_id)
+        if handle is not None:
+            return handle
+        with self._lock:
+            handle = self._handles.get(tenant_id)
+            if handle is None:
+                handle = self._create_handle(tenant_id)
+                self._handles[tenant_id] = handle
+            return handle
+
+    def _create_handle(self, tenant_id):
+        # Every handle shares the router's client (connection pool), executor and circuit breaker
+        options = dict(self.database_options, client=self.root.client, executor=self.root.executor)
+        if self.strategy == 'database':
+            return Database(db_name=f"{self.db_prefix}{tenant_id}", **options)
+        return TenantDatabase(tenant_id, self.tenant_field, db_name=self.db_name, **options)
+
+    def ensure_indexes(self, tables=TABLES):
+        """Create the tenant-prefixed indexes backing scoped queries and the shard key"""
+        if self.strategy != 'field':
+            return
+        for table in tables:
+            collection = self.root._get_collection(table)
+            collection.create_index([(self.tenant_field, 1), ('pid', 1)], unique=True)
+            collection.create_index([(self.tenant_field, 1), ('updated_at', 1), ('pid', 1)])
+
+    def shard_collections(self, tables=TABLES):
+        """Enable sharding with the recommended key (field strategy, run against mongos)"""
+        if self.strategy != 'field':
+            raise ValueError("Sharding by tenant key only applies to the 'field' strategy")
+        self.ensure_indexes(tables)
+        admin = self.root.client.admin
+        admin.command('enableSharding', self.db_name)
+        key = {self.tenant_field: 1, 'pid': 1}
+        for table in tables:
+            admin.command('shardCollection', f"{self.db_name}.{table}", key=key)
+
+    def drop_tenant(self, tenant_id, tables=TABLES, batch_size=1000, throttle=0.05):
+        """Remove every document of a tenant; the field strategy deletes in throttled batches"""
+        if self.strategy == 'database':
+            self.root.client.drop_database(f"{self.db_prefix}{tenant_id}")
+        else:
+            for table in tables:
+                purger = BatchPurger(self.root, table, {self.tenant_field: tenant_id},
+                                     batch_size=batch_size, throttle=throttle)
+                purger.run()
+        self._handles.pop(tenant_id, None)
@@ -0,0 +1,103 @@
+import pytest
+
+from database import Database
+from mongo_common.resilience import DatabaseError
+
+
+@pytest.fixture
+def soft(memory_uri):
+    return Database(memory_uri, soft_delete=True)
+
+
+def test_create_generates_metadata(db):
+    user = db.create_item('users', {'name': 'Ada', 'email': 'ada@example.com', 'role': 'dev'}, created_by='admin')
+    assert user['pid'] and user['created_at'] and user['updated_at']
+    assert db.get_item_by_pid('users', user['pid'])['created_by'] == 'admin'
+
+
+def test_update_and_array_functions(db, users):
+    pid = users[0]['pid']
+    db.update_item_by_pid('users', pid, {'role': 'manager', 'skills': []}, updated_by='admin')
+    db.array_push_item_by_pid('users', pid, 'skills', 'mongo')
+    db.array_push_item_by_pid('users', pid, 'skills', 'python')
+    db.array_pull_item_by_pid('users', pid, 'skills', 'mongo')
+    user = db.get_item_by_pid('users', pid)
+    assert (user['role'], user['updated_by'], user['skills']) == ('manager', 'admin', ['python'])
+
+
+def test_get_items_pagination_and_stats(db, users):
+    result = db.get_items('users', {'role': 'dev'}, fields=['name'], sort={'name': -1}, limit=1, return_stats=True)
+    assert [item['name'] for item in result['items']] == ['user2']
+    assert result['stats']['itemsCount'] == 2
+
+
+def test_hard_delete(db, users):
+    assert db.delete_item_by_pid('users', users[0]['pid'])
+    assert db.get_item_by_pid('users', users[0]['pid']) is None
+    assert db.count_items('users') == 2
+
+
+def test_changes_since_fields(db, users):
+    page = db.changes_since('users', fields=[])
+    assert {item['email'] for item in page['items']} == {user['email'] for user in users}
+
+    # A selection still returns the watermark fields
+    item = db.changes_since('users', fields=['name'])['items'][0]
+    assert 'email' not in item and 'updated_at' in item
+
+
+def test_failed_connection_test_is_logged(db, monkeypatch, caplog):
+    def ping():
+        raise DatabaseError('unreachable')
+    monkeypatch.setattr(db, 'ping', ping)
+    assert db.test_connection() is False
+    assert 'Connection failed: unreachable' in caplog.text
+
+
+# ----- soft delete -----
+
+def test_soft_delete_hides_items_from_reads(soft, users):
+    pid = users[0]['pid']
+    assert soft.delete_item_by_pid('users', pid)
+    assert soft.get_item_by_pid('users', pid) is None
+    assert soft.count_items('users') == 2
+    assert pid not in [item['pid'] for item in soft.get_items('users', {})]
+    # Still stored, with its deletion date
+    assert soft.db['users'].find_one({'pid': pid})['deleted_at'] is not None
+
+
+def test_soft_delete_keeps_a_caller_deleted_at_condition(soft, users):
+    soft.delete_item_by_pid('users', users[0]['pid'])
+    assert soft.get_items('users', {'deleted_at': {'$ne': None}}) == []
+
+
+def test_restore_undoes_a_soft_delete(soft, users):
+    soft.delete_items_by_attr('users', {'role': 'dev'})
+    assert soft.restore_items_by_attr('users', {'role': 'dev'}) == 2
+    assert soft.count_items('users') == 3
+    assert soft.db['users'].count_documents({'deleted_at': {'$exists': True}}) == 0
+
+
+def test_export_skips_soft_deleted_items(soft, users):
+    soft.delete_item_by_pid('users', users[0]['pid'])
+    columns = soft.export_items('users', format='numpy')
+    assert sorted(columns['pid']) == sorted(user['pid'] for user in users[1:])
+
+
+# ----- approximate counts -----
+
+def test_approximate_count_is_cached_until_a_create(db, users):
+    assert db.count_items('users', {'role': 'dev'}, approximate=True) == 2
+    db.db['users'].insert_one({'pid': 'raw', 'role': 'dev'})  # Bypasses the cache invalidation
+    assert db.count_items('users', {'role': 'dev'}, approximate=True) == 2
+    assert db.count_items('users', {'role': 'dev'}) == 3
+    db.create_item('users', {'name': 'new', 'email': 'new@example.com', 'role': 'dev'})
+    assert db.count_items('users', {'role': 'dev'}, approximate=True) == 4
+
+
+def test_approximate_count_key_keeps_key_order(db, users):
+    db.count_items('users', {'role': 'dev', 'name': 'user1'}, approximate=True)
+    db.count_items('users', {'role': 'dev', 'name': 'user1'}, approximate=True)
+    assert len(db.count_cache) == 1
+    db.count_items('users', {'name': 'user1', 'role': 'dev'}, approximate=True)
+    assert len(db.count_cache) == 2
@@ -0,0 +1,80 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from database import Database
+
+
+@pytest.fixture
+def coalescing(memory_uri):
+    return Database(memory_uri, coalesce_window_ms=20)
+
+
+def test_concurrent_lookups_share_one_query(coalescing, users):
+    pids = [user['pid'] for user in users] * 2 + ['missing']
+    barrier = threading.Barrier(len(pids))
+
+    def load(pid):
+        barrier.wait()
+        return coalescing.get_item_by_pid('users', pid)
+
+    with ThreadPoolExecutor(len(pids)) as pool:
+        results = list(pool.map(load, pids))
+
+    assert [item['pid'] if item else None for item in results] == pids[:-1] + [None]
+    stats = coalescing.loader.stats()
+    assert stats['requests'] == len(pids)
+    assert stats['batches'] < len(pids)
+    assert stats['fetched'] + stats['deduplicated'] == len(pids)
+
+
+def test_lookups_with_fields_are_not_batched(coalescing, users):
+    item = coalescing.get_item_by_pid('users', users[0]['pid'], fields=['name'])
+    assert set(item) == {'pid', 'name'}
+    assert coalescing.loader.stats()['requests'] == 0
+
+
+def test_a_lookup_after_a_write_sees_it(coalescing, users):
+    pid = users[0]['pid']
+    coalescing.update_item_by_pid('users', pid, {'role': 'lead'})
+    assert coalescing.get_item_by_pid('users', pid)['role'] == 'lead'
+
+
+def test_lookups_during_an_in_flight_batch_go_to_the_next_one(coalescing, users):
+    loader = coalescing.loader
+    fetch = loader._fetch
+    in_flight, release = threading.Event(), threading.Event()
+
+    def slow_fetch(table, pids):
+        in_flight.set()
+        release.wait(1)
+        return fetch(table, pids)
+    loader._fetch = slow_fetch
+
+    pid = users[0]['pid']
+    with ThreadPoolExecutor(2) as pool:
+        first = pool.submit(loader.load, 'users', pid)
+        assert in_flight.wait(1)
+        second = pool.submit(loader.load, 'users', pid)
+        release.set()
+        assert first.result()['pid'] == second.result()['pid'] == pid
+    assert loader.stats()['batches'] == 2
+
+
+def test_async_lookups_are_batched(coalescing, users):
+    async def load_all():
+        return await asyncio.gather(*(coalescing.aget_item_by_pid('users', user['pid']) for user in users))
+
+    results = asyncio.run(load_all())
+    assert [item['pid'] for item in results] == [user['pid'] for user in users]
+    assert coalescing.loader.stats()['batches'] == 1
+
+
+def test_errors_reach_every_caller_of_the_batch(coalescing, users):
+    def broken(table, pids):
+        raise RuntimeError('boom')
+    coalescing.loader._fetch = broken
+    with pytest.raises(RuntimeError):
+        coalescing.get_item_by_pid('users', users[0]['pid'])
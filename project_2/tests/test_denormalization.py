@@ -0,0 +1,105 @@
+
+from database import Database
+from denormalization import EMBEDDINGS
+from mongo_common.resilience import QueryError, ServiceUnavailableError
+
+
+def make_team(db):
+    user = db.create_item('users', {'name': 'ada', 'email': 'ada@example.com', 'role': 'dev'})
+    team = db.create_item('teams', {'name': 'core', 'members': [user['pid']],
+                                    'member_details': [{'pid': user['pid'], 'name': 'ada', 'role': 'dev'}]})
+    return user, team
+
+
+def details(db, team):
+    return db.get_item_by_pid('teams', team['pid'])['member_details']
+
+
+def test_updates_rewrite_the_copies(memory_uri):
+    db = Database(memory_uri, denormalize='sync')
+    user, team = make_team(db)
+    db.update_item_by_pid('users', user['pid'], {'name': 'Ada'})
+    assert details(db, team) == [{'pid': user['pid'], 'name': 'Ada', 'role': 'dev'}]
+
+
+def test_soft_delete_and_restore(memory_uri):
+    db = Database(memory_uri, denormalize='sync', soft_delete=True, history=True)
+    user, team = make_team(db)
+    db.delete_item_by_pid('users', user['pid'])
+    assert details(db, team) == []
+
+    db.restore_items_by_attr('users', {'pid': user['pid']})
+    assert details(db, team) == [{'pid': user['pid'], 'name': 'ada', 'role': 'dev'}]
+    # The restore goes through the history like any other write
+    assert 'deleted_at' in db.get_history('users', user['pid'], field='deleted_at')[-1]['prev']
+
+
+def test_rebuild_repairs_the_copies(memory_uri):
+    db = Database(memory_uri, denormalize='sync')
+    user, team = make_team(db)
+    db.db['teams'].update_one({'pid': team['pid']}, {'$set': {'member_details': []}})
+    assert db.denormalizer.rebuild(EMBEDDINGS[0]) == 1
+    assert details(db, team) == [{'pid': user['pid'], 'name': 'ada', 'role': 'dev'}]
+
+
+def flaky_apply(denormalizer, error, failures):
+    apply = denormalizer.apply
+    calls = []
+
+    def flaky(requests):
+        calls.append(requests)
+        if len(calls) <= failures:
+            raise error
+        return apply(requests)
+    denormalizer.apply = flaky
+    return calls
+
+
+def test_background_batches_are_retried_on_connection_errors(memory_uri):
+    db = Database(memory_uri, denormalize='background')
+    db.denormalizer.retry_interval = 0.01
+    user, team = make_team(db)
+    calls = flaky_apply(db.denormalizer, ServiceUnavailableError('down'), failures=2)
+
+    db.update_item_by_pid('users', user['pid'], {'name': 'Ada'})
+    db.denormalizer.flush()
+    assert len(calls) == 3
+    assert details(db, team)[0]['name'] == 'Ada'
+    metrics = db.denormalizer.metrics()
+    assert (metrics['failed'], metrics['pending']) == (2, 0)
+    assert 'down' in metrics['last_error']
+
+
+def test_retried_batches_are_not_overtaken_by_newer_updates(memory_uri):
+    db = Database(memory_uri, denormalize='background')
+    db.denormalizer.retry_interval = 0.01
+    user, team = make_team(db)
+    apply = db.denormalizer.apply
+    calls = []
+
+    def failing_once(requests):
+        calls.append(requests)
+        if len(calls) == 1:
+            # A newer rename is queued while the first one is failing
+            db.update_item_by_pid('users', user['pid'], {'name': 'Grace'})
+            raise ServiceUnavailableError('down')
+        return apply(requests)
+    db.denormalizer.apply = failing_once
+
+    db.update_item_by_pid('users', user['pid'], {'name': 'Ada'})
+    db.denormalizer.flush()
+    assert details(db, team)[0]['name'] == 'Grace'
+    db.denormalizer.stop()
+
+
+def test_background_batches_failing_otherwise_are_dropped(memory_uri, caplog):
+    db = Database(memory_uri, denormalize='background')
+    user, team = make_team(db)
+    calls = flaky_apply(db.denormalizer, QueryError('rejected'), failures=1)
+
+    db.update_item_by_pid('users', user['pid'], {'name': 'Ada'})
+    db.denormalizer.flush()
+    assert len(calls) == 1
+    assert details(db, team)[0]['name'] == 'ada'
+    assert db.denormalizer.metrics()['failed'] == 1
+    assert 'dropped' in caplog.text
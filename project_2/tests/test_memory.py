@@ -0,0 +1,145 @@
+import pytest
+from pymongo import UpdateMany, UpdateOne
+
+from mongo_common.memory import MemoryClient
+
+
+@pytest.fixture
+def movies(memory_uri):
+    collection = MemoryClient.from_uri(memory_uri)['test']['movies']
+    collection.insert_many([
+        {'_id': 1, 'title': 'Alien', 'year': 1979, 'genres': ['Horror', 'Sci-Fi'], 'imdb': {'rating': 8.5}},
+        {'_id': 2, 'title': 'Aliens', 'year': 1986, 'genres': ['Action', 'Sci-Fi'], 'imdb': {'rating': 8.4}},
+        {'_id': 3, 'title': 'Heat', 'year': 1995, 'genres': ['Crime'], 'imdb': {'rating': ''}},
+        {'_id': 4, 'title': 'Up', 'year': 2009, 'genres': []},
+    ])
+    return collection
+
+
+def ids(documents):
+    return sorted(document['_id'] for document in documents)
+
+
+@pytest.mark.parametrize('query, expected', [
+    ({'year': {'$gt': 1986}}, [3, 4]),
+    ({'year': {'$gte': 1986, '$lt': 2000}}, [2, 3]),
+    ({'genres': 'Sci-Fi'}, [1, 2]),
+    ({'genres': {'$in': ['Crime', 'Action']}}, [2, 3]),
+    ({'genres': {'$nin': ['Sci-Fi']}}, [3, 4]),
+    ({'genres': {'$all': ['Horror', 'Sci-Fi']}}, [1]),
+    ({'genres': {'$size': 0}}, [4]),
+    ({'imdb.rating': {'$exists': True, '$ne': None}}, [1, 2, 3]),
+    ({'imdb.rating': None}, [4]),
+    ({'title': {'$regex': '^alien', '$options': 'i'}}, [1, 2]),
+    ({'year': {'$not': {'$lt': 2000}}}, [4]),
+    ({'$or': [{'year': 1979}, {'title': 'Up'}]}, [1, 4]),
+    ({'$and': [{'genres': 'Sci-Fi'}, {'year': {'$gt': 1980}}]}, [2]),
+    ({'$nor': [{'genres': 'Sci-Fi'}]}, [3, 4]),
+    ({'$expr': {'$gt': ['$year', 2000]}}, [4]),
+])
+def test_query_operators(movies, query, expected):
+    assert ids(movies.find(query)) == expected
+
+
+def test_find_sort_skip_limit_and_projection(movies):
+    cursor = movies.find({}, {'_id': 0, 'title': 1}).sort('year', -1).skip(1).limit(2)
+    assert list(cursor) == [{'title': 'Heat'}, {'title': 'Aliens'}]
+
+
+def test_indexed_lookups_match_a_full_scan(movies):
+    expected = ids(movies.find({'year': {'$gte': 1986}}))
+    movies.create_index('year')
+    movies.create_index('genres')
+    assert ids(movies.find({'year': {'$gte': 1986}})) == expected
+    assert ids(movies.find({'genres': {'$in': ['Sci-Fi']}})) == [1, 2]
+
+
+def test_unique_index_rejects_duplicates(movies):
+    movies.create_index('title', unique=True)
+    with pytest.raises(ValueError, match='E11000'):
+        movies.insert_one({'title': 'Heat'})
+    assert movies.count_documents({'title': 'Heat'}) == 1
+
+
+def test_update_operators(movies):
+    movies.update_one({'_id': 1}, {'$set': {'imdb.votes': 10}, '$inc': {'year': 1},
+                                   '$push': {'genres': {'$each': ['Thriller']}}})
+    movies.update_one({'_id': 1}, {'$addToSet': {'genres': 'Horror'}, '$pull': {'genres': 'Sci-Fi'},
+                                   '$unset': {'title': ''}})
+    assert movies.find_one({'_id': 1}) == {
+        '_id': 1, 'year': 1980, 'genres': ['Horror', 'Thriller'], 'imdb': {'rating': 8.5, 'votes': 10}}
+
+
+def test_array_filters(memory_uri):
+    teams = MemoryClient.from_uri(memory_uri)['test']['teams']
+    teams.insert_one({'_id': 1, 'details': [{'pid': 'a', 'name': 'A'}, {'pid': 'b', 'name': 'B'}]})
+    teams.update_many({'details.pid': 'b'}, {'$set': {'details.$[item].name': 'Bee'}},
+                      array_filters=[{'item.pid': 'b'}])
+    assert teams.find_one({'_id': 1})['details'] == [{'pid': 'a', 'name': 'A'}, {'pid': 'b', 'name': 'Bee'}]
+
+
+def test_bulk_write(movies):
+    result = movies.bulk_write([
+        UpdateOne({'_id': 1}, {'$set': {'seen': True}}),
+        UpdateMany({'genres': 'Sci-Fi'}, {'$set': {'space': True}}),
+    ], ordered=False)
+    assert result.modified_count == 3
+    assert ids(movies.find({'space': True})) == [1, 2]
+
+
+def test_group_unwind_and_average_skip_non_numeric(movies):
+    result = movies.aggregate([
+        {'$match': {'imdb.rating': {'$exists': True, '$ne': None}}},
+        {'$unwind': '$genres'},
+        {'$group': {'_id': '$genres', 'average': {'$avg': '$imdb.rating'}, 'count': {'$sum': 1}}},
+        {'$sort': {'_id': 1}},
+    ])
+    assert list(result) == [
+        {'_id': 'Action', 'average': 8.4, 'count': 1},
+        {'_id': 'Crime', 'average': None, 'count': 1},
+        {'_id': 'Horror', 'average': 8.5, 'count': 1},
+        {'_id': 'Sci-Fi', 'average': pytest.approx(8.45), 'count': 2},
+    ]
+
+
+def test_lookup_and_count(movies):
+    comments = movies.database['comments']
+    comments.insert_many([{'movie_id': 1}, {'movie_id': 1}, {'movie_id': 3}])
+    result = list(comments.aggregate([
+        {'$group': {'_id': '$movie_id', 'comments': {'$sum': 1}}},
+        {'$lookup': {'from': 'movies', 'localField': '_id', 'foreignField': '_id', 'as': 'movie'}},
+        {'$unwind': '$movie'},
+        {'$project': {'_id': 0, 'title': '$movie.title', 'comments': 1}},
+        {'$sort': {'comments': -1}},
+    ]))
+    assert result == [{'comments': 2, 'title': 'Alien'}, {'comments': 1, 'title': 'Heat'}]
+    assert list(movies.aggregate([{'$match': {'genres': 'Sci-Fi'}}, {'$count': 'total'}])) == [{'total': 2}]
+
+
+def test_merge_and_out_write_on_consumption(movies):
+    list(movies.aggregate([{'$match': {'_id': 1}}, {'$set': {'watched': True}},
+                           {'$merge': {'into': 'movies', 'on': '_id', 'whenMatched': 'merge'}}]))
+    list(movies.aggregate([{'$match': {'genres': 'Sci-Fi'}}, {'$out': 'scifi'}]))
+    assert movies.find_one({'_id': 1})['watched'] is True
+    assert ids(movies.database['scifi'].find()) == [1, 2]
+
+
+def test_clients_on_the_same_uri_share_data(memory_uri, movies):
+    assert MemoryClient.from_uri(memory_uri)['test']['movies'].count_documents({}) == 4
+
+
+def test_aborted_transactions_restore_the_collections(memory_uri, movies):
+    movies.create_index('year')
+    client = MemoryClient.from_uri(memory_uri)
+
+    def callback(session):
+        movies.update_one({'_id': 1}, {'$set': {'year': 2020}}, session=session)
+        movies.insert_one({'_id': 5, 'title': 'Dune', 'year': 2021}, session=session)
+        client['test']['logs'].insert_one({'event': 'x'}, session=session)
+        raise RuntimeError
+
+    with client.start_session() as session, pytest.raises(RuntimeError):
+        session.with_transaction(callback)
+    assert ids(movies.find({'year': {'$gte': 2000}})) == [4]
+    assert movies.find_one({'_id': 1})['year'] == 1979
+    assert 'logs' not in client['test'].list_collection_names()
@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from database import Database
+from purge import BatchPurger
+from tenancy import TenantRouter
+
+
+@pytest.fixture
+def soft(memory_uri):
+    return Database(memory_uri, soft_delete=True)
+
+
+def create_users(db, count):
+    return db.create_items('users', [
+        {'name': f'user{i}', 'email': f'user{i}@example.com', 'role': 'dev'} for i in range(count)])
+
+
+def test_purges_soft_deleted_items_in_batches(soft):
+    users = create_users(soft, 5)
+    soft.delete_items_by_pids('users', [user['pid'] for user in users[:3]])
+    purger = BatchPurger(soft, 'users', batch_size=2, throttle=0)
+    assert purger.remaining() == 3
+    assert purger.run() == 3
+    assert purger.metrics()['batches'] == 2
+    assert purger.remaining() == 0
+    assert soft.db['users'].count_documents({}) == 2
+
+
+def test_older_than_keeps_recent_deletions(soft):
+    users = create_users(soft, 2)
+    soft.delete_items_by_pids('users', [user['pid'] for user in users])
+    old = datetime.now(timezone.utc) - timedelta(hours=2)
+    soft.db['users'].update_one({'pid': users[0]['pid']}, {'$set': {'deleted_at': old}})
+    assert BatchPurger(soft, 'users', older_than=3600, throttle=0).run() == 1
+    assert soft.db['users'].count_documents({'pid': users[1]['pid']}) == 1
+
+
+def test_tenant_handles_only_purge_their_tenant(memory_uri):
+    router = TenantRouter(memory_uri, strategy='field', soft_delete=True)
+    for tenant in ('a', 'b'):
+        db = router.for_tenant(tenant)
+        db.delete_item_by_pid('users', create_users(db, 1)[0]['pid'])
+
+    purger = BatchPurger(router.for_tenant('a'), 'users', throttle=0)
+    assert purger.remaining() == 1
+    assert purger.run() == 1
+    assert router.root.db['users'].count_documents({'tenant_id': 'b'}) == 1
+    assert router.root.db['users'].count_documents({'tenant_id': 'a'}) == 0
@@ -0,0 +1,136 @@
+import time
+
+import pytest
+from pymongo import errors
+
+from mongo_common.resilience import (CircuitBreaker, CircuitOpenError, DocumentValidationError, Executor,
+                                     QueryError, QueryTimeoutError, RetryPolicy, ServiceUnavailableError,
+                                     classify)
+
+
+def failing(exc):
+    def fn():
+        raise exc
+    return fn
+
+
+@pytest.fixture
+def executor():
+    return Executor(CircuitBreaker(failure_threshold=2, reset_timeout=0.05), RetryPolicy(max_attempts=1))
+
+
+def open_breaker(executor):
+    for _ in range(executor.breaker.failure_threshold):
+        with pytest.raises(ServiceUnavailableError):
+            executor.call('op', failing(errors.AutoReconnect('down')))
+    assert executor.breaker.state == CircuitBreaker.OPEN
+
+
+@pytest.mark.parametrize('exc, expected', [
+    (errors.ExecutionTimeout('slow'), (QueryTimeoutError, False)),
+    (errors.NetworkTimeout('slow'), (QueryTimeoutError, True)),
+    (errors.AutoReconnect('down'), (ServiceUnavailableError, True)),
+    (errors.OperationFailure('bad', code=2), (QueryError, False)),
+    (errors.OperationFailure('invalid', code=121), (DocumentValidationError, False)),
+    (errors.OperationFailure('stepdown', code=11602), (ServiceUnavailableError, True)),
+])
+def test_classify(exc, expected):
+    assert classify(exc) == expected
+
+
+def test_breaker_opens_after_consecutive_failures(executor):
+    open_breaker(executor)
+    with pytest.raises(CircuitOpenError):
+        executor.call('op', lambda: 'not called')
+
+
+def test_a_success_resets_the_failure_count(executor):
+    with pytest.raises(ServiceUnavailableError):
+        executor.call('op', failing(errors.AutoReconnect('down')))
+    executor.call('op', lambda: None)
+    with pytest.raises(ServiceUnavailableError):
+        executor.call('op', failing(errors.AutoReconnect('down')))
+    assert executor.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_lets_one_probe_through(executor):
+    open_breaker(executor)
+    time.sleep(executor.breaker.reset_timeout)
+    executor.breaker.before_call()
+    assert executor.breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        executor.call('op', lambda: 'second probe')
+
+
+def test_successful_probe_closes_the_breaker(executor):
+    open_breaker(executor)
+    time.sleep(executor.breaker.reset_timeout)
+    assert executor.call('op', lambda: 'ok') == 'ok'
+    assert executor.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_probe_reopens_the_breaker(executor):
+    open_breaker(executor)
+    time.sleep(executor.breaker.reset_timeout)
+    with pytest.raises(ServiceUnavailableError):
+        executor.call('op', failing(errors.AutoReconnect('still down')))
+    assert executor.breaker.state == CircuitBreaker.OPEN
+
+
+def test_probe_rejected_by_the_server_releases_the_breaker(executor):
+    open_breaker(executor)
+    time.sleep(executor.breaker.reset_timeout)
+    with pytest.raises(QueryError):
+        executor.call('op', failing(errors.OperationFailure('bad', code=2)))
+    assert executor.breaker.state == CircuitBreaker.CLOSED
+    assert executor.call('op', lambda: 'ok') == 'ok'
+
+
+@pytest.mark.parametrize('exc', [
+    errors.ExecutionTimeout('maxTimeMS exceeded'),
+    errors.OperationFailure('invalid', code=121),
+])
+def test_server_replies_do_not_trip_the_breaker(executor, exc):
+    for _ in range(executor.breaker.failure_threshold + 1):
+        with pytest.raises((QueryTimeoutError, QueryError)):
+            executor.call('op', failing(exc))
+    assert executor.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_socket_timeouts_trip_the_breaker(executor):
+    for _ in range(executor.breaker.failure_threshold):
+        with pytest.raises(QueryTimeoutError):
+            executor.call('op', failing(errors.NetworkTimeout('slow')))
+    assert executor.breaker.state == CircuitBreaker.OPEN
+
+
+def test_retryable_reads_are_retried():
+    executor = Executor(CircuitBreaker(failure_threshold=10), RetryPolicy(max_attempts=3, base_delay=0))
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise errors.AutoReconnect('blip')
+        return 'ok'
+    assert executor.call('op', flaky) == 'ok'
+    assert len(attempts) == 3
+
+
+def test_writes_are_not_retried():
+    executor = Executor(CircuitBreaker(failure_threshold=10), RetryPolicy(max_attempts=3, base_delay=0))
+    attempts = []
+
+    def write():
+        attempts.append(1)
+        raise errors.AutoReconnect('blip')
+    with pytest.raises(ServiceUnavailableError):
+        executor.call('op', write, retry=False)
+    assert len(attempts) == 1
+
+
+def test_timeout_override_is_scoped_to_the_block():
+    executor = Executor(max_time_ms=1000)
+    with executor.timeout(50):
+        assert executor.max_time_ms == 50
+    assert executor.max_time_ms == 1000
@@ -0,0 +1,90 @@
+from datetime import datetime
+
+from mongo_common.sketches import CountCache, CountMinSketch, FieldSketch, HyperLogLog, canonical_key
+
+
+def test_canonical_key_keeps_key_order():
+    at = datetime(2024, 1, 1)
+    assert canonical_key([{'$match': {'a': 1, 'b': {'$gte': at}}}]) == \
+        canonical_key([{'$match': {'a': 1, 'b': {'$gte': at}}}])
+    # {'a': 1, 'b': 2} and {'b': 2, 'a': 1} are different embedded documents
+    assert canonical_key({'doc': {'a': 1, 'b': 2}}) != canonical_key({'doc': {'b': 2, 'a': 1}})
+    assert canonical_key({'a': 1}) != canonical_key({'a': '1'})
+
+
+def test_count_cache_reuses_counts_until_they_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('mongo_common.sketches.time.monotonic', lambda: now[0])
+    cache = CountCache(ttl=10)
+    assert cache.get(('users', 'all'), lambda: 1) == 1
+    assert cache.get(('users', 'all'), lambda: 2) == 1
+    now[0] += 10
+    assert cache.get(('users', 'all'), lambda: 3) == 3
+
+
+def test_count_cache_is_bounded():
+    cache = CountCache(ttl=60, max_entries=3)
+    for i in range(10):
+        cache.get(('users', i), lambda: i)
+    assert len(cache) == 3
+    # Reading an entry makes it the most recently used
+    cache.get(('users', 7), lambda: None)
+    cache.get(('users', 10), lambda: 10)
+    assert cache.get(('users', 7), lambda: 'evicted') == 7
+    assert cache.get(('users', 8), lambda: 'evicted') == 'evicted'
+
+
+def test_count_cache_purges_expired_entries_first(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr('mongo_common.sketches.time.monotonic', lambda: now[0])
+    cache = CountCache(ttl=5, max_entries=2)
+    cache.get(('users', 'old'), lambda: 1)
+    now[0] = 3
+    cache.get(('users', 'recent'), lambda: 2)
+    now[0] = 6
+    cache.get(('users', 'new'), lambda: 3)
+    assert cache.get(('users', 'recent'), lambda: 'evicted') == 2
+
+
+def test_count_cache_purges_expired_entries_on_insert(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr('mongo_common.sketches.time.monotonic', lambda: now[0])
+    cache = CountCache(ttl=5, max_entries=10)
+    cache.get(('users', 'old'), lambda: 1)
+    now[0] = 6
+    cache.get(('users', 'new'), lambda: 2)
+    assert len(cache) == 1
+
+
+def test_count_cache_invalidates_one_table():
+    cache = CountCache()
+    cache.get(('users', 'all'), lambda: 1)
+    cache.get(('teams', 'all'), lambda: 1)
+    cache.invalidate('users')
+    assert cache.get(('users', 'all'), lambda: 2) == 2
+    assert cache.get(('teams', 'all'), lambda: 2) == 1
+
+
+def test_hyperloglog_is_within_its_error_bound():
+    hll = HyperLogLog(p=12)
+    for i in range(20000):
+        hll.add(f'value-{i}')
+    assert abs(hll.estimate() - 20000) / 20000 < 3 * hll.relative_error
+
+
+def test_count_min_never_underestimates():
+    cms = CountMinSketch(width=64, depth=4)
+    for i in range(1000):
+        cms.add(i % 50)
+    assert all(cms.estimate(value) >= 20 for value in range(50))
+
+
+def test_field_sketches_merge():
+    left, right = FieldSketch('tags'), FieldSketch('tags')
+    for document in ({'tags': ['a', 'b']}, {'tags': ['a']}):
+        left.add_document(document)
+    right.add_document({'tags': ['a', 'c']})
+    merged = left + right
+    assert merged.top(1) == [('a', 3)]
+    assert merged.distinct() == 3
+    assert merged.documents == 3
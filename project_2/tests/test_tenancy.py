@@ -0,0 +1,76 @@
+import pytest
+
+from denormalization import EMBEDDINGS
+from tenancy import TenantRouter
+
+
+@pytest.fixture
+def router(memory_uri):
+    return TenantRouter(memory_uri, strategy='field', denormalize='sync')
+
+
+@pytest.fixture
+def tenants(router):
+    """Tenants a and b, each with one user in one team"""
+    handles = {}
+    for tenant in ('a', 'b'):
+        db = router.for_tenant(tenant)
+        user = db.create_item('users', {'name': f'{tenant}-user', 'email': f'{tenant}@example.com', 'role': 'dev'})
+        db.create_item('teams', {'name': f'{tenant}-team', 'members': [user['pid']],
+                                 'member_details': [{'pid': user['pid'], 'name': user['name'], 'role': 'dev'}]})
+        handles[tenant] = db
+    return handles
+
+
+def test_handles_are_cached_per_tenant(router):
+    assert router.for_tenant('a') is router.for_tenant('a')
+    assert router.for_tenant('a') is not router.for_tenant('b')
+
+
+def test_inserts_carry_the_tenant_key(router, tenants):
+    assert sorted(item['tenant_id'] for item in router.root.get_items('users', {}, fields=[])) == ['a', 'b']
+
+
+def test_reads_only_see_the_tenant(tenants):
+    a, b = tenants['a'], tenants['b']
+    assert [item['name'] for item in a.get_items('users', {}, fields=['name'])] == ['a-user']
+    b_user = b.get_item_by_attr('users', {})
+    assert a.get_item_by_pid('users', b_user['pid']) is None
+    assert a.count_items('users') == 1
+
+
+def test_a_caller_tenant_key_cannot_escape_the_scope(tenants):
+    assert tenants['a'].get_items('users', {'tenant_id': 'b'}) == []
+
+
+def test_writes_only_touch_the_tenant(tenants):
+    a, b = tenants['a'], tenants['b']
+    assert a.update_items_by_attr('users', {}, {'role': 'lead'}) is not None
+    assert a.delete_items_by_attr('teams', {}) == 1
+    assert b.get_item_by_attr('users', {})['role'] == 'dev'
+    assert b.count_items('teams') == 1
+
+
+def test_export_is_scoped(tenants):
+    columns = tenants['a'].export_items('users', format='numpy')
+    assert list(columns['name']) == ['a-user']
+
+
+def test_rebuild_is_scoped(tenants):
+    b = tenants['b']
+    b.denormalizer.rebuild(EMBEDDINGS[0])
+    a_team = tenants['a'].get_item_by_attr('teams', {})
+    assert [detail['name'] for detail in a_team['member_details']] == ['a-user']
+
+
+def test_database_strategy_uses_one_database_per_tenant(memory_uri):
+    router = TenantRouter(memory_uri, strategy='database')
+    router.for_tenant('a').create_item('users', {'name': 'x', 'email': 'x@example.com', 'role': 'dev'})
+    assert router.for_tenant('a').db.name == 'tenant_a'
+    assert router.for_tenant('b').count_items('users') == 0
+
+
+def test_drop_tenant(router, tenants):
+    router.drop_tenant('a', throttle=0)
+    assert router.root.count_items('users', {'tenant_id': 'a'}) == 0
+    assert router.root.count_items('users', {'tenant_id': 'b'}) == 1
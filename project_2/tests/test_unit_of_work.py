@@ -0,0 +1,86 @@
+import pytest
+
+from database import Database
+from mongo_common.resilience import QueryError
+
+
+@pytest.fixture
+def tracked(memory_uri):
+    return Database(memory_uri, history=True, denormalize='sync')
+
+
+@pytest.fixture
+def team(tracked):
+    users = tracked.create_items('users', [
+        {'name': name, 'email': f'{name}@example.com', 'role': 'dev'} for name in ('ada', 'bob')])
+    team = tracked.create_item('teams', {'name': 'core', 'members': [users[0]['pid']],
+                                         'member_details': [{'pid': users[0]['pid'], 'name': 'ada', 'role': 'dev'}]})
+    return team, users
+
+
+def test_commit_applies_every_table(tracked, team):
+    team, (ada, bob) = team
+    with tracked.unit_of_work(updated_by='admin') as uow:
+        uow.update('users', ada['pid'], {'role': 'lead'})
+        uow.push('teams', team['pid'], 'members', bob['pid'], unique=True)
+        project_pid = uow.insert('projects', {'name': 'apollo', 'teams': [team['pid']]})
+
+    stored = tracked.get_item_by_pid('teams', team['pid'])
+    assert stored['members'] == [ada['pid'], bob['pid']]
+    assert stored['member_details'] == [{'pid': ada['pid'], 'name': 'ada', 'role': 'lead'},
+                                        {'pid': bob['pid'], 'name': 'bob', 'role': 'dev'}]
+    assert tracked.get_item_by_pid('projects', project_pid)['created_by'] == 'admin'
+
+
+def test_history_records_the_committed_changes(tracked, team):
+    team, (ada, bob) = team
+    with tracked.unit_of_work(updated_by='admin') as uow:
+        uow.update('users', ada['pid'], {'role': 'lead'})
+
+    changes = tracked.get_history('users', ada['pid'], field='role')
+    assert [(change['by'], change['set']['role'], change['prev']['role']) for change in changes] == \
+        [('admin', 'lead', 'dev')]
+    # The team only changed through its embedded copy: no history of its own
+    assert tracked.get_history('teams', team['pid']) == []
+
+
+def test_an_exception_drops_the_queued_changes(tracked, team):
+    team, (ada, bob) = team
+    with pytest.raises(RuntimeError):
+        with tracked.unit_of_work() as uow:
+            uow.update('users', ada['pid'], {'role': 'lead'})
+            raise RuntimeError
+    assert tracked.get_item_by_pid('users', ada['pid'])['role'] == 'dev'
+
+
+def test_a_failing_table_rolls_back_the_others(tracked, team, monkeypatch):
+    team, (ada, bob) = team
+
+    def failing(*args, **kwargs):
+        raise ValueError('rejected')
+    monkeypatch.setattr(tracked.db['projects'], 'bulk_write', failing)
+
+    with pytest.raises(QueryError):
+        with tracked.unit_of_work() as uow:
+            uow.update('users', ada['pid'], {'role': 'lead'})
+            uow.insert('projects', {'name': 'apollo', 'teams': [team['pid']]})
+    assert tracked.get_item_by_pid('users', ada['pid'])['role'] == 'dev'
+    assert tracked.get_item_by_pid('teams', team['pid'])['member_details'][0]['role'] == 'dev'
+    assert tracked.get_history('users', ada['pid']) == []
+
+
+def test_pushed_summaries_are_read_at_commit(tracked, team):
+    team, (ada, bob) = team
+    with tracked.unit_of_work() as uow:
+        uow.push('teams', team['pid'], 'members', bob['pid'], unique=True)
+        tracked.update_item_by_pid('users', bob['pid'], {'name': 'robert'})
+    assert tracked.get_item_by_pid('teams', team['pid'])['member_details'][-1]['name'] == 'robert'
+
+
+def test_move_user_between_teams_moves_the_summary(tracked, team):
+    team, (ada, bob) = team
+    other = tracked.create_item('teams', {'name': 'other', 'members': [], 'member_details': []})
+    tracked.move_user_between_teams(ada['pid'], team['pid'], other['pid'])
+    assert tracked.get_item_by_pid('teams', team['pid'])['member_details'] == []
+    assert [detail['pid'] for detail in tracked.get_item_by_pid('teams', other['pid'])['member_details']] == \
+        [ada['pid']]
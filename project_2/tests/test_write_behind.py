@@ -0,0 +1,117 @@
+import pytest
+
+from database import Database
+from mongo_common.resilience import QueryError, ServiceUnavailableError
+
+
+@pytest.fixture
+def buffer(db):
+    buffer = db.write_behind(flush_interval=0, flush_at_exit=False)
+    yield buffer
+    buffer.close()
+
+
+@pytest.fixture
+def project(db):
+    return db.create_item('projects', {'name': 'apollo', 'status': 'new', 'events': []})
+
+
+def fail_flushes(buffer, error, failures):
+    flush_table = buffer._flush_table
+    calls = []
+
+    def flaky(*args):
+        calls.append(args)
+        if len(calls) <= failures:
+            raise error
+        return flush_table(*args)
+    buffer._flush_table = flaky
+    return calls
+
+
+def test_changes_are_only_written_on_flush(db, buffer, project):
+    buffer.update_item_by_pid('projects', project['pid'], {'status': 'running'})
+    assert db.get_item_by_pid('projects', project['pid'])['status'] == 'new'
+    assert buffer.flush() == 1
+    assert db.get_item_by_pid('projects', project['pid'])['status'] == 'running'
+
+
+def test_calls_on_one_item_coalesce(db, buffer, project):
+    pid = project['pid']
+    buffer.update_item_by_pid('projects', pid, {'status': 'running'})
+    buffer.array_push_item_by_pid('projects', pid, 'events', 'started')
+    buffer.update_item_by_pid('projects', pid, {'status': 'done'}, updated_by='worker')
+    buffer.array_push_item_by_pid('projects', pid, 'events', 'finished')
+
+    assert buffer.flush() == 1
+    item = db.get_item_by_pid('projects', pid)
+    assert (item['status'], item['events'], item['updated_by']) == ('done', ['started', 'finished'], 'worker')
+    assert buffer.metrics()['coalescing_ratio'] == 4.0
+
+
+def test_set_after_push_on_the_same_array_wins(db, buffer, project):
+    pid = project['pid']
+    buffer.array_push_item_by_pid('projects', pid, 'events', 'lost')
+    buffer.update_item_by_pid('projects', pid, {'events': ['reset']})
+    buffer.array_push_item_by_pid('projects', pid, 'events', 'kept')
+    buffer.flush()
+    assert db.get_item_by_pid('projects', pid)['events'] == ['reset', 'kept']
+
+
+def test_max_pending_flushes_inline(db, project):
+    other = db.create_item('projects', {'name': 'gemini', 'status': 'new'})
+    with db.write_behind(flush_interval=0, max_pending=2, flush_at_exit=False) as buffer:
+        buffer.update_item_by_pid('projects', project['pid'], {'status': 'running'})
+        buffer.update_item_by_pid('projects', other['pid'], {'status': 'running'})
+        assert buffer.metrics()['pending'] == 0
+    assert db.count_items('projects', {'status': 'running'}) == 2
+
+
+def test_close_flushes_what_is_left(db, project):
+    buffer = db.write_behind(flush_interval=0, flush_at_exit=False)
+    buffer.update_item_by_pid('projects', project['pid'], {'status': 'closed'})
+    buffer.close()
+    assert db.get_item_by_pid('projects', project['pid'])['status'] == 'closed'
+
+
+def test_background_thread_flushes(db, project):
+    with db.write_behind(flush_interval=0.01, flush_at_exit=False) as buffer:
+        buffer.update_item_by_pid('projects', project['pid'], {'status': 'running'})
+        buffer._stop.wait(0.1)
+        assert buffer.metrics()['pending'] == 0
+
+
+def test_connection_errors_are_requeued_and_retried(db, buffer, project, caplog):
+    calls = fail_flushes(buffer, ServiceUnavailableError('down'), failures=1)
+    buffer.update_item_by_pid('projects', project['pid'], {'status': 'running'})
+
+    assert buffer.flush() == 0
+    assert buffer.metrics()['pending'] == 1
+    assert 'retrying' in caplog.text
+
+    buffer.update_item_by_pid('projects', project['pid'], {'status': 'done'})
+    buffer.flush()
+    assert len(calls) == 2
+    assert db.get_item_by_pid('projects', project['pid'])['status'] == 'done'
+    metrics = buffer.metrics()
+    assert (metrics['failed'], metrics['pending']) == (1, 0)
+    assert 'down' in metrics['last_error']
+
+
+def test_other_errors_are_not_retried(db, buffer, project, caplog):
+    fail_flushes(buffer, QueryError('rejected'), failures=1)
+    buffer.update_item_by_pid('projects', project['pid'], {'status': 'running'})
+    buffer.flush()
+    assert buffer.metrics()['pending'] == 0
+    assert buffer.metrics()['failed'] == 1
+    assert 'not retried' in caplog.text
+
+
+def test_flushes_are_recorded_in_the_history(memory_uri):
+    db = Database(memory_uri, history=True)
+    project = db.create_item('projects', {'name': 'apollo', 'status': 'new'})
+    with db.write_behind(flush_interval=0, flush_at_exit=False) as buffer:
+        buffer.update_item_by_pid('projects', project['pid'], {'status': 'running'}, updated_by='worker')
+        buffer.update_item_by_pid('projects', project['pid'], {'status': 'done'}, updated_by='worker')
+    changes = db.get_history('projects', project['pid'], field='status')
+    assert [(change['by'], change['set']['status']) for change in changes] == [('worker', 'done')]
@@ -0,0 +1,179 @@
+"""Batch several Database mutations into one multi-document transaction.
+
+    with db.unit_of_work(updated_by="admin") as uow:
+        uow.pull("teams", old_team_pid, "members", user_pid)
+        uow.push("teams", new_team_pid, "members", user_pid, unique=True)
+        uow.update("users", user_pid, {"team": new_team_pid})
+
+Queued changes are plain update operators (no ``$merge`` pipeline, no re-read
+except the source item a summary push copies, read inside the transaction).
+``commit`` sends one ordered ``bulk_write`` per touched collection inside a
+single transaction, so a change set costs one round trip per collection plus
+the commit instead of two per change. ``ClientSession.with_transaction`` retries
+the whole callback on ``TransientTransactionError`` and the commit on
+``UnknownTransactionCommitResult``.
+
+On a Database with ``denormalize`` set, updates and deletes of source items
+also rewrite their embedded copies, and push/pull on a pid array (``members``)
+also maintains the matching summary array (``member_details``), all within the
+same transaction.
+
+Transactions need a replica set or sharded cluster; a single-node replica set
+(``mongod --replSet rs0`` + ``rs.initiate()``) is enough locally. The memory
+backend runs the callback under its global lock and restores a snapshot of the
+collections when it fails.
+"""
+from datetime import datetime, timezone
+
+from history import HISTORY_SUFFIX
+
+
+class UnitOfWork:
+    """Collects mutations on several tables and applies them atomically on ``commit``"""
+
+    def __init__(self, db, updated_by=None):
+        self.db = db
+        self.updated_by = updated_by
+        self._operations = {}  # table -> [pymongo write model, or callable(session) building one]
+        self._pids = {}  # table -> pids touched (for history)
+
+    def _add(self, table, pid, operation):
+        self._operations.setdefault(table, []).append(operation)
+        self._pids.setdefault(table, set()).add(pid)
+        return self
+
+    def _propagate(self, table, pid, changes=None, removed=False):
+        """Queue the embedded-copy updates for a change of source item ``pid``"""
+        denormalizer = self.db.denormalizer
+        if denormalizer is None:
+            return
+        for target, operation in denormalizer.requests_for(table, pid, changes, removed):
+            self._operations.setdefault(target, []).append(operation)
+
+    def _embeddings(self, table, array_field):
+        denormalizer = self.db.denormalizer
+        return [] if denormalizer is None else denormalizer.embeddings_for(table, array_field)
+
+    def _summaries(self, table, array_field, value, session):
+        """Summaries of source item ``value`` for the arrays mirroring ``array_field``, read in ``session``"""
+        update = {}
+        for embedding in self._embeddings(table, array_field):
+            source = self.db._get_collection(embedding.source).find_one(
+                self.db._scope({'pid': value}), {'_id': 0}, session=session)
+            if source is not None:
+                update[embedding.array] = embedding.summary(source)
+        return update
+
+    def _metadata(self):
+        metadata = {'updated_at': datetime.now(timezone.utc)}
+        if self.updated_by:
+            metadata['updated_by'] = self.updated_by
+        return metadata
+
+    def _update_one(self, pid, update):
+        from pymongo import UpdateOne
+
+        update.setdefault('$set', {}).update(self._metadata())
+        return UpdateOne(self.db._scope({'pid': pid}), update)
+
+    def _update(self, table, pid, update):
+        return self._add(table, pid, self._update_one(pid, update))
+
+    def insert(self, table, item, created_by=None):
+        """Queue a new item; returns its pid"""
+        from pymongo import InsertOne
+
+        item.update(self.db._generate_metadata(created_by or self.updated_by))
+        self._add(table, item['pid'], InsertOne(item))
+        return item['pid']
+
+    def update(self, table, pid, item_data):
+        """Queue a ``$set`` of ``item_data`` on an item"""
+        self._propagate(table, pid, item_data)
+        return self._update(table, pid, {'$set': dict(item_data)})
+
+    def push(self, table, pid, array_field, value, unique=False):
+        """Queue appending ``value`` to an array field (``unique`` skips it if already present)"""
+        operator = '$addToSet' if unique else '$push'
+        if not self._embeddings(table, array_field):
+            return self._update(table, pid, {operator: {array_field: value}})
+
+        # The summaries are read in the transaction, so they match the committed source items
+        def operation(session):
+            values = {array_field: value, **self._summaries(table, array_field, value, session)}
+            return self._update_one(pid, {operator: values})
+        return self._add(table, pid, operation)
+
+    def pull(self, table, pid, array_field, value):
+        """Queue removing every occurrence of ``value`` from an array field"""
+        values = {array_field: value}
+        for embedding in self._embeddings(table, array_field):
+            values[embedding.array] = {'pid': value}
+        return self._update(table, pid, {'$pull': values})
+
+    def delete(self, table, pid):
+        """Queue deleting an item (soft delete when the Database uses it)"""
+        from pymongo import DeleteOne, UpdateOne
+
+        filter = self.db._scope({'pid': pid})
+        self._propagate(table, pid, removed=True)
+        if self.db.soft_delete:
+            now = datetime.now(timezone.utc)
+            return self._add(table, pid, UpdateOne(filter, {'$set': {'deleted_at': now, 'updated_at': now}}))
+        return self._add(table, pid, DeleteOne(filter))
+
+    def _snapshot(self, table, session):
+        filter = self.db._scope({'pid': {'$in': list(self._pids[table])}}, include_deleted=True)
+        items = self.db._get_collection(table).find(filter, {'_id': 0}, session=session)
+        return {item['pid']: item for item in items}
+
+    def _apply(self, session):
+        """Transaction callback: one bulk write per table (plus its history), all in ``session``
+
+        Raw driver collections are used for the writes so transient errors keep
+        the labels ``with_transaction`` retries on.
+        """
+        results = {}
+        for table, operations in self._operations.items():
+            operations = [operation(session) if callable(operation) else operation for operation in operations]
+            # Tables only reached by denormalization updates have no pids of their own to record,
+            # like Denormalizer.apply outside a unit of work
+            tracked = self.db._tracks_history(table) and table in self._pids
+            before = self._snapshot(table, session) if tracked else None
+            results[table] = self.db.db[table].bulk_write(operations, ordered=True, session=session)
+            if tracked:
+                history = self.db.changelog.requests(before, self._snapshot(table, session), self.updated_by)
+                if history:
+                    self.db.db[f"{table}{HISTORY_SUFFIX}"].bulk_write(history, ordered=True, session=session)
+        return results
+
+    def commit(self):
+        """Apply every queued change in one transaction; returns ``{table: BulkWriteResult}``"""
+        if not self._operations:
+            return {}
+
+        def run():
+            from pymongo.read_concern import ReadConcern
+            from pymongo.write_concern import WriteConcern
+
+            with self.db.client.start_session() as session:
+                return session.with_transaction(self._apply, read_concern=ReadConcern('majority'),
+                                                write_concern=WriteConcern('majority'))
+
+        # The driver retries transient transaction errors itself; the executor only types errors
+        results = self.db.executor.call('transaction', run, retry=False)
+        self._operations, self._pids = {}, {}
+        return results
+
+    def rollback(self):
+        """Drop the queued changes"""
+        self._operations, self._pids = {}, {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
@@ -0,0 +1,271 @@
+"""Write-behind buffer for high-frequency updates of a few hot items.
+
+``update_item_by_pid`` and ``array_push_item_by_pid`` rewrite the whole item
+through ``$merge`` and then read it back, once per call. A
+``WriteBehindBuffer`` takes the same calls instead and only queues them. The
+pending changes of each item are merged:
+
+- ``$set`` fields are combined, and the last value of a field wins.
+- Pushes on an array are concatenated into one ``$push: {$each: [...]}``.
+- ``updated_at``/``updated_by`` keep the value of the last call.
+
+A flush sends everything queued as a single ``bulk_write`` per table, with
+one ``UpdateOne`` per item::
+
+    buffer = db.write_behind(flush_interval=0.05, max_pending=1000)
+    buffer.update_item_by_pid("projects", pid, {"status": "running"})
+    buffer.array_push_item_by_pid("projects", pid, "events", event)
+    ...
+    buffer.close()  # also done at interpreter exit
+
+Durability options:
+- ``max_pending``: the call that queues that many distinct items flushes
+  inline, which bounds memory and loss.
+- ``flush_interval``: a daemon thread flushes every ``flush_interval`` seconds.
+- ``flush_at_exit``: pending changes are flushed by ``close()``, the ``with``
+  block, or ``atexit``.
+- ``write_concern``: e.g. ``WriteConcern(w="majority", j=True)``.
+
+Anything still queued when the process dies is lost, so at most
+``flush_interval`` seconds (or ``max_pending`` items) of updates. A flush that
+fails with a connection error (``ServiceUnavailableError``) is queued again
+and retried. If the connection dropped after the server had applied part of
+the batch, the retry repeats those pushes.
+
+Reads do not see queued changes; call ``flush()`` first when that matters.
+History and embedded copies are maintained at flush time, with one history
+entry per flushed item instead of one per call.
+
+``metrics()`` reports the coalescing ratio (calls per written operation) and
+flush latency.
+"""
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+from mongo_common.resilience import ServiceUnavailableError
+
+logger = logging.getLogger(__name__)
+
+
+def _overlaps(a, b):
+    """Whether two update paths touch the same data (``a`` and ``a.b`` conflict)"""
+    return a == b or a.startswith(f'{b}.') or b.startswith(f'{a}.')
+
+
+class _Pending:
+    """Merged changes of one item not yet written"""
+
+    __slots__ = ('set', 'push', 'updated_at', 'updated_by')
+
+    def __init__(self):
+        self.set = {}
+        self.push = {}  # array field -> values to append, in call order
+        self.updated_at = None
+        self.updated_by = None
+
+    def touch(self, updated_by):
+        self.updated_at = datetime.now(timezone.utc)
+        if updated_by:
+            self.updated_by = updated_by
+
+    def accepts_set(self, fields):
+        return not any(_overlaps(field, pushed) and field != pushed for field in fields for pushed in self.push)
+
+    def accepts_push(self, array_field):
+        for field, value in self.set.items():
+            if field == array_field:
+                return isinstance(value, list)
+            if _overlaps(field, array_field):
+                return False
+        return True
+
+    def request(self, filter):
+        from pymongo import UpdateOne
+
+        update = {'$set': {**self.set, 'updated_at': self.updated_at}}
+        if self.updated_by:
+            update['$set']['updated_by'] = self.updated_by
+        if self.push:
+            update['$push'] = {field: {'$each': values} for field, values in self.push.items()}
+        return UpdateOne(filter, update)
+
+
+class WriteBehindBuffer:
+    """Coalesces per-item updates and writes them as one ``bulk_write`` per table"""
+
+    def __init__(self, db, flush_interval=0.05, max_pending=1000, flush_at_exit=True, write_concern=None):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.write_concern = write_concern
+        # (table, pid) -> [_Pending]; a new _Pending starts when a change cannot merge into the last one
+        self._pending = {}
+        self._lock = threading.Lock()
+        # Serializes flushes so the writes of one item reach the server in call order
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.calls = 0
+        self.operations = 0
+        self.flushes = 0
+        self.failed = 0
+        self.last_error = None
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.elapsed = 0.0
+        if flush_interval:
+            self._thread = threading.Thread(target=self._work, name="write-behind", daemon=True)
+            self._thread.start()
+        if flush_at_exit:
+            atexit.register(self.close)
+
+    # ----- queueing -----
+
+    def _entry(self, table, pid, accepts):
+        entries = self._pending.setdefault((table, pid), [])
+        if not entries or not accepts(entries[-1]):
+            entries.append(_Pending())
+        return entries[-1]
+
+    def _queued(self):
+        self.calls += 1
+        return len(self._pending) >= self.max_pending
+
+    def update_item_by_pid(self, table, pid, item_data, updated_by=None):
+        """Queue a ``$set`` of ``item_data`` on item ``pid``"""
+        with self._lock:
+            entry = self._entry(table, pid, lambda pending: pending.accepts_set(item_data))
+            for field, value in item_data.items():
+                # A later $set replaces what was pushed onto the same array
+                entry.push.pop(field, None)
+                entry.set[field] = value
+            entry.touch(updated_by)
+            full = self._queued()
+        if full:
+            self.flush()
+
+    def array_push_item_by_pid(self, table, pid, array_field, new_item, updated_by=None):
+        """Queue appending ``new_item`` to the ``array_field`` of item ``pid``"""
+        with self._lock:
+            entry = self._entry(table, pid, lambda pending: pending.accepts_push(array_field))
+            if array_field in entry.set:
+                # Pushing onto an array set in the same batch: append to the value being set
+                entry.set[array_field] = entry.set[array_field] + [new_item]
+            else:
+                entry.push.setdefault(array_field, []).append(new_item)
+            entry.touch(updated_by)
+            full = self._queued()
+        if full:
+            self.flush()
+
+    # ----- flushing -----
+
+    def flush(self):
+        """Write everything queued; return the number of update operations sent"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+
+            started = time.perf_counter()
+            by_table = {}
+            for (table, pid), entries in pending.items():
+                by_table.setdefault(table, []).append((pid, entries))
+            written = 0
+            for table, items in by_table.items():
+                applied = []
+                try:
+                    written += self._flush_table(table, items, applied)
+                except ServiceUnavailableError as e:
+                    if not applied:
+                        # Queue it again ahead of newer changes and retry on the next flush
+                        self._requeue({(table, pid): entries for pid, entries in items})
+                    self._failed(table, e, retried=not applied)
+                except Exception as e:
+                    self._failed(table, e, retried=False)
+
+            flush_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self.operations += written
+                self.flushes += 1
+                self.last_flush_ms = flush_ms
+                self.max_flush_ms = max(self.max_flush_ms, flush_ms)
+                self.elapsed += flush_ms / 1000
+            return written
+
+    def _flush_table(self, table, items, applied):
+        requests, by, pids = [], set(), []
+        for pid, entries in items:
+            pids.append(pid)
+            for entry in entries:
+                requests.append(entry.request(self.db._scope({'pid': pid})))
+                by.add(entry.updated_by)
+        collection = self.db._get_collection(table)
+        if self.write_concern is not None:
+            collection = collection.with_options(write_concern=self.write_concern)
+        # Several requests for one item must apply in order; otherwise let the server parallelize
+        ordered = len(requests) > len(pids)
+        updated_by = by.pop() if len(by) == 1 else None
+
+        def write():
+            result = collection.bulk_write(requests, ordered=ordered)
+            applied.append(True)
+            return result
+
+        self.db._write(table, self.db._scope({'pid': {'$in': pids}}), write, updated_by)
+        return len(requests)
+
+    def _requeue(self, failed):
+        with self._lock:
+            for key, entries in self._pending.items():
+                failed[key] = failed.get(key, []) + entries
+            self._pending = failed
+
+    def _failed(self, table, error, retried):
+        with self._lock:
+            self.failed += 1
+            self.last_error = error
+        if retried:
+            logger.warning("Write-behind flush of %s failed, retrying: %s", table, error)
+        else:
+            logger.error("Write-behind flush of %s failed, not retried: %s", table, error)
+
+    def _work(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """Stop the flush thread and write what is still queued"""
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self.flush()
+        atexit.unregister(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    # ----- metrics -----
+
+    def metrics(self):
+        """Calls queued, operations written, coalescing ratio and flush latency"""
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'operations': self.operations,
+                'coalescing_ratio': round(self.calls / self.operations, 2) if self.operations else 0.0,
+                'pending': len(self._pending),
+                'flushes': self.flushes,
+                'failed': self.failed,
+                'last_error': repr(self.last_error) if self.last_error else None,
+                'last_flush_ms': round(self.last_flush_ms, 3),
+                'max_flush_ms': round(self.max_flush_ms, 3),
+                'avg_flush_ms': round(self.elapsed * 1000 / self.flushes, 3) if self.flushes else 0.0,
+            }